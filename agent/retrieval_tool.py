@@ -0,0 +1,52 @@
+"""
+Retrieval-only knowledge base tool for the AWS Support Agent.
+
+``VectorStoreQATool`` answers the agent's question with its own RetrievalQA
+LLM call, which the agent then paraphrases in a further call. This tool hands
+the retrieved passages to the agent instead, so each lookup costs no LLM call
+of its own.
+"""
+from typing import List, Optional
+
+from langchain_core.callbacks import AsyncCallbackManagerForToolRun, CallbackManagerForToolRun
+from langchain_core.documents import Document
+from langchain_core.tools import BaseTool
+from langchain_core.vectorstores import VectorStore
+from pydantic import ConfigDict, Field
+
+DEFAULT_RETRIEVAL_K = 4
+
+
+def format_passages(documents: List[Document]) -> str:
+    """Render retrieved chunks as numbered passages labelled with their source."""
+    if not documents:
+        return "No relevant passages found in the AWS knowledge base."
+    return "\n\n".join(
+        f"[{number}] (source: {doc.metadata.get('source', 'unknown')})\n{doc.page_content.strip()}"
+        for number, doc in enumerate(documents, start=1)
+    )
+
+
+class KnowledgeBaseRetrievalTool(BaseTool):
+    """
+    Tool returning the top ``k`` knowledge base passages with their source ids.
+
+    Lookups go through the vector store's retriever, so retrieval filters set
+    for the query apply and streaming handlers receive ``on_retriever_end``
+    events just as with ``VectorStoreQATool``.
+    """
+
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+
+    vectorstore: VectorStore = Field(exclude=True)
+    k: int = DEFAULT_RETRIEVAL_K
+
+    def _run(self, query: str, run_manager: Optional[CallbackManagerForToolRun] = None) -> str:
+        retriever = self.vectorstore.as_retriever(search_kwargs={"k": self.k})
+        callbacks = run_manager.get_child() if run_manager else None
+        return format_passages(retriever.invoke(query, config={"callbacks": callbacks}))
+
+    async def _arun(self, query: str, run_manager: Optional[AsyncCallbackManagerForToolRun] = None) -> str:
+        retriever = self.vectorstore.as_retriever(search_kwargs={"k": self.k})
+        callbacks = run_manager.get_child() if run_manager else None
+        return format_passages(await retriever.ainvoke(query, config={"callbacks": callbacks}))
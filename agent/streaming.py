@@ -0,0 +1,158 @@
+"""
+Token streaming helpers for the AWS Support Agent.
+
+The conversational agent answers with a markdown JSON blob such as
+``{"action": "Final Answer", "action_input": "..."}``. These helpers pull
+the ``action_input`` string out of that blob token by token, so the answer
+can be forwarded to clients while the LLM is still generating it.
+"""
+import asyncio
+import re
+from typing import Any, Dict, List, Optional, Sequence
+from uuid import UUID
+
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.documents import Document
+
+FINAL_ANSWER_ACTION = "Final Answer"
+
+_ACTION_RE = re.compile(r'"action"\s*:\s*"((?:[^"\\]|\\.)*)"')
+_ACTION_INPUT_RE = re.compile(r'"action_input"\s*:\s*"')
+_SIMPLE_ESCAPES = {
+    '"': '"', "\\": "\\", "/": "/",
+    "b": "\b", "f": "\f", "n": "\n", "r": "\r", "t": "\t",
+}
+
+
+class FinalAnswerExtractor:
+    """
+    Incrementally decode the ``action_input`` of a "Final Answer" JSON blob.
+
+    Feed raw LLM tokens with ``feed``; it returns the newly decoded part of the
+    answer, or an empty string while the blob is not (yet) a final answer.
+    """
+
+    def __init__(self):
+        self._buffer = ""
+        self._action: Optional[str] = None
+        self._value_start: Optional[int] = None
+        self._pos = 0
+        self._decoded: List[str] = []
+        self._emitted = 0
+        self.done = False
+
+    def feed(self, token: str) -> str:
+        """
+        Consume a token and return newly available answer text.
+
+        Args:
+            token: The next chunk of raw LLM output
+
+        Returns:
+            Answer text decoded since the previous call
+        """
+        self._buffer += token
+
+        if self._action is None:
+            match = _ACTION_RE.search(self._buffer)
+            if match:
+                self._action = match.group(1)
+        if self._value_start is None:
+            match = _ACTION_INPUT_RE.search(self._buffer)
+            if match is None:
+                return ""
+            self._value_start = self._pos = match.end()
+
+        if not self.done:
+            self._decode()
+
+        # The answer may be decoded before "action" is seen; hold it until then
+        if self._action != FINAL_ANSWER_ACTION:
+            return ""
+        text = "".join(self._decoded)
+        new_text = text[self._emitted:]
+        self._emitted = len(text)
+        return new_text
+
+    def _decode(self) -> None:
+        """Decode as much of the JSON string value as the buffer allows."""
+        buffer = self._buffer
+        pos = self._pos
+        while pos < len(buffer):
+            char = buffer[pos]
+            if char == '"':
+                self.done = True
+                pos += 1
+                break
+            if char != "\\":
+                pos += 1
+                self._decoded.append(char)
+                continue
+
+            # Escape sequence; stop if it is not complete yet
+            if pos + 1 >= len(buffer):
+                break
+            kind = buffer[pos + 1]
+            if kind in _SIMPLE_ESCAPES:
+                self._decoded.append(_SIMPLE_ESCAPES[kind])
+                pos += 2
+                continue
+            if kind != "u":
+                # Invalid escape: keep it verbatim like a lenient parser would
+                self._decoded.append(kind)
+                pos += 2
+                continue
+            if pos + 6 > len(buffer):
+                break
+            code = int(buffer[pos + 2:pos + 6], 16)
+            if 0xD800 <= code < 0xDC00:
+                # High surrogate: wait for the low half of the pair
+                if pos + 12 > len(buffer):
+                    break
+                low = int(buffer[pos + 8:pos + 12], 16)
+                code = 0x10000 + ((code - 0xD800) << 10) + (low - 0xDC00)
+                pos += 12
+            else:
+                pos += 6
+            self._decoded.append(chr(code))
+        self._pos = pos
+
+
+class FinalAnswerStreamHandler(BaseCallbackHandler):
+    """
+    Callback handler that forwards final-answer tokens to an asyncio queue.
+
+    Every LLM run gets its own extractor, so tool runs and intermediate agent
+    steps are ignored. Finished retrievals are reported as ``retrieval`` events
+    with the ids and sources of the returned chunks. Items are put on the queue
+    with ``call_soon_threadsafe``, which makes the handler safe to use when the
+    agent runs on a worker thread.
+    """
+
+    run_inline = True
+
+    def __init__(self, queue: asyncio.Queue, loop: asyncio.AbstractEventLoop):
+        self.queue = queue
+        self.loop = loop
+        self._extractors: Dict[UUID, FinalAnswerExtractor] = {}
+
+    def _put(self, event: str, data: Any) -> None:
+        self.loop.call_soon_threadsafe(self.queue.put_nowait, (event, data))
+
+    def on_llm_new_token(self, token: str, *, run_id: UUID, **kwargs: Any) -> None:
+        extractor = self._extractors.setdefault(run_id, FinalAnswerExtractor())
+        text = extractor.feed(token)
+        if text:
+            self._put("token", text)
+
+    def on_llm_end(self, response: Any, *, run_id: UUID, **kwargs: Any) -> None:
+        self._extractors.pop(run_id, None)
+
+    def on_llm_error(self, error: BaseException, *, run_id: UUID, **kwargs: Any) -> None:
+        self._extractors.pop(run_id, None)
+
+    def on_retriever_end(self, documents: Sequence[Document], *, run_id: UUID, **kwargs: Any) -> None:
+        self._put("retrieval", [
+            {"id": doc.id, "source": doc.metadata.get("source")}
+            for doc in documents
+        ])
@@ -2,15 +2,38 @@
 Agent service to manage AWS Support Agent lifecycle and queries.
 This module implements a singleton pattern to ensure only one agent instance exists.
 """
+import asyncio
+import contextlib
+import contextvars
+import functools
+import hashlib
+import json
+import re
+import threading
 import time
-from typing import Optional, Tuple, Dict, Any
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, Tuple, Dict, Any, AsyncIterator, List
 from datetime import datetime
 from langchain.schema.vectorstore import VectorStore
 from langchain_community.docstore.document import Document
 
-from steps.index_generator import index_generator
-from steps.agent_creator import aws_agent_creator, AgentParameters
+from steps.index_generator import index_generator, cached_index_generator, get_text_splitter
+from steps.vector_store import group_by_source
+from steps.ann_index import IndexSpec
+from steps.embedding_cache import EmbeddingCache
+from steps.embeddings import embedding_registry
+from steps.metadata_index import Filters, normalize_filters, use_filters
+from steps.retrieval_cache import RetrievalCache
+from steps.agent_creator import aws_agent_creator, AgentParameters, supports_native_async
+from agent.streaming import FinalAnswerStreamHandler
 from api.config import settings
+from api.document_log import DocumentLog
+from api.session_memory import SessionMemoryStore
+from api.semantic_cache import SemanticCache
+from api.single_flight import SingleFlight
+from api.snapshot import AgentSnapshot, SnapshotManager
+
+DEFAULT_SESSION_ID = "default"
 
 
 class AgentService:
@@ -30,69 +53,259 @@ class AgentService:
     def __init__(self):
         """Initialize the agent service."""
         if not self._initialized:
-            self.agent = None
-            self.tools = None
-            self.executor = None
-            self.vector_store = None
             self.query_count = 0
-            self.config = None
+            self.embedding_cache = (
+                EmbeddingCache(settings.embedding_cache_dir) if settings.embedding_cache_dir else None
+            )
+            self._snapshots = SnapshotManager(history=settings.snapshot_history)
+            self._build_lock = threading.Lock()
+            # Serialises knowledge base changes with replaying them onto a new snapshot
+            self._changes_lock = threading.Lock()
+            self.document_log = DocumentLog(settings.document_log_path) if settings.document_log_path else None
+            self._single_flight = SingleFlight()
+            self.ready = False
+            self.warmup_timings: Dict[str, float] = {}
+            self.warmup_error: Optional[str] = None
+            self.sessions = SessionMemoryStore(
+                max_sessions=settings.session_max_sessions,
+                ttl_seconds=settings.session_ttl_seconds,
+                max_turns=settings.session_max_turns
+            )
+            self._query_pool = ThreadPoolExecutor(
+                max_workers=settings.query_thread_pool_size,
+                thread_name_prefix="agent-query"
+            )
             self._initialized = True
     
+    # The serving snapshot's components, for callers that only read them
+    @property
+    def vector_store(self) -> Optional[VectorStore]:
+        snapshot = self._snapshots.current
+        return snapshot.vector_store if snapshot else None
+    
+    @property
+    def executor(self):
+        snapshot = self._snapshots.current
+        return snapshot.executor if snapshot else None
+    
+    @property
+    def agent(self):
+        snapshot = self._snapshots.current
+        return snapshot.agent if snapshot else None
+    
+    @property
+    def tools(self):
+        snapshot = self._snapshots.current
+        return snapshot.tools if snapshot else None
+    
+    @property
+    def config(self) -> Optional[AgentParameters]:
+        snapshot = self._snapshots.current
+        return snapshot.config if snapshot else None
+    
+    @property
+    def semantic_cache(self) -> Optional[SemanticCache]:
+        snapshot = self._snapshots.current
+        return snapshot.semantic_cache if snapshot else None
+    
     def initialize_agent(self, force_reinit: bool = False) -> bool:
         """
         Initialize the AWS Support Agent with default documents.
         
+        Builds a complete new snapshot (vector store, tools, executor and caches)
+        and warms it up while the current snapshot keeps serving, then swaps it
+        in atomically. Documents upserted or deleted through the API are
+        replayed onto it first. Queries already running finish on the snapshot
+        they started with. If the build fails, the current snapshot stays in service.
+        
         Args:
             force_reinit: Force re-initialization even if already initialized
             
         Returns:
             True if initialization successful, False otherwise
         """
-        if self.executor is not None and not force_reinit:
+        if self._snapshots.current is not None and not force_reinit:
             print("[INFO] Agent already initialized")
             return True
         
-        try:
-            print("[INFO] Initializing AWS Support Agent...")
-            
-            # Create sample AWS documents
-            documents = self._create_sample_documents()
-            
-            # Create vector store
-            print(f"[INFO] Creating vector store with {len(documents)} documents...")
-            self.vector_store = index_generator(documents)
-            print("[INFO] Vector store created successfully")
-            
-            # Create agent configuration
-            self.config = AgentParameters(
-                llm_type=settings.llm_type,
-                groq_api_key=settings.groq_api_key,
-                groq_model_name=settings.groq_model_name,
-                openai_api_key=settings.openai_api_key,
-                openai_model_name=settings.openai_model_name,
-                ollama_model_name=settings.ollama_model_name,
-                temperature=settings.temperature,
-                max_tokens=settings.max_tokens
+        # One build at a time; a second reload waits and then builds again
+        with self._build_lock:
+            try:
+                snapshot = self._build_snapshot()
+            except Exception as e:
+                serving = self._snapshots.current
+                print(f"[ERROR] Failed to initialize agent: {e}"
+                      + (f" (still serving snapshot v{serving.version})" if serving else ""))
+                raise
+            with self._changes_lock:
+                self._replay_changes(snapshot)
+                self._snapshots.publish(snapshot)
+            return True
+    
+    def _build_snapshot(self) -> AgentSnapshot:
+        """Build and warm up a new snapshot without touching the one being served."""
+        version = self._snapshots.next_version()
+        print(f"[INFO] Initializing AWS Support Agent (snapshot v{version})...")
+        
+        # Create sample AWS documents
+        documents = self._create_sample_documents()
+        
+        # Create vector store
+        print(f"[INFO] Creating vector store with {len(documents)} documents...")
+        index_spec = IndexSpec(
+            kind=settings.ann_index_type,
+            nlist=settings.ann_nlist,
+            hnsw_m=settings.ann_hnsw_m,
+            storage=settings.ann_storage,
+            rerank=settings.ann_rerank,
+            nprobe=settings.ann_nprobe,
+            ef_search=settings.ann_ef_search,
+            rerank_factor=settings.ann_rerank_factor,
+            hybrid=settings.hybrid_search_enabled,
+            rrf_k=settings.hybrid_rrf_k
+        )
+        with self._timed_phase("index"):
+            if settings.index_cache_enabled:
+                vector_store = cached_index_generator(
+                    documents,
+                    settings.index_dir,
+                    embedding_cache=self.embedding_cache,
+                    index_spec=index_spec,
+                    dedup_threshold=settings.dedup_threshold,
+                    num_shards=settings.index_num_shards,
+                    shard_by=settings.index_shard_by
+                )
+            else:
+                vector_store = index_generator(
+                    documents,
+                    embedding_cache=self.embedding_cache,
+                    index_spec=index_spec,
+                    dedup_threshold=settings.dedup_threshold,
+                    num_shards=settings.index_num_shards,
+                    shard_by=settings.index_shard_by
+                )
+        print("[INFO] Vector store created successfully")
+        
+        # A fresh cache per knowledge base: answers from the old one are stale
+        semantic_cache = None
+        if settings.semantic_cache_enabled and vector_store.embeddings is not None:
+            semantic_cache = SemanticCache(
+                embeddings=vector_store.embeddings,
+                threshold=settings.semantic_cache_threshold,
+                max_entries=settings.semantic_cache_max_entries,
+                ttl_seconds=settings.semantic_cache_ttl_seconds
             )
-            
-            # Create agent
-            print(f"[INFO] Creating AWS Support Agent with {self.config.llm_type} LLM...")
-            self.agent, self.tools, self.executor = aws_agent_creator(
-                vector_store=self.vector_store,
-                config=self.config
+        if settings.retrieval_cache_enabled:
+            vector_store.retrieval_cache = RetrievalCache(
+                max_entries=settings.retrieval_cache_max_entries,
+                threshold=settings.retrieval_cache_threshold
+            )
+        
+        # Create agent configuration
+        config = AgentParameters(
+            llm_type=settings.llm_type,
+            groq_api_key=settings.groq_api_key,
+            groq_model_name=settings.groq_model_name,
+            openai_api_key=settings.openai_api_key,
+            openai_model_name=settings.openai_model_name,
+            ollama_model_name=settings.ollama_model_name,
+            temperature=settings.temperature,
+            max_tokens=settings.max_tokens,
+            tool_mode=settings.agent_tool_mode,
+            retrieval_k=settings.agent_retrieval_k
+        )
+        
+        # Create agent
+        print(f"[INFO] Creating AWS Support Agent with {config.llm_type} LLM...")
+        # Conversation history is kept per session, not on the shared executor
+        with self._timed_phase("agent"):
+            agent, tools, executor = aws_agent_creator(
+                vector_store=vector_store,
+                config=config,
+                shared_memory=False
             )
+        
+        # Prefer the provider's native async client; otherwise queries
+        # run on the bounded thread pool so the event loop stays free
+        llm = getattr(getattr(executor.agent, "llm_chain", None), "llm", None)
+        native_async = supports_native_async(llm)
+        print(f"[INFO] Async execution: {'native' if native_async else 'thread pool'}")
+        
+        # Dummy retrievals page in the index and load the embedding model's
+        # weights before the snapshot takes traffic
+        with self._timed_phase("retrieval"):
+            for warmup_query in settings.warmup_queries:
+                vector_store.similarity_search(warmup_query, k=4)
+        
+        print(f"[SUCCESS] AWS Support Agent snapshot v{version} built successfully!")
+        return AgentSnapshot(
+            version=version,
+            vector_store=vector_store,
+            agent=agent,
+            tools=tools,
+            executor=executor,
+            config=config,
+            semantic_cache=semantic_cache,
+            native_async=native_async
+        )
+    
+    def rollback_agent(self) -> Dict[str, Any]:
+        """
+        Serve the previous snapshot again, e.g. after a bad reload.
+        
+        Changes made through the API since it was retired are replayed onto it.
+        
+        Returns:
+            Snapshot status after the rollback
             
-            print("[SUCCESS] AWS Support Agent initialized successfully!")
-            return True
+        Raises:
+            RuntimeError: If no previous snapshot is kept
+        """
+        with self._changes_lock:
+            restored = self._snapshots.rollback()
+            self._replay_changes(restored)
+        return self._snapshots.stats()
+    
+    def warm_up(self, force_reinit: bool = False) -> Dict[str, float]:
+        """
+        Initialize the agent and touch the index so the first queries are fast.
+        
+        Builds or loads the knowledge base, creates the LLM client and runs the
+        configured warm-up retrievals. The service reports ready only after
+        every phase has finished; a forced reload keeps serving (and stays
+        ready) on the previous snapshot until the new one is swapped in.
+        
+        Args:
+            force_reinit: Force re-initialization even if already initialized
+            
+        Returns:
+            Seconds spent in each warm-up phase
+        """
+        self.warmup_error = None
+        try:
+            if self._snapshots.current is None or force_reinit:
+                self.warmup_timings = {}
+                self.initialize_agent(force_reinit=force_reinit)
             
+            self.ready = True
+            total = sum(self.warmup_timings.values())
+            print(f"[SUCCESS] Warm-up complete in {total:.2f}s, service is ready")
+            return dict(self.warmup_timings)
+        
         except Exception as e:
-            print(f"[ERROR] Failed to initialize agent: {e}")
-            self.agent = None
-            self.tools = None
-            self.executor = None
-            self.vector_store = None
+            self.warmup_error = str(e)
             raise
     
+    @contextlib.contextmanager
+    def _timed_phase(self, phase: str):
+        """Record and log how long a warm-up phase takes."""
+        phase_start = time.time()
+        try:
+            yield
+        finally:
+            self.warmup_timings[phase] = round(time.time() - phase_start, 3)
+            print(f"[INFO] Warm-up phase '{phase}' took {self.warmup_timings[phase]:.2f}s")
+    
     def _create_sample_documents(self) -> list:
         """Create sample AWS documentation documents."""
         return [
@@ -138,55 +351,438 @@ class AgentService:
             )
         ]
     
-    def query_agent(self, query: str, include_sources: bool = False) -> Dict[str, Any]:
+    def query_agent(
+        self,
+        query: str,
+        include_sources: bool = False,
+        session_id: Optional[str] = DEFAULT_SESSION_ID,
+        filters: Optional[Filters] = None
+    ) -> Dict[str, Any]:
         """
         Query the AWS Support Agent.
         
+        Blocks the calling thread for the whole agent run. Async callers
+        should use aquery_agent instead.
+        
         Args:
             query: User's question about AWS
             include_sources: Whether to include source documents
+            session_id: Conversation session whose history is used and extended,
+                or None for a stateless query
+            filters: Restrict knowledge base retrieval to these categories/sources,
+                e.g. ``{"category": ["compute"]}``
             
         Returns:
             Dictionary containing response and metadata
         """
-        if self.executor is None:
-            raise RuntimeError("Agent not initialized. Please initialize the agent first.")
+        with self._snapshots.acquire() as snapshot:
+            start_time = time.time()
+            
+            try:
+                filters = normalize_filters(filters)
+                inputs = self._build_inputs(query, session_id)
+                cache_vector = (
+                    snapshot.semantic_cache.embed(query)
+                    if snapshot.semantic_cache and self._cacheable(inputs) else None
+                )
+                cached = self._cache_lookup(snapshot, cache_vector, include_sources, filters)
+                if cached is not None:
+                    result = self._cached_result(query, cached, start_time)
+                    self._save_turn(session_id, query, result["response"])
+                    return result
+                
+                # Execute query
+                with use_filters(filters):
+                    response = snapshot.executor.invoke(inputs)
+                result = self._build_result(query, response, include_sources, start_time)
+                self._cache_store(snapshot, cache_vector, include_sources, result, filters)
+                self._save_turn(session_id, query, result["response"])
+                return result
+                
+            except Exception as e:
+                raise RuntimeError(f"Error processing query: {str(e)}")
+    
+    async def aquery_agent(
+        self,
+        query: str,
+        include_sources: bool = False,
+        session_id: Optional[str] = DEFAULT_SESSION_ID,
+        filters: Optional[Filters] = None
+    ) -> Dict[str, Any]:
+        """
+        Query the AWS Support Agent without blocking the event loop.
         
-        start_time = time.time()
+        Uses the executor's native ``ainvoke`` when the LLM provider implements
+        async generation, and falls back to the bounded query thread pool otherwise.
         
-        try:
-            # Execute query
-            response = self.executor.invoke({"input": query})
+        Args:
+            query: User's question about AWS
+            include_sources: Whether to include source documents
+            session_id: Conversation session whose history is used and extended,
+                or None for a stateless query
+            filters: Restrict knowledge base retrieval to these categories/sources,
+                e.g. ``{"category": ["compute"]}``
             
-            # Extract response text
-            response_text = response.get("output", str(response)) if isinstance(response, dict) else str(response)
+        Returns:
+            Dictionary containing response and metadata
+        """
+        with self._snapshots.acquire() as snapshot:
+            start_time = time.time()
             
-            # Extract sources if requested
-            sources = None
-            if include_sources and isinstance(response, dict):
-                # Try to extract source documents from intermediate steps
-                if "intermediate_steps" in response:
-                    sources = []
-                    for step in response.get("intermediate_steps", []):
-                        if len(step) > 1 and hasattr(step[1], 'metadata'):
-                            source = step[1].metadata.get('source', 'unknown')
-                            if source not in sources:
-                                sources.append(source)
+            try:
+                filters = normalize_filters(filters)
+                inputs = self._build_inputs(query, session_id)
+                cache_vector = await self._aembed_for_cache(snapshot, query) if self._cacheable(inputs) else None
+                cached = self._cache_lookup(snapshot, cache_vector, include_sources, filters)
+                if cached is not None:
+                    result = self._cached_result(query, cached, start_time)
+                    self._save_turn(session_id, query, result["response"])
+                    return result
+                
+                # Identical concurrent queries share one agent run
+                response = await self._single_flight.do(
+                    self._flight_key(snapshot, query, filters, inputs["chat_history"]),
+                    lambda: self._ainvoke(snapshot, inputs, filters=filters)
+                )
+                result = self._build_result(query, response, include_sources, start_time)
+                self._cache_store(snapshot, cache_vector, include_sources, result, filters)
+                self._save_turn(session_id, query, result["response"])
+                return result
+                
+            except Exception as e:
+                raise RuntimeError(f"Error processing query: {str(e)}")
+    
+    async def astream_query(
+        self,
+        query: str,
+        include_sources: bool = False,
+        session_id: Optional[str] = DEFAULT_SESSION_ID,
+        filters: Optional[Filters] = None
+    ) -> AsyncIterator[Tuple[str, Any]]:
+        """
+        Query the AWS Support Agent and stream the final answer as it is generated.
+        
+        Yields ``("token", text)`` events with answer text coalesced into frames of
+        ``stream_frame_interval_ms``, ``("retrieval", hits)`` events whenever a
+        knowledge base lookup finishes, and finally one ``("complete", result)``
+        event carrying the same dictionary aquery_agent returns. Cache hits and queries
+        that join an identical in-flight run arrive as a single token frame.
+        
+        Args:
+            query: User's question about AWS
+            include_sources: Whether to include source documents
+            session_id: Conversation session whose history is used and extended,
+                or None for a stateless query
+            filters: Restrict knowledge base retrieval to these categories/sources,
+                e.g. ``{"category": ["compute"]}``
             
-            processing_time = time.time() - start_time
-            self.query_count += 1
+        Yields:
+            Tuples of event name and payload
+        """
+        # The snapshot stays pinned until the stream is fully consumed or closed
+        with self._snapshots.acquire() as snapshot:
+            start_time = time.time()
             
-            return {
-                "query": query,
-                "response": response_text,
-                "sources": sources,
-                "processing_time": round(processing_time, 2),
-                "timestamp": datetime.now().isoformat()
-            }
+            try:
+                filters = normalize_filters(filters)
+                inputs = self._build_inputs(query, session_id)
+                cache_vector = await self._aembed_for_cache(snapshot, query) if self._cacheable(inputs) else None
+                cached = self._cache_lookup(snapshot, cache_vector, include_sources, filters)
+                if cached is not None:
+                    result = self._cached_result(query, cached, start_time)
+                    self._save_turn(session_id, query, result["response"])
+                    yield "token", result["response"]
+                    yield "complete", result
+                    return
+                
+                queue: asyncio.Queue = asyncio.Queue()
+                handler = FinalAnswerStreamHandler(queue, asyncio.get_running_loop())
+                run = asyncio.ensure_future(self._single_flight.do(
+                    self._flight_key(snapshot, query, filters, inputs["chat_history"]),
+                    lambda: self._ainvoke(snapshot, inputs, callbacks=[handler], filters=filters)
+                ))
+                
+                interval = settings.stream_frame_interval_ms / 1000
+                streamed: List[str] = []
+                sources: List[str] = []
+                while True:
+                    await asyncio.wait([run], timeout=interval)
+                    frame = []
+                    while not queue.empty():
+                        event, data = queue.get_nowait()
+                        if event == "token":
+                            frame.append(data)
+                            continue
+                        # Keep event order: flush pending text before a retrieval event
+                        if frame:
+                            streamed.append("".join(frame))
+                            yield "token", streamed[-1]
+                            frame = []
+                        sources.extend(
+                            hit["source"] for hit in data
+                            if hit["source"] and hit["source"] not in sources
+                        )
+                        yield "retrieval", {"chunks": data, "sources": sources}
+                    if frame:
+                        streamed.append("".join(frame))
+                        yield "token", streamed[-1]
+                    if run.done() and queue.empty():
+                        break
+                
+                result = self._build_result(query, run.result(), include_sources, start_time)
+                if include_sources and not result["sources"] and sources:
+                    result["sources"] = sources
+                
+                # Send whatever the token stream missed (e.g. answers that were not
+                # valid JSON blobs, or a run joined through single-flight)
+                streamed_text = "".join(streamed)
+                if not streamed_text:
+                    remainder = result["response"]
+                elif result["response"].startswith(streamed_text):
+                    remainder = result["response"][len(streamed_text):]
+                else:
+                    remainder = ""
+                if remainder:
+                    yield "token", remainder
+                
+                self._cache_store(snapshot, cache_vector, include_sources, result, filters)
+                self._save_turn(session_id, query, result["response"])
+                yield "complete", result
+                
+            except Exception as e:
+                raise RuntimeError(f"Error processing query: {str(e)}")
+    
+    async def _aembed_for_cache(self, snapshot: AgentSnapshot, query: str):
+        """Embed the query for the semantic cache on the query thread pool."""
+        if snapshot.semantic_cache is None:
+            return None
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._query_pool, snapshot.semantic_cache.embed, query)
+    
+    def _cache_lookup(
+        self,
+        snapshot: AgentSnapshot,
+        vector,
+        include_sources: bool,
+        filters: Optional[Filters] = None
+    ) -> Optional[Dict[str, Any]]:
+        """Return a cached result for the query vector, if any."""
+        if snapshot.semantic_cache is None or vector is None:
+            return None
+        return snapshot.semantic_cache.lookup(vector, namespace=self._cache_namespace(include_sources, filters))
+    
+    def _cache_store(
+        self,
+        snapshot: AgentSnapshot,
+        vector,
+        include_sources: bool,
+        result: Dict[str, Any],
+        filters: Optional[Filters] = None
+    ) -> None:
+        """Remember a freshly computed result for similar future queries."""
+        if snapshot.semantic_cache is None or vector is None:
+            return
+        snapshot.semantic_cache.store(vector, result, namespace=self._cache_namespace(include_sources, filters))
+    
+    @staticmethod
+    def _cacheable(inputs: Dict[str, Any]) -> bool:
+        """
+        Only first turns use the semantic cache.
+        
+        A follow-up such as "how much does it cost?" means something different
+        in every conversation, so it is neither answered from nor stored in the
+        cache.
+        """
+        return not inputs["chat_history"]
+    
+    @staticmethod
+    def _cache_namespace(include_sources: bool, filters: Optional[Filters]) -> str:
+        """Answers are only reused for queries with the same options and retrieval scope."""
+        return f"sources={include_sources}|filters={json.dumps(filters, sort_keys=True)}"
+    
+    def _cached_result(self, query: str, cached: Dict[str, Any], start_time: float) -> Dict[str, Any]:
+        """Stamp a cached result with the current query, timing and timestamp."""
+        self.query_count += 1
+        return {
+            **cached,
+            "query": query,
+            "cached": True,
+            "processing_time": round(time.time() - start_time, 2),
+            "timestamp": datetime.now().isoformat()
+        }
+    
+    def _flight_key(
+        self,
+        snapshot: AgentSnapshot,
+        query: str,
+        filters: Optional[Filters] = None,
+        chat_history: Optional[List[Any]] = None
+    ) -> str:
+        """
+        Key identical queries for single-flight coalescing.
+        
+        Combines the normalised query text and retrieval filters with the
+        snapshot version and model configuration, so queries never join a run
+        on a snapshot other than their own. A hash of the conversation history
+        is included too, so a run is only shared by callers whose prompts are
+        identical; new conversations still coalesce with each other.
+        """
+        normalized = re.sub(r"\s+", " ", query).strip().lower()
+        history = json.dumps([[message.type, message.content] for message in chat_history or []])
+        return "|".join([
+            normalized,
+            json.dumps(filters, sort_keys=True),
+            hashlib.sha256(history.encode("utf-8")).hexdigest(),
+            f"v{snapshot.version}",
+            snapshot.config.llm_type,
+            self._model_name(snapshot.config),
+            str(snapshot.config.temperature),
+            str(snapshot.config.max_tokens)
+        ])
+    
+    def _build_inputs(self, query: str, session_id: Optional[str]) -> Dict[str, Any]:
+        """Build executor inputs with the session's bounded chat history."""
+        return {
+            "input": query,
+            "chat_history": self.sessions.load_history(session_id) if session_id else []
+        }
+    
+    def _save_turn(self, session_id: Optional[str], query: str, response: str) -> None:
+        """Record a turn in the session history; stateless queries are not kept."""
+        if session_id:
+            self.sessions.save_turn(session_id, query, response)
+    
+    async def _ainvoke(
+        self,
+        snapshot: AgentSnapshot,
+        inputs: Dict[str, Any],
+        callbacks: Optional[list] = None,
+        filters: Optional[Filters] = None
+    ) -> Any:
+        """Run the snapshot's agent executor natively async or on the query thread pool."""
+        run_config = {"callbacks": callbacks} if callbacks else None
+        with use_filters(filters):
+            if snapshot.native_async:
+                return await snapshot.executor.ainvoke(inputs, config=run_config)
             
-        except Exception as e:
-            processing_time = time.time() - start_time
-            raise RuntimeError(f"Error processing query: {str(e)}")
+            # Carry the filters over to the pool thread that runs the retriever
+            context = contextvars.copy_context()
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(
+                self._query_pool,
+                functools.partial(context.run, snapshot.executor.invoke, inputs, config=run_config)
+            )
+    
+    def _build_result(
+        self,
+        query: str,
+        response: Any,
+        include_sources: bool,
+        start_time: float
+    ) -> Dict[str, Any]:
+        """Convert a raw executor response into the query result dictionary."""
+        # Extract response text
+        response_text = response.get("output", str(response)) if isinstance(response, dict) else str(response)
+        
+        # Extract sources if requested
+        sources = None
+        if include_sources and isinstance(response, dict):
+            # Try to extract source documents from intermediate steps
+            if "intermediate_steps" in response:
+                sources = []
+                for step in response.get("intermediate_steps", []):
+                    if len(step) > 1 and hasattr(step[1], 'metadata'):
+                        source = step[1].metadata.get('source', 'unknown')
+                        if source not in sources:
+                            sources.append(source)
+        
+        processing_time = time.time() - start_time
+        self.query_count += 1
+        
+        return {
+            "query": query,
+            "response": response_text,
+            "sources": sources,
+            "processing_time": round(processing_time, 2),
+            "timestamp": datetime.now().isoformat(),
+            "cached": False
+        }
+    
+    def upsert_documents(self, documents: List[Document]) -> Dict[str, int]:
+        """
+        Add or replace knowledge base documents, keyed by metadata["source"].
+        
+        All documents sharing a source form the new content of that source. Only
+        chunks that are new or changed are embedded; chunks no longer present
+        are removed. Changes apply to the snapshot being served and are kept in
+        the document log, so later snapshots are rebuilt with them.
+        
+        Args:
+            documents: Documents to upsert
+            
+        Returns:
+            Counts of added, unchanged and removed chunks
+        """
+        with self._changes_lock, self._snapshots.acquire() as snapshot:
+            totals = self._upsert(snapshot, documents)
+            if self.document_log is not None:
+                self.document_log.record_upsert(documents)
+            self._invalidate_answers(snapshot)
+            return totals
+    
+    @staticmethod
+    def _upsert(snapshot: AgentSnapshot, documents: List[Document]) -> Dict[str, int]:
+        """Split documents and upsert them source by source into a snapshot's store."""
+        splitter = get_text_splitter(embeddings=snapshot.vector_store.embeddings)
+        totals = {"added": 0, "unchanged": 0, "removed": 0}
+        for source, source_documents in group_by_source(documents).items():
+            chunks = splitter.split_documents(source_documents)
+            counts = snapshot.vector_store.upsert_source_chunks(source, chunks)
+            for key, value in counts.items():
+                totals[key] += value
+        return totals
+    
+    def delete_documents(self, source: str) -> int:
+        """
+        Delete every chunk of a source from the knowledge base.
+        
+        Like upserts, the deletion is kept in the document log.
+        
+        Args:
+            source: The metadata["source"] value to delete
+            
+        Returns:
+            Number of chunks removed
+        """
+        with self._changes_lock, self._snapshots.acquire() as snapshot:
+            removed = snapshot.vector_store.delete_source(source)
+            if self.document_log is not None:
+                self.document_log.record_delete(source)
+            if removed:
+                self._invalidate_answers(snapshot)
+            return removed
+    
+    def _replay_changes(self, snapshot: AgentSnapshot) -> None:
+        """Apply the logged API changes to a snapshot. Caller must hold the changes lock."""
+        if self.document_log is None:
+            return
+        changes = self.document_log.changes()
+        if not changes:
+            return
+        # Changes to different sources commute, and re-applying one embeds nothing
+        for source, documents in changes.items():
+            if documents is None:
+                snapshot.vector_store.delete_source(source)
+        self._upsert(snapshot, [doc for documents in changes.values() if documents for doc in documents])
+        self._invalidate_answers(snapshot)
+        self.document_log.compact()
+        print(f"[INFO] Replayed API changes to {len(changes)} source(s) onto snapshot v{snapshot.version}")
+    
+    @staticmethod
+    def _invalidate_answers(snapshot: AgentSnapshot) -> None:
+        """Drop cached answers after the snapshot's knowledge base changed."""
+        if snapshot.semantic_cache is not None:
+            snapshot.semantic_cache.clear()
     
     def get_status(self) -> Dict[str, Any]:
         """
@@ -195,20 +791,54 @@ class AgentService:
         Returns:
             Dictionary containing agent status information
         """
-        model_name = ""
-        if self.config:
-            if self.config.llm_type == "groq":
-                model_name = self.config.groq_model_name
-            elif self.config.llm_type == "openai":
-                model_name = self.config.openai_model_name
-            else:
-                model_name = self.config.ollama_model_name
+        snapshot = self._snapshots.current
+        config = snapshot.config if snapshot else None
         
         return {
-            "initialized": self.executor is not None,
-            "llm_type": self.config.llm_type if self.config else "not_configured",
-            "model_name": model_name,
-            "total_queries": self.query_count
+            "initialized": snapshot is not None,
+            "llm_type": config.llm_type if config else "not_configured",
+            "model_name": self._model_name(config) if config else "",
+            "total_queries": self.query_count,
+            "active_sessions": len(self.sessions),
+            "coalesced_queries": self._single_flight.coalesced,
+            "semantic_cache": snapshot.semantic_cache.stats() if snapshot and snapshot.semantic_cache else None,
+            "retrieval_cache": self._retrieval_cache_stats(snapshot),
+            "embedding_models": embedding_registry.metrics(),
+            "snapshots": self._snapshots.stats()
+        }
+    
+    @staticmethod
+    def _retrieval_cache_stats(snapshot: Optional[AgentSnapshot]) -> Optional[Dict[str, Any]]:
+        cache = getattr(snapshot.vector_store, "retrieval_cache", None) if snapshot else None
+        return cache.stats() if cache else None
+    
+    @staticmethod
+    def _model_name(config: AgentParameters) -> str:
+        if config.llm_type == "groq":
+            return config.groq_model_name
+        if config.llm_type == "openai":
+            return config.openai_model_name
+        return config.ollama_model_name
+    
+    def get_readiness(self) -> Dict[str, Any]:
+        """
+        Get the readiness of the agent for serving queries.
+        
+        Returns:
+            Dictionary with the ready flag, phase timings and any warm-up error
+        """
+        if self.ready:
+            state = "ready"
+        elif self.warmup_error:
+            state = "failed"
+        else:
+            state = "warming_up"
+        
+        return {
+            "status": state,
+            "ready": self.ready,
+            "phases": dict(self.warmup_timings),
+            "error": self.warmup_error
         }
     
     def get_config(self) -> Dict[str, Any]:
@@ -218,19 +848,20 @@ class AgentService:
         Returns:
             Dictionary containing configuration details
         """
-        if not self.config:
+        config = self.config
+        if not config:
             raise RuntimeError("Agent not initialized")
         
         return {
-            "llm_type": self.config.llm_type,
-            "model_name": (
-                self.config.groq_model_name if self.config.llm_type == "groq"
-                else self.config.openai_model_name if self.config.llm_type == "openai"
-                else self.config.ollama_model_name
-            ),
-            "temperature": self.config.temperature,
-            "max_tokens": self.config.max_tokens
+            "llm_type": config.llm_type,
+            "model_name": self._model_name(config),
+            "temperature": config.temperature,
+            "max_tokens": config.max_tokens
         }
+    
+    def shutdown(self) -> None:
+        """Release the query thread pool."""
+        self._query_pool.shutdown(wait=False, cancel_futures=True)
 
 
 agent_service = AgentService()
@@ -1,7 +1,9 @@
 """
 Authentication middleware and utilities for API key validation.
 """
-from fastapi import HTTPException, Security, status
+import hashlib
+
+from fastapi import HTTPException, Header, Security, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from typing import Optional
 
@@ -59,3 +61,36 @@ def validate_api_key_optional(
     if not credentials:
         return None
     return validate_api_key(credentials)
+
+
+def scoped_session_id(api_key: str, session_id: Optional[str] = None) -> str:
+    """
+    Namespace a client-chosen session id under the API key that sent it.
+    
+    Session ids come from the client, so they are prefixed with a hash of the
+    key: another key sending the same id gets a different conversation, and the
+    key itself is never used as a session id.
+    
+    Args:
+        api_key: The authenticated API key
+        session_id: Session id sent by the client, if any
+        
+    Returns:
+        Session id unique to this key
+    """
+    key_hash = hashlib.sha256(api_key.encode("utf-8")).hexdigest()[:32]
+    session_id = (session_id or "").strip()
+    return f"{key_hash}:{session_id}" if session_id else key_hash
+
+
+def get_session_id(
+    x_session_id: Optional[str] = Header(default=None),
+    credentials: HTTPAuthorizationCredentials = Security(security)
+) -> str:
+    """
+    Resolve the conversation session for a request.
+    
+    Uses the X-Session-ID header when provided, otherwise one default session
+    per API key. Either way the session is scoped to the caller's key.
+    """
+    return scoped_session_id(credentials.credentials, x_session_id)
@@ -2,7 +2,7 @@
 Configuration management for the FastAPI application.
 """
 import os
-from typing import Literal
+from typing import Literal, Optional
 from pydantic_settings import BaseSettings
 
 
@@ -33,6 +33,60 @@ class Settings(BaseSettings):
     # Agent Configuration
     temperature: float = 0.2
     max_tokens: int = 1200
+    agent_tool_mode: Literal["qa", "retrieval"] = "qa"  # "retrieval" skips the knowledge base tool's own LLM call
+    agent_retrieval_k: int = 4  # Passages returned per knowledge base lookup in "retrieval" mode
+    
+    # Query Execution Configuration
+    query_thread_pool_size: int = 16  # Worker threads for providers without native async
+    batch_max_concurrency: int = 8  # Upper bound on concurrent queries per batch request
+    batch_max_items: int = 500
+    stream_frame_interval_ms: int = 40  # Streamed tokens are coalesced into frames this often
+    
+    # Knowledge Base Configuration
+    index_cache_enabled: bool = True  # Reuse a persisted index when the documents are unchanged
+    index_dir: str = os.getenv("INDEX_DIR", "index_cache")
+    embedding_cache_dir: str = os.getenv("EMBEDDING_CACHE_DIR", "embedding_cache")  # Empty to disable
+    document_log_path: str = os.getenv("DOCUMENT_LOG_PATH", "document_log.jsonl")  # API changes replayed on rebuilds; empty to disable
+    dedup_threshold: Optional[float] = 0.9  # Jaccard similarity for dropping near-duplicate chunks; None keeps all
+    
+    # Vector Index Configuration
+    ann_index_type: Literal["auto", "flat", "ivf_flat", "ivf_pq", "hnsw"] = "auto"  # "auto" picks by corpus size
+    ann_nlist: Optional[int] = None  # IVF lists; defaults to ~4 * sqrt(number of chunks)
+    ann_hnsw_m: int = 32  # HNSW graph degree
+    ann_storage: Literal["float32", "float16", "int8"] = "float32"  # Precision of vectors held in the index
+    ann_rerank: bool = False  # Rerank top hits exactly from memory-mapped float32 vectors
+    ann_rerank_factor: int = 4  # Candidates fetched per result when reranking
+    ann_nprobe: int = 16  # IVF lists scanned per query (recall vs latency)
+    ann_ef_search: int = 64  # HNSW candidate list size per query (recall vs latency)
+    hybrid_search_enabled: bool = True  # Fuse BM25 keyword hits with vector hits (exact AWS identifiers)
+    hybrid_rrf_k: int = 60  # Reciprocal rank fusion constant
+    index_num_shards: int = 1  # Split the index into shards built and searched in parallel
+    index_shard_by: Literal["hash", "category"] = "hash"  # Shard by source hash, or by category
+    
+    # Startup Configuration
+    warmup_on_startup: bool = True  # Build the index and agent before reporting ready
+    warmup_queries: list = [
+        "What is AWS EC2?",
+        "How do I create an S3 bucket?",
+        "IAM best practices"
+    ]
+    snapshot_history: int = 1  # Previous agent snapshots kept in memory for rollback; 0 disables rollback
+    
+    # Session Memory Configuration
+    session_max_sessions: int = 1000  # Least recently used sessions are evicted beyond this
+    session_ttl_seconds: float = 3600  # Idle sessions are dropped after this long
+    session_max_turns: int = 10  # Question/answer pairs kept per session
+    
+    # Semantic Cache Configuration
+    semantic_cache_enabled: bool = True
+    semantic_cache_threshold: float = 0.95  # Minimum cosine similarity for a cache hit
+    semantic_cache_max_entries: int = 1000
+    semantic_cache_ttl_seconds: float = 3600
+    
+    # Retrieval Cache Configuration
+    retrieval_cache_enabled: bool = True
+    retrieval_cache_max_entries: int = 4096  # Least recently used search results are evicted beyond this
+    retrieval_cache_threshold: float = 0.98  # Cosine similarity above which a search reuses a cached query's results
     
     # AWS Configuration (if needed)
     aws_region: str = os.getenv("AWS_REGION", "us-east-1")
@@ -0,0 +1,98 @@
+"""
+Durable log of knowledge base changes made through the API.
+
+Upserted documents and deleted sources only change the snapshot being
+served. The log records them so that every snapshot built later, after a
+restart or a reload, can replay them on top of the configured documents.
+"""
+import json
+import os
+import threading
+from typing import Dict, List, Optional
+
+from langchain_community.docstore.document import Document
+
+from steps.vector_store import group_by_source
+
+
+class DocumentLog:
+    """
+    Append-only JSON lines file of per-source changes.
+
+    Each line holds the complete new documents of one source, or ``null`` for a
+    deleted source. Only the last change of a source matters, so ``compact``
+    can rewrite the file with one line per source.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def _append(self, entries: List[Dict]) -> None:
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with self._lock, open(self.path, "a", encoding="utf-8") as f:
+            for entry in entries:
+                f.write(json.dumps(entry, default=str) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+
+    def record_upsert(self, documents: List[Document]) -> None:
+        """Record the new documents of every source they belong to."""
+        self._append([
+            {
+                "source": source,
+                "documents": [{"page_content": doc.page_content, "metadata": doc.metadata} for doc in source_documents],
+            }
+            for source, source_documents in group_by_source(documents).items()
+        ])
+
+    def record_delete(self, source: str) -> None:
+        """Record that a source was deleted."""
+        self._append([{"source": source, "documents": None}])
+
+    def changes(self) -> Dict[str, Optional[List[Document]]]:
+        """
+        Return the last change of each source, in the order they were last changed.
+
+        Returns:
+            Source -> its documents, or None if it was deleted
+        """
+        with self._lock:
+            return self._read()
+
+    def _read(self) -> Dict[str, Optional[List[Document]]]:
+        """Parse the log. Caller must hold the lock."""
+        changes: Dict[str, Optional[List[Document]]] = {}
+        if not os.path.exists(self.path):
+            return changes
+        with open(self.path, encoding="utf-8") as f:
+            lines = f.readlines()
+        for line in lines:
+            try:
+                entry = json.loads(line)
+            except json.JSONDecodeError:
+                # A write cut short by a crash; the change it held was never acknowledged
+                continue
+            documents = entry["documents"]
+            changes.pop(entry["source"], None)
+            changes[entry["source"]] = None if documents is None else [
+                Document(page_content=doc["page_content"], metadata=doc["metadata"]) for doc in documents
+            ]
+        return changes
+
+    def compact(self) -> None:
+        """Rewrite the log with only the last change of each source."""
+        tmp_path = f"{self.path}.tmp"
+        with self._lock:
+            changes = self._read()
+            if not changes:
+                return
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                for source, documents in changes.items():
+                    serialized = None if documents is None else [
+                        {"page_content": doc.page_content, "metadata": doc.metadata} for doc in documents
+                    ]
+                    f.write(json.dumps({"source": source, "documents": serialized}, default=str) + "\n")
+            os.replace(tmp_path, self.path)
@@ -5,7 +5,9 @@ AWS Support Agent API Backend
 from fastapi import FastAPI, status
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import JSONResponse
+from contextlib import asynccontextmanager
 from datetime import datetime
+import asyncio
 import sys
 import os
 
@@ -13,10 +15,57 @@ import os
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from api.config import settings
-from api.models import HealthResponse
+from api.agent_service import agent_service
+from api.models import HealthResponse, ReadinessResponse
 from api.routers import agent, auth_router
 from api.routers.websocket import socket_app
 
+
+async def warm_up_agent():
+    """
+    Warm the agent up in the background so liveness probes answer immediately.
+    """
+    loop = asyncio.get_running_loop()
+    try:
+        await loop.run_in_executor(None, agent_service.warm_up)
+    except Exception as e:
+        print(f"[ERROR] Warm-up failed: {e}")
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """
+    Run on application startup and shutdown.
+    """
+    print("=" * 60)
+    print(f"{settings.app_name} v{settings.app_version}")
+    print("=" * 60)
+    print(f"📚 Documentation: http://localhost:8000/docs")
+    print(f"🔄 ReDoc: http://localhost:8000/redoc")
+    print(f"🤖 LLM Type: {settings.llm_type}")
+    print(f"📝 Model: {settings.groq_model_name if settings.llm_type == 'groq' else settings.openai_model_name if settings.llm_type == 'openai' else settings.ollama_model_name}")
+    print(f"🔐 Authentication: Enabled (API Key)")
+    print(f"⚡ WebSocket Streaming: Enabled at /ws")
+    print("=" * 60)
+    
+    warmup_task = None
+    if settings.warmup_on_startup:
+        print("🔥 Warming up agent in the background, see /ready")
+        warmup_task = asyncio.create_task(warm_up_agent())
+    else:
+        print("⚠️  Note: Call /agent/initialize before making queries")
+    print("=" * 60)
+    
+    yield
+    
+    print("\n" + "=" * 60)
+    print("Shutting down AWS Support Agent API...")
+    print("=" * 60)
+    if warmup_task is not None:
+        warmup_task.cancel()
+    agent_service.shutdown()
+
+
 # Create FastAPI application
 app = FastAPI(
     title=settings.app_name,
@@ -24,7 +73,8 @@ app = FastAPI(
     version=settings.app_version,
     docs_url="/docs",
     redoc_url="/redoc",
-    openapi_url="/openapi.json"
+    openapi_url="/openapi.json",
+    lifespan=lifespan
 )
 
 # Configure CORS
@@ -44,35 +94,6 @@ app.include_router(auth_router.router)
 app.mount("/ws", socket_app)
 
 
-@app.on_event("startup")
-async def startup_event():
-    """
-    Run on application startup.
-    """
-    print("=" * 60)
-    print(f"{settings.app_name} v{settings.app_version}")
-    print("=" * 60)
-    print(f"📚 Documentation: http://localhost:8000/docs")
-    print(f"🔄 ReDoc: http://localhost:8000/redoc")
-    print(f"🤖 LLM Type: {settings.llm_type}")
-    print(f"📝 Model: {settings.groq_model_name if settings.llm_type == 'groq' else settings.openai_model_name if settings.llm_type == 'openai' else settings.ollama_model_name}")
-    print(f"🔐 Authentication: Enabled (API Key)")
-    print(f"⚡ WebSocket Streaming: Enabled at /ws")
-    print("=" * 60)
-    print("⚠️  Note: Call /agent/initialize before making queries")
-    print("=" * 60)
-
-
-@app.on_event("shutdown")
-async def shutdown_event():
-    """
-    Run on application shutdown.
-    """
-    print("\n" + "=" * 60)
-    print("Shutting down AWS Support Agent API...")
-    print("=" * 60)
-
-
 @app.get(
     "/",
     response_model=HealthResponse,
@@ -100,7 +121,8 @@ async def root():
 )
 async def health_check():
     """
-    Health check endpoint.
+    Health check endpoint (liveness).
+    Answers as soon as the process is up, even while the agent is warming up.
     """
     return HealthResponse(
         status="healthy",
@@ -109,6 +131,30 @@ async def health_check():
     )
 
 
+@app.get(
+    "/ready",
+    response_model=ReadinessResponse,
+    status_code=status.HTTP_200_OK,
+    summary="Readiness Check",
+    description="Returns 200 once the agent is warmed up and can serve queries, 503 until then.",
+    responses={503: {"model": ReadinessResponse, "description": "Agent not ready"}}
+)
+async def readiness_check():
+    """
+    Readiness endpoint for load balancers.
+    """
+    readiness = ReadinessResponse(
+        **agent_service.get_readiness(),
+        timestamp=datetime.now().isoformat()
+    )
+    if not readiness.ready:
+        return JSONResponse(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            content=readiness.model_dump()
+        )
+    return readiness
+
+
 @app.exception_handler(404)
 async def not_found_handler(request, exc):
     """
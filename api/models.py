@@ -1,10 +1,12 @@
 """
 Pydantic models for request/response validation.
 """
-from typing import Optional, List, Dict, Any
-from pydantic import BaseModel, Field
+from typing import Optional, List, Dict, Any, Union
+from pydantic import BaseModel, Field, field_validator
 from datetime import datetime
 
+from steps.metadata_index import normalize_filters
+
 
 class HealthResponse(BaseModel):
     """Health check response model."""
@@ -13,24 +15,49 @@ class HealthResponse(BaseModel):
     timestamp: str = Field(..., description="Current timestamp")
 
 
+class ReadinessResponse(BaseModel):
+    """Readiness probe response model."""
+    status: str = Field(..., description="ready, warming_up or failed")
+    ready: bool = Field(..., description="Whether the service can serve queries")
+    phases: Dict[str, float] = Field(default_factory=dict, description="Seconds spent in each warm-up phase")
+    error: Optional[str] = Field(default=None, description="Warm-up error, if any")
+    timestamp: str = Field(..., description="Current timestamp")
+
+
 class AgentStatusResponse(BaseModel):
     """Agent status response model."""
     initialized: bool = Field(..., description="Whether the agent is initialized")
     llm_type: str = Field(..., description="Type of LLM being used")
     model_name: str = Field(..., description="Name of the model")
     total_queries: int = Field(default=0, description="Total number of queries processed")
+    active_sessions: int = Field(default=0, description="Number of conversation sessions held in memory")
+    coalesced_queries: int = Field(default=0, description="Queries that joined an identical in-flight query")
+    semantic_cache: Optional[Dict[str, Any]] = Field(default=None, description="Semantic answer cache hit/miss counters")
+    retrieval_cache: Optional[Dict[str, Any]] = Field(default=None, description="Retrieval result cache hit rate and search time saved")
+    embedding_models: List[Dict[str, Any]] = Field(default_factory=list, description="Loaded embedding models with load time and weight size")
+    snapshots: Optional[Dict[str, Any]] = Field(default=None, description="Serving snapshot version, versions kept for rollback and in-flight queries per version")
 
 
 class QueryRequest(BaseModel):
     """Request model for querying the agent."""
     query: str = Field(..., min_length=1, max_length=2000, description="User query about AWS")
     include_sources: bool = Field(default=False, description="Include source documents in response")
+    filters: Optional[Dict[str, Union[str, List[str]]]] = Field(
+        default=None,
+        description="Restrict retrieval to chunks whose category/source is one of the given values"
+    )
+    
+    @field_validator("filters")
+    @classmethod
+    def validate_filters(cls, filters):
+        return normalize_filters(filters)
     
     class Config:
         json_schema_extra = {
             "example": {
                 "query": "What is AWS EC2?",
-                "include_sources": False
+                "include_sources": False,
+                "filters": {"category": ["compute"]}
             }
         }
 
@@ -42,6 +69,7 @@ class QueryResponse(BaseModel):
     sources: Optional[List[str]] = Field(default=None, description="Source documents used")
     processing_time: float = Field(..., description="Time taken to process query (seconds)")
     timestamp: str = Field(..., description="Timestamp of the response")
+    cached: bool = Field(default=False, description="Whether the answer was served from the semantic cache")
     
     class Config:
         json_schema_extra = {
@@ -50,11 +78,83 @@ class QueryResponse(BaseModel):
                 "response": "AWS EC2 (Elastic Compute Cloud) provides scalable computing capacity...",
                 "sources": ["ec2_documentation"],
                 "processing_time": 1.23,
-                "timestamp": "2025-11-22T10:30:00"
+                "timestamp": "2025-11-22T10:30:00",
+                "cached": False
             }
         }
 
 
+class BatchQueryRequest(BaseModel):
+    """Request model for running many queries in one call."""
+    queries: List[QueryRequest] = Field(..., min_length=1, description="Queries to run")
+    max_concurrency: Optional[int] = Field(
+        default=None,
+        ge=1,
+        description="Maximum queries run at once (capped by the server setting)"
+    )
+    stream: bool = Field(default=False, description="Stream results as NDJSON as they finish")
+    
+    class Config:
+        json_schema_extra = {
+            "example": {
+                "queries": [
+                    {"query": "What is AWS EC2?"},
+                    {"query": "How do I make an S3 bucket public?", "include_sources": True}
+                ],
+                "max_concurrency": 4,
+                "stream": False
+            }
+        }
+
+
+class BatchQueryItem(BaseModel):
+    """Result of a single query within a batch."""
+    index: int = Field(..., description="Position of the query in the request")
+    result: Optional[QueryResponse] = Field(default=None, description="Query result on success")
+    error: Optional[str] = Field(default=None, description="Error message on failure")
+
+
+class BatchQueryResponse(BaseModel):
+    """Response model for batch queries."""
+    results: List[BatchQueryItem] = Field(..., description="Per-query results in request order")
+    succeeded: int = Field(..., description="Number of queries that succeeded")
+    failed: int = Field(..., description="Number of queries that failed")
+    processing_time: float = Field(..., description="Time taken to process the batch (seconds)")
+
+
+class DocumentInput(BaseModel):
+    """A knowledge base document to add or update."""
+    source: str = Field(..., min_length=1, description="Source identifier (e.g. the page URL)")
+    content: str = Field(..., min_length=1, description="Document text")
+    metadata: Dict[str, Any] = Field(default_factory=dict, description="Additional metadata (e.g. category)")
+
+
+class DocumentUpsertRequest(BaseModel):
+    """Request model for adding or updating knowledge base documents."""
+    documents: List[DocumentInput] = Field(..., min_length=1, description="Documents to upsert")
+    
+    class Config:
+        json_schema_extra = {
+            "example": {
+                "documents": [
+                    {
+                        "source": "s3_documentation",
+                        "content": "AWS S3 (Simple Storage Service) is object storage...",
+                        "metadata": {"category": "storage"}
+                    }
+                ]
+            }
+        }
+
+
+class DocumentMutationResponse(BaseModel):
+    """Response model for knowledge base updates."""
+    added: int = Field(default=0, description="Chunks embedded and added")
+    unchanged: int = Field(default=0, description="Chunks kept without re-embedding")
+    removed: int = Field(default=0, description="Chunks removed")
+    processing_time: float = Field(..., description="Time taken to apply the change (seconds)")
+
+
 class ErrorResponse(BaseModel):
     """Error response model."""
     error: str = Field(..., description="Error type")
@@ -3,17 +3,29 @@ Agent API Router
 Handles all agent-related endpoints including queries, status, and configuration.
 """
 from fastapi import APIRouter, HTTPException, status, Depends
+from fastapi.responses import StreamingResponse
+from starlette.concurrency import run_in_threadpool
 from datetime import datetime
+import asyncio
+import json
+import time
 
+from api.config import settings
 from api.models import (
     QueryRequest,
     QueryResponse,
+    BatchQueryRequest,
+    BatchQueryItem,
+    BatchQueryResponse,
+    DocumentUpsertRequest,
+    DocumentMutationResponse,
     AgentStatusResponse,
     ConfigResponse,
     ErrorResponse
 )
 from api.agent_service import agent_service
-from api.auth import validate_api_key
+from api.auth import validate_api_key, get_session_id
+from langchain_community.docstore.document import Document
 
 router = APIRouter(
     prefix="/agent",
@@ -32,12 +44,20 @@ router = APIRouter(
     summary="Query the AWS Support Agent",
     description="Send a query to the AWS Support Agent and get a response based on AWS documentation and knowledge base."
 )
-async def query_agent(request: QueryRequest, user: dict = Depends(validate_api_key)):
+async def query_agent(
+    request: QueryRequest,
+    user: dict = Depends(validate_api_key),
+    session_id: str = Depends(get_session_id)
+):
     """
     Query the AWS Support Agent with a question about AWS services.
     
     - **query**: Your question about AWS (required, 1-2000 characters)
     - **include_sources**: Whether to include source documents in the response (optional)
+    - **filters**: Only retrieve from these categories/sources, e.g. `{"category": ["compute"]}` (optional)
+    
+    Conversation history is kept per session. Send an `X-Session-ID` header to
+    separate conversations that share an API key.
     
     Returns the agent's response along with metadata like processing time and timestamp.
     
@@ -52,9 +72,11 @@ async def query_agent(request: QueryRequest, user: dict = Depends(validate_api_k
             )
         
         # Process query
-        result = agent_service.query_agent(
+        result = await agent_service.aquery_agent(
             query=request.query,
-            include_sources=request.include_sources
+            include_sources=request.include_sources,
+            session_id=session_id,
+            filters=request.filters
         )
         
         return QueryResponse(**result)
@@ -68,6 +90,137 @@ async def query_agent(request: QueryRequest, user: dict = Depends(validate_api_k
         )
 
 
+@router.post(
+    "/query/stream",
+    status_code=status.HTTP_200_OK,
+    summary="Stream a query response (Server-Sent Events)",
+    description="Query the AWS Support Agent and receive the answer as a text/event-stream."
+)
+async def query_agent_stream(
+    request: QueryRequest,
+    user: dict = Depends(validate_api_key),
+    session_id: str = Depends(get_session_id)
+):
+    """
+    Query the AWS Support Agent and stream the answer with Server-Sent Events.
+    
+    Events:
+    - **token**: `{"text": ...}` incremental answer text
+    - **retrieval**: `{"chunks": [...], "sources": [...]}` after each knowledge base lookup
+    - **complete**: the full QueryResponse, including `processing_time`
+    - **error**: `{"message": ...}` if the query fails after the stream started
+    
+    Requires authentication via Bearer token.
+    """
+    if not agent_service.get_status()["initialized"]:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Agent not initialized. Please call /agent/initialize first."
+        )
+    
+    async def sse_events():
+        try:
+            async for event, data in agent_service.astream_query(
+                query=request.query,
+                include_sources=request.include_sources,
+                session_id=session_id,
+                filters=request.filters
+            ):
+                if event == "token":
+                    payload = {"text": data}
+                elif event == "complete":
+                    payload = QueryResponse(**data).model_dump()
+                else:
+                    payload = data
+                yield f"event: {event}\ndata: {json.dumps(payload)}\n\n"
+        except Exception as e:
+            yield f"event: error\ndata: {json.dumps({'message': str(e)})}\n\n"
+    
+    return StreamingResponse(
+        sse_events(),
+        media_type="text/event-stream",
+        headers={
+            "Cache-Control": "no-cache",
+            "X-Accel-Buffering": "no"  # Disable proxy buffering (nginx)
+        }
+    )
+
+
+@router.post(
+    "/query/batch",
+    response_model=BatchQueryResponse,
+    status_code=status.HTTP_200_OK,
+    summary="Run a batch of queries",
+    description="Run many queries concurrently and return per-item results and errors."
+)
+async def query_agent_batch(request: BatchQueryRequest, user: dict = Depends(validate_api_key)):
+    """
+    Run a batch of queries against the AWS Support Agent.
+    
+    - **queries**: List of query requests (same shape as /agent/query)
+    - **max_concurrency**: Maximum queries run at once, capped by the server setting (optional)
+    - **stream**: Return results as NDJSON lines in completion order (optional)
+    
+    A failing query is reported in its item's `error` field and does not fail the batch.
+    Batch queries are stateless and do not use or extend conversation history.
+    
+    Requires authentication via Bearer token.
+    """
+    if not agent_service.get_status()["initialized"]:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Agent not initialized. Please call /agent/initialize first."
+        )
+    
+    if len(request.queries) > settings.batch_max_items:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Batch too large: at most {settings.batch_max_items} queries are allowed"
+        )
+    
+    concurrency = min(request.max_concurrency or settings.batch_max_concurrency, settings.batch_max_concurrency)
+    semaphore = asyncio.Semaphore(concurrency)
+    start_time = time.time()
+    
+    async def run_item(index: int, item: QueryRequest) -> BatchQueryItem:
+        async with semaphore:
+            try:
+                result = await agent_service.aquery_agent(
+                    query=item.query,
+                    include_sources=item.include_sources,
+                    session_id=None,
+                    filters=item.filters
+                )
+                return BatchQueryItem(index=index, result=QueryResponse(**result))
+            except Exception as e:
+                return BatchQueryItem(index=index, error=str(e))
+    
+    tasks = [asyncio.create_task(run_item(i, item)) for i, item in enumerate(request.queries)]
+    
+    if request.stream:
+        async def ndjson_results():
+            try:
+                for finished in asyncio.as_completed(tasks):
+                    item = await finished
+                    yield item.model_dump_json() + "\n"
+            finally:
+                # Client went away: stop the queries that have not run yet
+                for task in tasks:
+                    task.cancel()
+        
+        return StreamingResponse(ndjson_results(), media_type="application/x-ndjson")
+    
+    items = await asyncio.gather(*tasks)
+    failed = sum(1 for item in items if item.error is not None)
+    
+    return BatchQueryResponse(
+        results=items,
+        succeeded=len(items) - failed,
+        failed=failed,
+        processing_time=round(time.time() - start_time, 2)
+    )
+
+
 @router.get(
     "/status",
     response_model=AgentStatusResponse,
@@ -109,25 +262,25 @@ async def initialize_agent(force_reinit: bool = False, user: dict = Depends(vali
     
     - **force_reinit**: Force re-initialization even if already initialized (optional, default: False)
     
-    This endpoint loads the knowledge base, creates embeddings, and initializes the LLM.
-    First-time initialization may take a few seconds.
+    This endpoint loads the knowledge base, creates embeddings, initializes the LLM
+    and warms up the index. The server already does this on startup unless
+    `warmup_on_startup` is disabled.
+    
+    A re-initialization builds a new snapshot while the current one keeps
+    serving, then swaps it in; queries in flight finish on the old snapshot.
     
     Requires authentication via Bearer token.
     """
     try:
-        success = agent_service.initialize_agent(force_reinit=force_reinit)
+        phases = await run_in_threadpool(agent_service.warm_up, force_reinit)
         
-        if success:
-            return {
-                "status": "success",
-                "message": "AWS Support Agent initialized successfully",
-                "timestamp": datetime.now().isoformat()
-            }
-        else:
-            raise HTTPException(
-                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-                detail="Failed to initialize agent"
-            )
+        return {
+            "status": "success",
+            "message": "AWS Support Agent initialized successfully",
+            "phases": phases,
+            "snapshot": agent_service.get_status()["snapshots"]["version"],
+            "timestamp": datetime.now().isoformat()
+        }
             
     except Exception as e:
         raise HTTPException(
@@ -136,6 +289,37 @@ async def initialize_agent(force_reinit: bool = False, user: dict = Depends(vali
         )
 
 
+@router.post(
+    "/rollback",
+    status_code=status.HTTP_200_OK,
+    summary="Roll Back the Agent",
+    description="Serve the previous agent snapshot again, e.g. after a bad re-initialization."
+)
+async def rollback_agent(user: dict = Depends(validate_api_key)):
+    """
+    Roll back to the previous agent snapshot.
+    
+    The swap is atomic: queries in flight finish on the snapshot they started
+    with. Only `snapshot_history` previous snapshots are kept.
+    
+    Requires authentication via Bearer token.
+    """
+    try:
+        snapshots = agent_service.rollback_agent()
+    except RuntimeError as e:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail=str(e)
+        )
+    
+    return {
+        "status": "success",
+        "message": f"Rolled back to snapshot v{snapshots['version']}",
+        "snapshots": snapshots,
+        "timestamp": datetime.now().isoformat()
+    }
+
+
 @router.get(
     "/config",
     response_model=ConfigResponse,
@@ -168,3 +352,73 @@ async def get_agent_config(user: dict = Depends(validate_api_key)):
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Error getting agent configuration: {str(e)}"
         )
+
+
+@router.put(
+    "/documents",
+    response_model=DocumentMutationResponse,
+    status_code=status.HTTP_200_OK,
+    summary="Add or Update Documents",
+    description="Upsert knowledge base documents by source, re-embedding only changed chunks."
+)
+async def upsert_documents(request: DocumentUpsertRequest, user: dict = Depends(validate_api_key)):
+    """
+    Add or update documents in the knowledge base.
+    
+    - **documents**: Documents with `source`, `content` and optional `metadata`
+    
+    Documents sharing a `source` replace that source's previous content.
+    Unchanged chunks are kept as they are; only new or changed chunks are embedded.
+    
+    Requires authentication via Bearer token.
+    """
+    start_time = time.time()
+    documents = [
+        Document(page_content=doc.content, metadata={**doc.metadata, "source": doc.source})
+        for doc in request.documents
+    ]
+    try:
+        counts = await run_in_threadpool(agent_service.upsert_documents, documents)
+        return DocumentMutationResponse(**counts, processing_time=round(time.time() - start_time, 3))
+    except RuntimeError as e:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail=str(e)
+        )
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Error updating documents: {str(e)}"
+        )
+
+
+@router.delete(
+    "/documents/{source:path}",
+    response_model=DocumentMutationResponse,
+    status_code=status.HTTP_200_OK,
+    summary="Delete Documents",
+    description="Remove every chunk of a source from the knowledge base."
+)
+async def delete_documents(source: str, user: dict = Depends(validate_api_key)):
+    """
+    Delete a source from the knowledge base.
+    
+    - **source**: The source identifier used when the document was added
+    
+    Requires authentication via Bearer token.
+    """
+    start_time = time.time()
+    try:
+        removed = await run_in_threadpool(agent_service.delete_documents, source)
+    except RuntimeError as e:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail=str(e)
+        )
+    
+    if not removed:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Source not found: {source}"
+        )
+    return DocumentMutationResponse(removed=removed, processing_time=round(time.time() - start_time, 3))
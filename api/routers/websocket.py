@@ -4,8 +4,9 @@ Handles real-time streaming of agent responses using Socket.IO.
 """
 import socketio
 from fastapi import APIRouter
-import asyncio
 from api.agent_service import agent_service
+from api.auth import scoped_session_id
+from steps.metadata_index import normalize_filters
 
 # Create Socket.IO server
 sio = socketio.AsyncServer(
@@ -43,6 +44,8 @@ async def connect(sid, environ, auth):
 async def disconnect(sid):
     """Handle client disconnection."""
     print(f"Client disconnected: {sid}")
+    # Connection-scoped conversations cannot be resumed, so free them now
+    agent_service.sessions.clear(sid)
 
 
 @sio.event
@@ -53,8 +56,14 @@ async def query(sid, data):
     Expected data format:
     {
         "query": "What is AWS EC2?",
-        "include_sources": false
+        "include_sources": false,
+        "session_id": "optional-conversation-id",
+        "filters": {"category": ["compute"]}
     }
+    
+    Without a session_id the Socket.IO connection id is used, so each
+    connection keeps its own conversation history. A given session_id is
+    scoped to the connection's token, so it cannot reach other keys' sessions.
     """
     try:
         # Verify authentication
@@ -66,39 +75,38 @@ async def query(sid, data):
         # Get query parameters
         query_text = data.get('query', '').strip()
         include_sources = data.get('include_sources', False)
+        session_id = data.get('session_id')
+        session_id = scoped_session_id(session['token'], session_id) if session_id else sid
         
         if not query_text:
             await sio.emit('error', {'message': 'Query is required'}, room=sid)
             return
         
+        try:
+            filters = normalize_filters(data.get('filters'))
+        except (ValueError, AttributeError, TypeError) as e:
+            await sio.emit('error', {'message': f'Invalid filters: {e}'}, room=sid)
+            return
+        
         # Check if agent is initialized
         if not agent_service.get_status()["initialized"]:
             await sio.emit('error', {'message': 'Agent not initialized'}, room=sid)
             return
         
-        # Stream the response
-        # For now, we'll simulate streaming by chunking the response
-        # In production, integrate with LLM streaming API
-        result = agent_service.query_agent(query_text, include_sources)
-        
-        response_text = result.get('response', '')
-        
-        # Simulate streaming by sending chunks
-        chunk_size = 10  # words per chunk
-        words = response_text.split()
-        
-        for i in range(0, len(words), chunk_size):
-            chunk = ' '.join(words[i:i + chunk_size]) + ' '
-            await sio.emit('chunk', {'chunk': chunk}, room=sid)
-            await asyncio.sleep(0.1)  # Small delay for streaming effect
-        
-        # Send completion event
-        await sio.emit('complete', {
-            'query': query_text,
-            'processing_time': result.get('processing_time'),
-            'timestamp': result.get('timestamp'),
-            'sources': result.get('sources')
-        }, room=sid)
+        # Stream the final answer as the LLM generates it
+        async for event, payload in agent_service.astream_query(query_text, include_sources, session_id, filters):
+            if event == 'token':
+                await sio.emit('chunk', {'chunk': payload}, room=sid)
+            elif event == 'retrieval':
+                await sio.emit('retrieval', payload, room=sid)
+            elif event == 'complete':
+                await sio.emit('complete', {
+                    'query': query_text,
+                    'processing_time': payload.get('processing_time'),
+                    'timestamp': payload.get('timestamp'),
+                    'sources': payload.get('sources'),
+                    'cached': payload.get('cached', False)
+                }, room=sid)
         
     except Exception as e:
         print(f"Error in query handler: {e}")
@@ -0,0 +1,143 @@
+"""
+Semantic answer cache for the AWS Support Agent.
+Looks up previously answered queries by embedding similarity so repeated
+questions skip the agent loop entirely.
+"""
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+import faiss
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+
+class SemanticCache:
+    """
+    Bounded cache of agent answers keyed by query embedding.
+
+    Query vectors are L2-normalised and stored in a small inner-product FAISS
+    index, so the similarity score is the cosine similarity. Entries are evicted
+    least recently used first once ``max_entries`` is exceeded, and ignored once
+    older than ``ttl_seconds``.
+    """
+
+    def __init__(
+        self,
+        embeddings: Embeddings,
+        threshold: float = 0.95,
+        max_entries: int = 1000,
+        ttl_seconds: float = 3600,
+        candidates: int = 8
+    ):
+        self.embeddings = embeddings
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.candidates = candidates
+        self._index = None
+        self._entries: "OrderedDict[int, Dict[str, Any]]" = OrderedDict()
+        self._next_id = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def embed(self, query: str) -> np.ndarray:
+        """
+        Embed and normalise a query with the knowledge base's embedding model.
+
+        Args:
+            query: The user's query text
+
+        Returns:
+            A (1, dim) float32 array with unit norm
+        """
+        vector = np.asarray([self.embeddings.embed_query(query)], dtype=np.float32)
+        faiss.normalize_L2(vector)
+        return vector
+
+    def lookup(self, vector: np.ndarray, namespace: str = "") -> Optional[Dict[str, Any]]:
+        """
+        Find a cached answer for a query vector.
+
+        Args:
+            vector: Normalised query vector from ``embed``
+            namespace: Exact-match part of the key (e.g. request options)
+
+        Returns:
+            The cached result dictionary, or None on a miss
+        """
+        with self._lock:
+            if self._index is None or self._index.ntotal == 0:
+                self.misses += 1
+                return None
+
+            k = min(self.candidates, self._index.ntotal)
+            scores, ids = self._index.search(vector, k)
+            now = time.monotonic()
+            for score, entry_id in zip(scores[0], ids[0]):
+                if entry_id < 0 or score < self.threshold:
+                    break
+                entry = self._entries.get(int(entry_id))
+                if entry is None:
+                    continue
+                if now - entry["created"] > self.ttl_seconds:
+                    self._remove(int(entry_id))
+                    continue
+                if entry["namespace"] != namespace:
+                    continue
+                self._entries.move_to_end(int(entry_id))
+                self.hits += 1
+                return dict(entry["result"])
+
+            self.misses += 1
+            return None
+
+    def store(self, vector: np.ndarray, result: Dict[str, Any], namespace: str = "") -> None:
+        """
+        Cache an answer for a query vector.
+
+        Args:
+            vector: Normalised query vector from ``embed``
+            result: Result dictionary to return on future hits
+            namespace: Exact-match part of the key (e.g. request options)
+        """
+        with self._lock:
+            if self._index is None:
+                self._index = faiss.IndexIDMap2(faiss.IndexFlatIP(vector.shape[1]))
+
+            entry_id = self._next_id
+            self._next_id += 1
+            self._index.add_with_ids(vector, np.asarray([entry_id], dtype=np.int64))
+            self._entries[entry_id] = {
+                "namespace": namespace,
+                "result": dict(result),
+                "created": time.monotonic()
+            }
+
+            while len(self._entries) > self.max_entries:
+                oldest_id = next(iter(self._entries))
+                self._remove(oldest_id)
+
+    def _remove(self, entry_id: int) -> None:
+        """Drop an entry from the map and the index. Caller must hold the lock."""
+        self._entries.pop(entry_id, None)
+        self._index.remove_ids(np.asarray([entry_id], dtype=np.int64))
+
+    def clear(self) -> None:
+        """Drop every cached answer, e.g. after the knowledge base is rebuilt."""
+        with self._lock:
+            self._index = None
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        """Return hit/miss counters and current size."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0
+            }
@@ -0,0 +1,97 @@
+"""
+Session-scoped conversation memory for the AWS Support Agent.
+Each caller gets its own bounded chat history instead of sharing one buffer.
+"""
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Any, List, Optional
+
+from langchain.memory import ConversationBufferWindowMemory
+
+
+class SessionMemoryStore:
+    """
+    LRU store of per-session conversation memories.
+
+    Sessions are evicted when the store exceeds ``max_sessions`` (least recently
+    used first) or when they have been idle for longer than ``ttl_seconds``.
+    Each session keeps at most ``max_turns`` question/answer pairs.
+    """
+
+    def __init__(self, max_sessions: int = 1000, ttl_seconds: float = 3600, max_turns: int = 10):
+        self.max_sessions = max_sessions
+        self.ttl_seconds = ttl_seconds
+        self.max_turns = max_turns
+        self._sessions: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.evictions = 0
+
+    def _new_memory(self) -> ConversationBufferWindowMemory:
+        return ConversationBufferWindowMemory(
+            memory_key="chat_history",
+            return_messages=True,
+            k=self.max_turns
+        )
+
+    def _evict_expired(self, now: float) -> None:
+        """Drop idle sessions. Caller must hold the lock."""
+        # Sessions are ordered by last access, so expired ones are at the front
+        while self._sessions:
+            session_id, entry = next(iter(self._sessions.items()))
+            if now - entry["last_access"] <= self.ttl_seconds:
+                break
+            del self._sessions[session_id]
+            self.evictions += 1
+
+    def get(self, session_id: str) -> ConversationBufferWindowMemory:
+        """
+        Return the memory for a session, creating it if needed.
+
+        Args:
+            session_id: Identifier of the conversation session
+
+        Returns:
+            The session's conversation memory
+        """
+        now = time.monotonic()
+        with self._lock:
+            self._evict_expired(now)
+            entry = self._sessions.get(session_id)
+            if entry is None:
+                entry = {"memory": self._new_memory(), "last_access": now}
+                self._sessions[session_id] = entry
+                while len(self._sessions) > self.max_sessions:
+                    self._sessions.popitem(last=False)
+                    self.evictions += 1
+            else:
+                entry["last_access"] = now
+                self._sessions.move_to_end(session_id)
+            return entry["memory"]
+
+    def load_history(self, session_id: str) -> List[Any]:
+        """Return the chat history messages for a session."""
+        memory = self.get(session_id)
+        return memory.load_memory_variables({})["chat_history"]
+
+    def save_turn(self, session_id: str, query: str, response: str) -> None:
+        """Append a question/answer pair to a session's history."""
+        memory = self.get(session_id)
+        memory.save_context({"input": query}, {"output": response})
+        # The window only limits what is loaded; trim the stored buffer as well
+        excess = len(memory.chat_memory.messages) - 2 * self.max_turns
+        if excess > 0:
+            del memory.chat_memory.messages[:excess]
+
+    def clear(self, session_id: Optional[str] = None) -> None:
+        """Clear one session, or every session if no id is given."""
+        with self._lock:
+            if session_id is None:
+                self._sessions.clear()
+            else:
+                self._sessions.pop(session_id, None)
+
+    def __len__(self) -> int:
+        with self._lock:
+            self._evict_expired(time.monotonic())
+            return len(self._sessions)
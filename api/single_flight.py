@@ -0,0 +1,48 @@
+"""
+Single-flight coalescing of identical concurrent computations.
+Callers asking for a key that is already being computed await the
+in-flight result instead of starting a duplicate run.
+"""
+import asyncio
+from typing import Any, Awaitable, Callable, Dict
+
+
+class SingleFlight:
+    """
+    Deduplicates concurrent async calls by key.
+
+    The computation runs in its own task, so a caller being cancelled (e.g. a
+    client disconnecting) does not cancel the work for the other waiters.
+    """
+
+    def __init__(self):
+        self._calls: Dict[str, asyncio.Task] = {}
+        self.coalesced = 0
+
+    async def do(self, key: str, fn: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        Run ``fn`` for ``key`` unless an identical call is already in flight.
+
+        Args:
+            key: Identity of the computation
+            fn: Zero-argument coroutine function producing the result
+
+        Returns:
+            The result of the (possibly shared) computation
+        """
+        task = self._calls.get(key)
+        if task is None:
+            task = asyncio.ensure_future(fn())
+            self._calls[key] = task
+            task.add_done_callback(lambda done: self._forget(key, done))
+        else:
+            self.coalesced += 1
+        return await asyncio.shield(task)
+
+    def _forget(self, key: str, task: asyncio.Task) -> None:
+        if self._calls.get(key) is task:
+            del self._calls[key]
+
+    def in_flight(self) -> int:
+        """Number of distinct computations currently running."""
+        return len(self._calls)
@@ -0,0 +1,177 @@
+"""
+Versioned, immutable agent snapshots for zero-downtime reloads.
+A reload builds a complete new snapshot next to the one serving traffic and
+then swaps a single reference, so queries never see a half-built agent.
+"""
+import contextlib
+import threading
+import time
+from collections import deque
+from datetime import datetime
+from typing import Any, Deque, Dict, Iterator, List, Optional
+
+
+class AgentSnapshot:
+    """
+    Everything a query needs, built together and never modified afterwards.
+
+    The knowledge base can still be edited in place through the document
+    endpoints (the vector store synchronises that itself), but the bundle of
+    vector store, tools, executor and caches is replaced only as a whole.
+    """
+
+    def __init__(
+        self,
+        version: int,
+        vector_store: Any,
+        agent: Any,
+        tools: list,
+        executor: Any,
+        config: Any,
+        semantic_cache: Any = None,
+        native_async: bool = False
+    ):
+        self.version = version
+        self.vector_store = vector_store
+        self.agent = agent
+        self.tools = tools
+        self.executor = executor
+        self.config = config
+        self.semantic_cache = semantic_cache
+        self.native_async = native_async
+        self.created_at = datetime.now().isoformat()
+
+
+class SnapshotManager:
+    """
+    Holds the serving snapshot plus ``history`` previous ones for rollback.
+
+    Queries ``acquire`` the current snapshot for their whole run. ``publish``
+    and ``rollback`` only swap the reference under a short lock, so requests
+    already running finish on the snapshot they started with while new ones
+    see the replacement. A replaced snapshot that is still in use is kept as
+    draining until its last query releases it.
+    """
+
+    def __init__(self, history: int = 1):
+        self.history = max(0, history)
+        self._current: Optional[AgentSnapshot] = None
+        self._previous: Deque[AgentSnapshot] = deque()
+        self._refs: Dict[int, int] = {}
+        self._draining: Dict[int, AgentSnapshot] = {}
+        self._next_version = 1
+        self._lock = threading.Lock()
+        self.swaps = 0
+
+    @property
+    def current(self) -> Optional[AgentSnapshot]:
+        """The snapshot new queries are served from, or None before the first publish."""
+        return self._current
+
+    def next_version(self) -> int:
+        """Reserve the version number for a snapshot about to be built."""
+        with self._lock:
+            version = self._next_version
+            self._next_version += 1
+            return version
+
+    @contextlib.contextmanager
+    def acquire(self) -> Iterator[AgentSnapshot]:
+        """
+        Pin the current snapshot for the duration of a query.
+
+        Raises:
+            RuntimeError: If no snapshot has been published yet
+        """
+        with self._lock:
+            snapshot = self._current
+            if snapshot is None:
+                raise RuntimeError("Agent not initialized. Please initialize the agent first.")
+            self._refs[snapshot.version] = self._refs.get(snapshot.version, 0) + 1
+        try:
+            yield snapshot
+        finally:
+            self._release(snapshot)
+
+    def _release(self, snapshot: AgentSnapshot) -> None:
+        with self._lock:
+            refs = self._refs[snapshot.version] - 1
+            if refs:
+                self._refs[snapshot.version] = refs
+                return
+            del self._refs[snapshot.version]
+            drained = self._draining.pop(snapshot.version, None)
+        if drained is not None:
+            print(f"[INFO] Snapshot v{drained.version} drained and released")
+
+    def publish(self, snapshot: AgentSnapshot) -> Optional[AgentSnapshot]:
+        """
+        Make ``snapshot`` the one new queries use.
+
+        Returns:
+            The snapshot it replaced, if any
+        """
+        with self._lock:
+            replaced = self._current
+            self._current = snapshot
+            if replaced is not None:
+                self._previous.appendleft(replaced)
+                while len(self._previous) > self.history:
+                    self._retire(self._previous.pop())
+            self.swaps += 1
+        print(f"[INFO] Serving snapshot v{snapshot.version}"
+              + (f" (replaced v{replaced.version})" if replaced else ""))
+        return replaced
+
+    def rollback(self) -> AgentSnapshot:
+        """
+        Serve the most recent previous snapshot again and discard the current one.
+
+        Returns:
+            The snapshot now being served
+
+        Raises:
+            RuntimeError: If there is no previous snapshot to go back to
+        """
+        with self._lock:
+            if not self._previous:
+                raise RuntimeError("No previous snapshot to roll back to")
+            discarded = self._current
+            self._current = self._previous.popleft()
+            if discarded is not None:
+                self._retire(discarded)
+            self.swaps += 1
+            restored = self._current
+        print(f"[INFO] Rolled back to snapshot v{restored.version}"
+              + (f" (discarded v{discarded.version})" if discarded else ""))
+        return restored
+
+    def _retire(self, snapshot: AgentSnapshot) -> None:
+        """Drop a snapshot, or keep it until in-flight queries finish. Caller must hold the lock."""
+        if self._refs.get(snapshot.version):
+            self._draining[snapshot.version] = snapshot
+
+    def wait_drained(self, version: int, timeout: Optional[float] = None) -> bool:
+        """Block until no query holds snapshot ``version``. Returns False on timeout."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            with self._lock:
+                if not self._refs.get(version):
+                    return True
+            if deadline is not None and time.monotonic() >= deadline:
+                return False
+            time.sleep(0.05)
+
+    def stats(self) -> Dict[str, Any]:
+        """Versions being served, kept for rollback and still draining, with in-flight counts."""
+        with self._lock:
+            current = self._current
+            previous: List[int] = [snapshot.version for snapshot in self._previous]
+            return {
+                "version": current.version if current else None,
+                "created_at": current.created_at if current else None,
+                "previous_versions": previous,
+                "draining_versions": sorted(self._draining),
+                "in_flight": dict(self._refs),
+                "swaps": self.swaps
+            }
@@ -94,8 +94,8 @@ def main(host: str, port: int, reload: bool, workers: int):
     print(f"📚 API Documentation: http://{host if host != '0.0.0.0' else 'localhost'}:{port}/docs")
     print(f"📖 ReDoc: http://{host if host != '0.0.0.0' else 'localhost'}:{port}/redoc")
     print("=" * 70)
-    print("\n⚠️  IMPORTANT: Before making queries, initialize the agent:")
-    print(f"   POST http://{host if host != '0.0.0.0' else 'localhost'}:{port}/agent/initialize")
+    print("\n🔥 The agent warms up on startup. Wait for readiness before making queries:")
+    print(f"   GET http://{host if host != '0.0.0.0' else 'localhost'}:{port}/ready")
     print("\n💡 TIP: Use Ctrl+C to stop the server")
     print("=" * 70 + "\n")
     
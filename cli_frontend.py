@@ -8,7 +8,7 @@ import sys
 from typing import Tuple
 from steps.url_scraper import url_scraper
 from steps.web_url_loader import web_url_loader
-from steps.index_generator import index_generator
+from steps.index_generator import cached_index_generator
 from steps.agent_creator import aws_agent_creator, AgentParameters
 
 def create_aws_agent():
@@ -48,7 +48,7 @@ def create_aws_agent():
     print(f"[INFO] Created {len(documents)} sample documents")
     
     print("[INFO] Creating vector store...")
-    vector_store = index_generator(documents)
+    vector_store = cached_index_generator(documents, os.getenv("INDEX_DIR", "index_cache"))
     print("[INFO] Vector store created successfully")
     
     print("[INFO] Creating AWS Support Agent with GROQ...")
@@ -2,8 +2,9 @@
 Simple Python Client for AWS Support Agent API
 This module provides a clean interface to interact with the API
 """
+import json
 import requests
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, Iterator, Tuple
 
 
 class AWSAgentClient:
@@ -99,6 +100,43 @@ class AWSAgentClient:
         response.raise_for_status()
         return response.json()
     
+    def query_stream(
+        self,
+        question: str,
+        include_sources: bool = False
+    ) -> Iterator[Tuple[str, Dict[str, Any]]]:
+        """
+        Query the AWS Support Agent and receive the answer as it is generated.
+        
+        Args:
+            question: Your question about AWS
+            include_sources: Include source documents in response
+            
+        Yields:
+            (event, data) tuples: "token" events carry {"text": ...}, "retrieval"
+            events carry the retrieved sources and "complete" carries the full response
+        """
+        if not self._initialized:
+            print("⚠️  Agent not initialized. Initializing now...")
+            self.initialize()
+        
+        with requests.post(
+            f"{self.base_url}/agent/query/stream",
+            json={
+                "query": question,
+                "include_sources": include_sources
+            },
+            stream=True
+        ) as response:
+            response.raise_for_status()
+            event = "message"
+            for line in response.iter_lines(decode_unicode=True):
+                if line.startswith("event:"):
+                    event = line[len("event:"):].strip()
+                elif line.startswith("data:"):
+                    yield event, json.loads(line[len("data:"):].strip())
+                    event = "message"
+    
     def ask(self, question: str) -> str:
         """
         Simple method to ask a question and get just the answer text.
@@ -1,39 +1,83 @@
 import os
+import shutil
+import tempfile
+from typing import Optional
+
 from langchain_community.vectorstores.faiss import FAISS
+from langchain_core.embeddings import Embeddings
+
+from steps.ann_index import IndexSpec
 
 
 def save_vector_store(data: FAISS, path: str) -> None:
     """Save the FAISS index and documents.
 
+    The store is written to a temporary directory next to ``path`` and renamed
+    into place, so readers never see a partially written index.
+
     Args:
         data: The FAISS vector store to save
         path: Path to save the vector store to
     """
-    data.save_local(path)
+    path = os.path.abspath(path)
+    parent = os.path.dirname(path)
+    os.makedirs(parent, exist_ok=True)
+
+    tmp_path = tempfile.mkdtemp(prefix=".tmp-", dir=parent)
+    try:
+        data.save_local(tmp_path)
+    except Exception:
+        shutil.rmtree(tmp_path, ignore_errors=True)
+        raise
 
+    old_path = None
+    if os.path.exists(path):
+        # Directories cannot be renamed over each other: move the old one aside first
+        old_path = tempfile.mkdtemp(prefix=".old-", dir=parent)
+        os.rename(path, os.path.join(old_path, "index"))
+    try:
+        os.rename(tmp_path, path)
+    except OSError:
+        shutil.rmtree(tmp_path, ignore_errors=True)
+        if not os.path.isdir(path):
+            raise
+        # Another process published an index at this path first; keep theirs
+    if old_path is not None:
+        shutil.rmtree(old_path, ignore_errors=True)
 
-def load_vector_store(path: str) -> FAISS:
+
+def load_vector_store(
+    path: str,
+    embeddings: Optional[Embeddings] = None,
+    index_spec: Optional[IndexSpec] = None,
+) -> FAISS:
     """Load the FAISS index and documents.
 
+    Chunk text and metadata, and full-precision rerank vectors saved with a
+    compressed index, are memory mapped rather than read into memory; nothing
+    is unpickled. Indexes saved in LangChain's pickle format fail to load, so
+    ``cached_index_generator`` rebuilds them. Directories holding a shard
+    manifest are loaded as a ``ShardedVectorStore``.
+
     Args:
         path: Path to load the vector store from
+        embeddings: Embedding model to attach; defaults to the knowledge base model
+        index_spec: Index spec whose query-time knobs (nprobe, efSearch, rerank factor) to apply
 
     Returns:
         The loaded FAISS vector store
     """
-    if os.getenv("OPENAI_API_KEY"):
-        from langchain_openai import OpenAIEmbeddings
-        embeddings = OpenAIEmbeddings()
+    if embeddings is None:
+        from steps.embeddings import get_embeddings
+        embeddings = get_embeddings()
+
+    from steps.sharded_store import ShardedVectorStore, is_sharded
+    from steps.vector_store import AWSVectorStore
+
+    if is_sharded(path):
+        vector_store = ShardedVectorStore.load_local(path, embeddings=embeddings)
     else:
-        try:
-            from langchain_community.embeddings import HuggingFaceEmbeddings
-            embeddings = HuggingFaceEmbeddings(model_name="sentence-transformers/all-MiniLM-L6-v2")
-        except ImportError:
-            from langchain_community.embeddings import FakeEmbeddings
-            embeddings = FakeEmbeddings(size=1536)  
-    
-    return FAISS.load_local(
-        path,
-        embeddings=embeddings,
-        allow_dangerous_deserialization=True,
-    )
+        vector_store = AWSVectorStore.load_local(path, embeddings=embeddings)
+    if index_spec is not None:
+        vector_store.configure_search(index_spec)
+    return vector_store
@@ -1,22 +1,41 @@
+import os
+
 from steps.agent_creator import aws_agent_creator as agent_creator
+from steps.embedding_cache import DEFAULT_CACHE_DIR, EmbeddingCache
 from steps.index_generator import index_generator
+from steps.streaming_ingestion import INGEST_STREAMING, streaming_index_generator
 from steps.url_scraper import url_scraper
 from steps.web_url_loader import web_url_loader
 
 
-def aws_agent_creation_pipeline():
+def aws_agent_creation_pipeline(streaming: bool = INGEST_STREAMING):
     """Generate vector index for AWS Cloud documentation and repositories.
 
     This pipeline:
     1. Scrapes AWS documentation, website, and GitHub samples.
     2. Loads the content into LangChain documents.
-    3. Generates vector embeddings and builds a FAISS index.
+    3. Generates vector embeddings and builds a FAISS index. Embeddings of
+       chunks seen in earlier runs are reused from the on-disk embedding cache.
     4. Creates an AWS Agent capable of answering cloud-related questions.
+
+    With ``streaming`` (or ``INGEST_STREAMING=true``), steps 2 and 3 run as
+    concurrent stages connected by bounded queues instead of one after the
+    other, so peak memory no longer grows with the number of pages.
     """
     urls = url_scraper()
-    documents = web_url_loader(urls)
-    vector_store = index_generator(documents)
+    embedding_cache = EmbeddingCache(os.getenv("EMBEDDING_CACHE_DIR", DEFAULT_CACHE_DIR))
+    if streaming:
+        vector_store = streaming_index_generator(urls, embedding_cache=embedding_cache)
+    else:
+        documents = web_url_loader(urls)
+        vector_store = index_generator(documents, embedding_cache=embedding_cache)
     _ = agent_creator(vector_store=vector_store)
+
+    stats = embedding_cache.stats()
+    print(
+        f"[INFO] Embedding cache: {stats['hits']} hits, {stats['misses']} misses "
+        f"(hit rate {stats['hit_rate']:.1%}), {stats['bytes'] / 1e6:.1f} MB on disk"
+    )
     return vector_store
 
 
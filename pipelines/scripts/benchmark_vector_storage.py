@@ -0,0 +1,136 @@
+"""
+Benchmark the recall/memory trade-off of compressed vector storage.
+
+Builds every index type with float32, float16 and int8 storage (and IVF-PQ),
+with and without exact reranking from full-precision vectors, and reports
+index size, recall@k against exact search and mean query latency.
+
+Examples:
+
+    # Synthetic MiniLM-sized corpus
+    python -m pipelines.scripts.benchmark_vector_storage --num-vectors 200000 --dim 384
+
+    # Vectors of a persisted knowledge base index
+    python -m pipelines.scripts.benchmark_vector_storage --index index_cache/<fingerprint>
+"""
+import time
+from typing import List, Optional, Tuple
+
+import click
+import faiss
+import numpy as np
+
+from steps.ann_index import IndexSpec, build_index
+
+
+def synthetic_vectors(num_vectors: int, dim: int, seed: int = 0) -> np.ndarray:
+    """Clustered random vectors, closer to real embeddings than uniform noise."""
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((max(1, num_vectors // 500), dim)).astype(np.float32)
+    assignments = rng.integers(0, len(centers), num_vectors)
+    noise = 0.3 * rng.standard_normal((num_vectors, dim)).astype(np.float32)
+    return centers[assignments] + noise
+
+
+def index_vectors(path: str) -> np.ndarray:
+    """Read the vectors stored in a persisted vector store directory."""
+    index = faiss.read_index(f"{path}/index.faiss")
+    return index.reconstruct_n(0, index.ntotal)
+
+
+def search(
+    index: faiss.Index,
+    vectors: np.ndarray,
+    queries: np.ndarray,
+    k: int,
+    rerank_factor: Optional[int],
+) -> Tuple[np.ndarray, float]:
+    """Search ``queries``, optionally reranking ``k * rerank_factor`` hits exactly.
+
+    Returns:
+        The (num_queries, k) result ids and the mean latency in milliseconds.
+    """
+    fetch = k * rerank_factor if rerank_factor else k
+    started = time.perf_counter()
+    _, ids = index.search(queries, fetch)
+    if rerank_factor:
+        reranked = np.empty((len(queries), k), dtype=np.int64)
+        for row, (query, candidates) in enumerate(zip(queries, ids)):
+            candidates = candidates[candidates >= 0]
+            distances = np.sum((vectors[candidates] - query) ** 2, axis=1)
+            reranked[row] = candidates[np.argsort(distances)[:k]]
+        ids = reranked
+    latency_ms = (time.perf_counter() - started) * 1000 / len(queries)
+    return ids, latency_ms
+
+
+def recall_at_k(ids: np.ndarray, truth: np.ndarray) -> float:
+    hits = sum(len(set(found) & set(expected)) for found, expected in zip(ids, truth))
+    return hits / truth.size
+
+
+def benchmark_specs(kinds: List[str]) -> List[IndexSpec]:
+    specs = []
+    for kind in kinds:
+        if kind == "ivf_pq":
+            specs += [IndexSpec(kind=kind), IndexSpec(kind=kind, rerank=True)]
+            continue
+        for storage in ("float32", "float16", "int8"):
+            specs.append(IndexSpec(kind=kind, storage=storage))
+            if storage != "float32":
+                specs.append(IndexSpec(kind=kind, storage=storage, rerank=True))
+    return specs
+
+
+@click.command(help=__doc__)
+@click.option("--index", "index_path", default=None, help="Persisted vector store directory to take vectors from.")
+@click.option("--num-vectors", default=100_000, show_default=True, help="Synthetic corpus size.")
+@click.option("--dim", default=384, show_default=True, help="Synthetic vector dimension.")
+@click.option("--num-queries", default=1000, show_default=True)
+@click.option("-k", "--k", "k", default=10, show_default=True)
+@click.option("--rerank-factor", default=4, show_default=True)
+@click.option(
+    "--kinds",
+    default="flat,hnsw,ivf_flat,ivf_pq",
+    show_default=True,
+    help="Comma-separated index kinds to benchmark.",
+)
+def main(
+    index_path: Optional[str],
+    num_vectors: int,
+    dim: int,
+    num_queries: int,
+    k: int,
+    rerank_factor: int,
+    kinds: str,
+):
+    vectors = index_vectors(index_path) if index_path else synthetic_vectors(num_vectors, dim)
+    vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+    rng = np.random.default_rng(1)
+    queries = vectors[rng.choice(len(vectors), min(num_queries, len(vectors)), replace=False)]
+    queries = queries + 0.05 * rng.standard_normal(queries.shape).astype(np.float32)
+
+    exact = faiss.IndexFlatL2(vectors.shape[1])
+    exact.add(vectors)
+    _, truth = exact.search(queries, k)
+    full_precision_mb = vectors.nbytes / 1e6
+
+    print(f"{len(vectors)} vectors x {vectors.shape[1]} dims, {len(queries)} queries, recall@{k}")
+    print(f"Full-precision rerank file: {full_precision_mb:.1f} MB (memory mapped, not resident)")
+    print(f"{'index':<22}{'rerank':>8}{'size MB':>10}{'recall':>9}{'ms/query':>10}")
+
+    for spec in benchmark_specs(kinds.split(",")):
+        index = build_index(vectors, spec)
+        index.add(vectors)
+        size_mb = faiss.serialize_index(index).nbytes / 1e6
+        ids, latency_ms = search(index, vectors, queries, k, rerank_factor if spec.rerank else None)
+
+        name = spec.kind if spec.kind == "ivf_pq" else f"{spec.kind}/{spec.storage}"
+        print(
+            f"{name:<22}{'yes' if spec.rerank else 'no':>8}{size_mb:>10.1f}"
+            f"{recall_at_k(ids, truth):>9.3f}{latency_ms:>10.3f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -2,8 +2,10 @@ import os
 from typing import Dict, List, Tuple, Literal
 
 from agent.prompt import PREFIX, SUFFIX
+from agent.retrieval_tool import DEFAULT_RETRIEVAL_K, KnowledgeBaseRetrievalTool
 from langchain.agents import AgentExecutor, ConversationalChatAgent
 from langchain.schema.vectorstore import VectorStore
+from langchain_core.language_models.chat_models import BaseChatModel
 from langchain.tools.base import BaseTool
 from langchain_community.tools.vectorstore.tool import VectorStoreQATool
 from langchain_openai import ChatOpenAI
@@ -34,13 +36,26 @@ class AgentParameters(BaseModel):
     
     temperature: float = 0.2
     max_tokens: int = 1200
+    
+    # Emit tokens to callback handlers as they are generated
+    streaming: bool = True
+    
+    # "qa" answers tool calls with a nested RetrievalQA LLM call; "retrieval"
+    # returns the top passages to the agent directly, saving one LLM call per lookup
+    tool_mode: Literal["qa", "retrieval"] = "qa"
+    retrieval_k: int = DEFAULT_RETRIEVAL_K  # Passages returned per lookup in "retrieval" mode
 
     class Config:
         extra = "ignore"
 
 
 def get_llm_instance(config: AgentParameters):
-    """Return the appropriate LLM instance based on configuration."""
+    """Return the appropriate LLM instance based on configuration.
+
+    With ``config.streaming`` enabled the model reports every generated token to
+    the callback handlers passed at invocation time (see ``agent.streaming``).
+    Ollama always generates through its streaming API.
+    """
     if config.llm_type == "openai":
         api_key = config.openai_api_key or os.getenv("OPENAI_API_KEY")
         if not api_key:
@@ -52,6 +67,7 @@ def get_llm_instance(config: AgentParameters):
             model_name=config.openai_model_name,
             temperature=config.temperature,
             max_tokens=config.max_tokens,
+            streaming=config.streaming,
             api_key=api_key
         )
     elif config.llm_type == "ollama":
@@ -74,45 +90,80 @@ def get_llm_instance(config: AgentParameters):
             model=config.groq_model_name,
             temperature=config.temperature,
             max_tokens=config.max_tokens,
+            streaming=config.streaming,
             api_key=api_key
         )
     else:
         raise ValueError(f"Unsupported LLM type: {config.llm_type}")
 
 
+def supports_native_async(llm) -> bool:
+    """Return True if the LLM implements its own async generation.
+
+    Chat models that do not override ``_agenerate`` fall back to running the sync
+    client in the default executor, so callers should manage their own thread pool.
+    """
+    if not isinstance(llm, BaseChatModel):
+        return False
+    return type(llm)._agenerate is not BaseChatModel._agenerate
+
+
+def get_knowledge_base_tool(vector_store: VectorStore, llm, config: AgentParameters) -> BaseTool:
+    """Return the knowledge base tool selected by ``config.tool_mode``."""
+    if config.tool_mode == "retrieval":
+        return KnowledgeBaseRetrievalTool(
+            name="aws-support-search-tool",
+            vectorstore=vector_store,
+            k=config.retrieval_k,
+            description=(
+                "Use this tool to look up AWS documentation about services, troubleshooting, "
+                "deployment errors, configuration issues, and service best practices. "
+                "Input is a search query; returns the most relevant passages, each labelled "
+                "with its source. Base your answer on these passages."
+            ),
+        )
+    return VectorStoreQATool(
+        name="aws-support-qa-tool",
+        vectorstore=vector_store,
+        description=(
+            "Use this tool to answer questions about AWS services, troubleshooting, "
+            "deployment errors, configuration issues, and service best practices. "
+            "Covers S3, EC2, Lambda, IAM, CloudWatch, and general AWS documentation."
+        ),
+        llm=llm,
+    )
+
+
 def aws_agent_creator(
-    vector_store: VectorStore, config: AgentParameters = AgentParameters()
+    vector_store: VectorStore,
+    config: AgentParameters = AgentParameters(),
+    shared_memory: bool = True,
 ):
     """Create an AWS Support Agent from a vector store.
 
     Args:
         vector_store: The AWS knowledge base (vector store) to create the agent from.
         config: Configuration parameters for the agent, including LLM settings.
+        shared_memory: Attach a single conversation buffer to the executor. Set to
+            False when the caller passes ``chat_history`` with every invocation
+            (e.g. per-session memory in the API service).
 
     Returns:
         A tuple containing the conversational agent and its tools.
     """
     llm = get_llm_instance(config)
     
-    tools = [
-        VectorStoreQATool(
-            name="aws-support-qa-tool",
-            vectorstore=vector_store,
-            description=(
-                "Use this tool to answer questions about AWS services, troubleshooting, "
-                "deployment errors, configuration issues, and service best practices. "
-                "Covers S3, EC2, Lambda, IAM, CloudWatch, and general AWS documentation."
-            ),
-            llm=llm,
-        ),
-    ]
+    tools = [get_knowledge_base_tool(vector_store, llm, config)]
 
     from langchain.agents import ConversationalChatAgent, AgentExecutor
     from langchain.memory import ConversationBufferMemory
     from langchain.prompts import MessagesPlaceholder
     from langchain.schema import SystemMessage
     
-    memory = ConversationBufferMemory(memory_key="chat_history", return_messages=True)
+    memory = (
+        ConversationBufferMemory(memory_key="chat_history", return_messages=True)
+        if shared_memory else None
+    )
     
     # Create custom conversational agent with AWS system prompt
     system_message = SystemMessage(content=PREFIX)
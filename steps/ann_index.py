@@ -0,0 +1,207 @@
+import math
+from typing import Any, Dict, Literal, Optional
+
+import faiss
+import numpy as np
+from pydantic import BaseModel
+
+IndexKind = Literal["auto", "flat", "ivf_flat", "ivf_pq", "hnsw"]
+VectorStorage = Literal["float32", "float16", "int8"]
+
+# index_factory encodings of the stored vectors
+_STORAGE_CODES = {"float32": "Flat", "float16": "SQfp16", "int8": "SQ8"}
+
+# Corpus sizes at which the automatic choice moves to the next index type
+FLAT_MAX_VECTORS = 10_000
+HNSW_MAX_VECTORS = 200_000
+IVF_FLAT_MAX_VECTORS = 2_000_000
+
+# FAISS warns below ~39 training points per IVF list
+MIN_POINTS_PER_LIST = 39
+MAX_PQ_SUBQUANTIZERS = 64
+DEFAULT_RERANK_FACTOR = 4
+DEFAULT_RRF_K = 60
+
+
+class IndexSpec(BaseModel):
+    """Parameters of the FAISS index built for the knowledge base and how it is searched."""
+
+    kind: IndexKind = "auto"  # "auto" picks a type from the corpus size
+
+    # IVF
+    nlist: Optional[int] = None  # Number of inverted lists; default ~4 * sqrt(n)
+    train_sample: int = 100_000  # Vectors sampled for training IVF / PQ
+
+    # PQ
+    pq_m: Optional[int] = None  # Sub-quantizers; default is the largest divisor of dim <= 64
+    pq_bits: int = 8
+
+    # HNSW
+    hnsw_m: int = 32
+    ef_construction: int = 200
+
+    # Vector storage of Flat, IVF-Flat and HNSW indexes (PQ is always compressed)
+    storage: VectorStorage = "float32"
+    rerank: bool = False  # Keep full-precision vectors on disk to rerank the top hits exactly
+
+    # Query-time knobs, applied after building or loading an index
+    nprobe: int = 16
+    ef_search: int = 64
+    rerank_factor: int = DEFAULT_RERANK_FACTOR  # Candidates fetched per result when reranking
+    hybrid: bool = True  # Fuse BM25 keyword hits with the vector hits
+    rrf_k: int = DEFAULT_RRF_K  # Reciprocal rank fusion constant
+
+    class Config:
+        extra = "ignore"
+
+    def build_params(self) -> Dict[str, Any]:
+        """Return the fields that determine the contents of a built index."""
+        return self.model_dump(exclude={"nprobe", "ef_search", "rerank_factor", "hybrid", "rrf_k"})
+
+
+def choose_index_kind(num_vectors: int) -> str:
+    """Pick an index type for a corpus of ``num_vectors`` vectors.
+
+    Exact search is cheapest for small corpora; HNSW gives the best latency
+    while the graph still fits comfortably in memory; IVF scales further and
+    IVF-PQ compresses vectors for the largest corpora.
+    """
+    if num_vectors <= FLAT_MAX_VECTORS:
+        return "flat"
+    if num_vectors <= HNSW_MAX_VECTORS:
+        return "hnsw"
+    if num_vectors <= IVF_FLAT_MAX_VECTORS:
+        return "ivf_flat"
+    return "ivf_pq"
+
+
+def _default_nlist(num_vectors: int) -> int:
+    nlist = int(4 * math.sqrt(num_vectors))
+    return max(1, min(nlist, num_vectors // MIN_POINTS_PER_LIST))
+
+
+def _default_pq_m(dim: int) -> int:
+    return max(m for m in range(1, min(dim, MAX_PQ_SUBQUANTIZERS) + 1) if dim % m == 0)
+
+
+def index_factory_string(spec: IndexSpec, num_vectors: int, dim: int) -> str:
+    """Return the ``faiss.index_factory`` description for a spec.
+
+    Args:
+        spec: The requested index parameters.
+        num_vectors: Number of vectors that will be indexed.
+        dim: Vector dimension.
+
+    Returns:
+        A factory string such as ``"IVF1024,Flat"``.
+    """
+    kind = spec.kind if spec.kind != "auto" else choose_index_kind(num_vectors)
+    codes = _STORAGE_CODES[spec.storage]
+    if kind == "flat":
+        return codes
+    if kind == "hnsw":
+        return f"HNSW{spec.hnsw_m}" if spec.storage == "float32" else f"HNSW{spec.hnsw_m},{codes}"
+    nlist = spec.nlist or _default_nlist(num_vectors)
+    if kind == "ivf_flat":
+        return f"IVF{nlist},{codes}"
+    return f"IVF{nlist},PQ{spec.pq_m or _default_pq_m(dim)}x{spec.pq_bits}"
+
+
+def build_index(
+    vectors: np.ndarray,
+    spec: IndexSpec,
+    metric: int = faiss.METRIC_L2,
+    num_vectors: Optional[int] = None,
+) -> faiss.Index:
+    """Create and train an empty FAISS index for ``vectors``.
+
+    Indexes that need training are trained on a random sample of at most
+    ``spec.train_sample`` vectors (raised to the minimum FAISS needs for the
+    number of lists). The vectors themselves are not added.
+
+    Args:
+        vectors: (n, dim) float32 matrix of the corpus embeddings, or of a
+            sample of them when ``num_vectors`` is given.
+        spec: The requested index parameters.
+        metric: FAISS metric type.
+        num_vectors: Size of the corpus the index will hold, used to choose
+            the index type and number of lists; defaults to ``len(vectors)``.
+
+    Returns:
+        A trained, empty index with the spec's search parameters applied.
+    """
+    num_samples, dim = vectors.shape
+    description = index_factory_string(spec, num_vectors or num_samples, dim)
+    index = faiss.index_factory(dim, description, metric)
+
+    if isinstance(index, faiss.IndexHNSW):
+        index.hnsw.efConstruction = spec.ef_construction
+    if not index.is_trained:
+        # Enough points for both the coarse quantizer and the PQ codebooks
+        centroids = 1
+        if description.startswith("IVF"):
+            centroids = faiss.extract_index_ivf(index).nlist
+        if "PQ" in description:
+            centroids = max(centroids, 1 << spec.pq_bits)
+        sample_size = min(num_samples, max(spec.train_sample, MIN_POINTS_PER_LIST * centroids))
+        sample = vectors
+        if sample_size < num_samples:
+            rng = np.random.default_rng(0)
+            sample = vectors[rng.choice(num_samples, sample_size, replace=False)]
+        index.train(np.ascontiguousarray(sample, dtype=np.float32))
+
+    configure_search(index, spec)
+    print(f"[INFO] Built {description} index for {num_vectors or num_samples} vectors")
+    return index
+
+
+def configure_search(index: faiss.Index, spec: IndexSpec) -> None:
+    """Apply the spec's query-time knobs (nprobe / efSearch) to an index."""
+    try:
+        faiss.extract_index_ivf(index).nprobe = spec.nprobe
+    except RuntimeError:
+        pass
+    if isinstance(index, faiss.IndexHNSW):
+        index.hnsw.efSearch = spec.ef_search
+
+
+def compact_index(index: faiss.Index, keep_positions: np.ndarray) -> faiss.Index:
+    """Return a copy of ``index`` holding only the vectors at ``keep_positions``.
+
+    The kept vectors are renumbered ``0..len(keep_positions) - 1`` in the
+    given (ascending) order, as the position -> docstore id mapping expects.
+    Flat indexes renumber on removal by themselves; IVF indexes keep the ids
+    of the remaining vectors, so their inverted lists are renumbered in place
+    without re-encoding; HNSW graphs do not support removal and are rebuilt
+    from the reconstructed vectors.
+    """
+    keep_positions = np.asarray(keep_positions, dtype=np.int64)
+    remove = np.ones(index.ntotal, dtype=bool)
+    remove[keep_positions] = False
+    remove_positions = np.flatnonzero(remove).astype(np.int64)
+
+    if isinstance(index, faiss.IndexHNSW):
+        kept = index.reconstruct_n(0, index.ntotal)[keep_positions]
+        new_index = faiss.clone_index(index)
+        new_index.reset()
+        new_index.add(kept)
+        return new_index
+
+    new_index = faiss.clone_index(index)
+    new_index.remove_ids(remove_positions)
+    try:
+        ivf = faiss.extract_index_ivf(new_index)
+    except RuntimeError:
+        return new_index
+
+    new_ids = np.full(index.ntotal, -1, dtype=np.int64)
+    new_ids[keep_positions] = np.arange(len(keep_positions), dtype=np.int64)
+    invlists = ivf.invlists
+    for list_no in range(ivf.nlist):
+        size = invlists.list_size(list_no)
+        if size:
+            ids = faiss.rev_swig_ptr(invlists.get_ids(list_no), size)
+            ids[:] = new_ids[ids]
+    if ivf.direct_map.type != faiss.DirectMap.NoMap:
+        ivf.make_direct_map(True)
+    return new_index
@@ -0,0 +1,340 @@
+import json
+import os
+from array import array
+from collections.abc import MutableMapping
+from typing import Dict, Iterator, List, Optional, Set, Tuple, Union
+
+import numpy as np
+from langchain_community.docstore.base import AddableMixin, Docstore
+from langchain_community.docstore.document import Document
+
+DOCSTORE_FORMAT_VERSION = 1
+DOCSTORE_COLUMNS_FILENAME = "docstore.json"
+DOCSTORE_IDS_FILENAME = "docstore_ids.npy"
+DOCSTORE_OFFSETS_FILENAME = "docstore_offsets.npy"
+DOCSTORE_TEXT_FILENAME = "docstore_text.bin"
+DOCSTORE_METADATA_FILENAME = "docstore_metadata.npy"
+INDEX_IDS_FILENAME = "index_ids.npy"
+
+_MISSING = -1
+
+
+def load_array(path: str) -> np.ndarray:
+    """Memory map a saved array; empty arrays cannot be mapped and are read instead."""
+    array_ = np.load(path, mmap_mode="r")
+    return array_ if array_.size else np.load(path)
+
+
+def id_array(ids: List[str]) -> np.ndarray:
+    """Fixed-width byte strings, so ids can be memory mapped and binary searched."""
+    encoded = [docstore_id.encode("utf-8") for docstore_id in ids]
+    width = max((len(value) for value in encoded), default=1)
+    return np.array(encoded, dtype=f"S{max(width, 1)}")
+
+
+class ColumnarDocstore(Docstore, AddableMixin):
+    """Read-mostly docstore backed by memory-mapped column files.
+
+    Chunks are stored sorted by id: all text in one UTF-8 file addressed by an
+    offset array, and metadata as one int32 code per chunk and key pointing
+    into a per-key table of distinct values. Nothing is unpickled and no
+    chunk is turned into a ``Document`` until ``search`` asks for it, so
+    loading takes constant time and resident memory follows the chunks that
+    queries actually touch. Each lookup returns a fresh ``Document``, so
+    editing its metadata does not change the stored chunk.
+
+    Chunks added after loading are held in memory, and deleted ones are
+    hidden, until the next save rewrites the files.
+    """
+
+    def __init__(
+        self,
+        ids: np.ndarray,
+        offsets: np.ndarray,
+        text: np.ndarray,
+        metadata: np.ndarray,
+        keys: List[str],
+        values: List[List[str]],
+    ):
+        self._ids = ids
+        self._offsets = offsets
+        self._text = text
+        self._metadata = metadata
+        self._keys = keys
+        self._values = values
+        self._added: Dict[str, Document] = {}
+        self._deleted: Set[str] = set()
+
+    def _row(self, docstore_id: str) -> Optional[int]:
+        key = docstore_id.encode("utf-8")
+        if not len(self._ids) or len(key) > self._ids.dtype.itemsize:
+            return None
+        row = int(np.searchsorted(self._ids, key))
+        if row < len(self._ids) and self._ids[row] == key:
+            return row
+        return None
+
+    def _materialize(self, docstore_id: str, row: int) -> Document:
+        start, end = int(self._offsets[row]), int(self._offsets[row + 1])
+        metadata = {
+            key: json.loads(self._values[column][code])
+            for column, (key, code) in enumerate(zip(self._keys, self._metadata[row].tolist()))
+            if code != _MISSING
+        }
+        return Document(id=docstore_id, page_content=bytes(self._text[start:end]).decode("utf-8"), metadata=metadata)
+
+    def search(self, search: str) -> Union[str, Document]:
+        """Return the chunk with this id, or an error message like ``InMemoryDocstore``."""
+        doc = self._added.get(search)
+        if doc is not None:
+            return doc
+        row = self._row(search) if search not in self._deleted else None
+        if row is None:
+            return f"ID {search} not found."
+        return self._materialize(search, row)
+
+    def __contains__(self, docstore_id: str) -> bool:
+        return docstore_id in self._added or (docstore_id not in self._deleted and self._row(docstore_id) is not None)
+
+    def __len__(self) -> int:
+        return len(self._ids) - len(self._deleted) + len(self._added)
+
+    def add(self, texts: Dict[str, Document]) -> None:
+        overlapping = {docstore_id for docstore_id in texts if docstore_id in self}
+        if overlapping:
+            raise ValueError(f"Tried to add ids that already exist: {overlapping}")
+        self._added.update(texts)
+
+    def delete(self, ids: List) -> None:
+        for docstore_id in ids:
+            if self._added.pop(docstore_id, None) is None and self._row(docstore_id) is not None:
+                self._deleted.add(docstore_id)
+
+    def saved_rows(self, ids: np.ndarray) -> np.ndarray:
+        """Return the saved row of each id, or -1 where it has none.
+
+        Ids (fixed-width byte strings) not in the saved files, or deleted since
+        loading, have no row.
+        """
+        rows = np.full(len(ids), -1, dtype=np.int64)
+        if not len(self._ids) or not len(ids):
+            return rows
+        found = np.searchsorted(self._ids, ids)
+        valid = found < len(self._ids)
+        valid[valid] = self._ids[found[valid]] == ids[valid]
+        if self._deleted:
+            deleted = np.array([docstore_id.encode("utf-8") for docstore_id in self._deleted])
+            valid &= ~np.isin(ids, deleted)
+        rows[valid] = found[valid]
+        return rows
+
+    def metadata_column(self, key: str) -> Tuple[Optional[np.ndarray], List[object]]:
+        """Return the saved rows' value codes for a metadata key, and the values they index.
+
+        Codes are -1 for chunks without the key; ``(None, [])`` if no saved chunk has it.
+        """
+        if key not in self._keys:
+            return None, []
+        column = self._keys.index(key)
+        return self._metadata[:, column], [json.loads(value) for value in self._values[column]]
+
+    @classmethod
+    def load(cls, folder_path: str) -> "ColumnarDocstore":
+        """Memory map a docstore written by ``save_docstore``."""
+        with open(os.path.join(folder_path, DOCSTORE_COLUMNS_FILENAME), encoding="utf-8") as f:
+            columns = json.load(f)
+        if columns.get("version") != DOCSTORE_FORMAT_VERSION:
+            raise ValueError(f"Unsupported docstore format version {columns.get('version')}")
+        text_path = os.path.join(folder_path, DOCSTORE_TEXT_FILENAME)
+        text = (
+            np.memmap(text_path, dtype=np.uint8, mode="r")
+            if os.path.getsize(text_path) else np.empty(0, dtype=np.uint8)
+        )
+        return cls(
+            load_array(os.path.join(folder_path, DOCSTORE_IDS_FILENAME)),
+            load_array(os.path.join(folder_path, DOCSTORE_OFFSETS_FILENAME)),
+            text,
+            load_array(os.path.join(folder_path, DOCSTORE_METADATA_FILENAME)),
+            columns["keys"],
+            columns["values"],
+        )
+
+
+class PositionIds(MutableMapping):
+    """FAISS position -> docstore id map over a memory-mapped array of ids.
+
+    Stands in for the ``index_to_docstore_id`` dict of a loaded store, so
+    loading does not build one Python string per chunk. Positions assigned
+    after loading live in a small dict on top.
+    """
+
+    def __init__(self, ids: np.ndarray):
+        self._ids = ids
+        self._overlay: Dict[int, str] = {}
+        self._hidden: Set[int] = set()  # Saved positions deleted or overridden by the overlay
+        self._saved: Optional[int] = None
+
+    def _in_array(self, position: int) -> bool:
+        """Whether the saved array has an id at ``position`` that is still visible."""
+        return 0 <= position < len(self._ids) and position not in self._hidden and bool(self._ids[position])
+
+    def __getitem__(self, position: int) -> str:
+        position = int(position)
+        docstore_id = self._overlay.get(position)
+        if docstore_id is not None:
+            return docstore_id
+        if not self._in_array(position):
+            raise KeyError(position)
+        return self._ids[position].decode("utf-8")
+
+    def __setitem__(self, position: int, docstore_id: str) -> None:
+        position = int(position)
+        if self._in_array(position):
+            self._hidden.add(position)
+        self._overlay[position] = docstore_id
+
+    def __delitem__(self, position: int) -> None:
+        position = int(position)
+        if self._overlay.pop(position, None) is None:
+            if not self._in_array(position):
+                raise KeyError(position)
+            self._hidden.add(position)
+
+    def __iter__(self) -> Iterator[int]:
+        for position in range(len(self._ids)):
+            if position in self._overlay or self._in_array(position):
+                yield position
+        yield from sorted(position for position in self._overlay if position >= len(self._ids))
+
+    def saved_ids(self) -> np.ndarray:
+        """Return the memory-mapped saved ids by position, including those ``hidden`` since loading."""
+        return self._ids
+
+    def hidden(self) -> np.ndarray:
+        """Return the saved positions deleted or reassigned since loading."""
+        return np.fromiter(self._hidden, dtype=np.int64, count=len(self._hidden))
+
+    def added(self) -> Dict[int, str]:
+        """Return the positions assigned since loading."""
+        return dict(self._overlay)
+
+    def __len__(self) -> int:
+        if self._saved is None:
+            # Positions left empty by the saved index are not in the map
+            self._saved = int(np.count_nonzero(self._ids)) if len(self._ids) else 0
+        return self._saved - len(self._hidden) + len(self._overlay)
+
+    @classmethod
+    def load(cls, folder_path: str) -> "PositionIds":
+        return cls(load_array(os.path.join(folder_path, INDEX_IDS_FILENAME)))
+
+
+def _replace(folder_path: str, filename: str, write) -> None:
+    """Write a file under a temporary name and rename it over ``filename``.
+
+    Readers that still map the old file keep seeing it, which matters when a
+    loaded store is saved back to the directory it was loaded from.
+    """
+    path = os.path.join(folder_path, filename)
+    tmp_path = os.path.join(folder_path, f".{filename}.tmp")
+    write(tmp_path)
+    os.replace(tmp_path, path)
+
+
+def save_docstore(
+    folder_path: str,
+    docstore: Docstore,
+    index_to_docstore_id: Dict[int, str],
+    batch_size: int = 10_000,
+) -> None:
+    """Write a docstore and its position -> id map as memory-mappable columns.
+
+    Works with any docstore (e.g. the ``InMemoryDocstore`` of a freshly built
+    store); chunks are read ``batch_size`` at a time, so saving never holds a
+    second copy of the corpus.
+
+    Args:
+        folder_path: Directory to write the files to.
+        docstore: Docstore holding the chunks.
+        index_to_docstore_id: FAISS position -> docstore id of the index.
+        batch_size: Chunks read from ``docstore`` per step.
+    """
+    positions = sorted(index_to_docstore_id.items())
+    position_ids = [""] * (positions[-1][0] + 1 if positions else 0)
+    for position, docstore_id in positions:
+        position_ids[position] = docstore_id
+    save_array(folder_path, INDEX_IDS_FILENAME, id_array(position_ids))
+    del position_ids, positions
+
+    ids = sorted(set(index_to_docstore_id.values()))
+    keys: Dict[str, int] = {}
+    values: List[Dict[str, int]] = []
+    codes: List[array] = []
+    offsets = array("q", [0])
+    stored: List[str] = []
+
+    text_tmp = os.path.join(folder_path, f".{DOCSTORE_TEXT_FILENAME}.tmp")
+    with open(text_tmp, "wb") as text_file:
+        for start in range(0, len(ids), batch_size):
+            for docstore_id in ids[start:start + batch_size]:
+                doc = docstore.search(docstore_id)
+                if not isinstance(doc, Document):
+                    continue
+                encoded = doc.page_content.encode("utf-8")
+                text_file.write(encoded)
+                offsets.append(offsets[-1] + len(encoded))
+                row = len(stored)
+                stored.append(docstore_id)
+                for key, value in doc.metadata.items():
+                    column = keys.get(key)
+                    if column is None:
+                        column = keys[key] = len(keys)
+                        values.append({})
+                        codes.append(array("i", [_MISSING]) * row)
+                    serialized = json.dumps(value, sort_keys=True, default=str)
+                    codes[column].append(values[column].setdefault(serialized, len(values[column])))
+                for column_codes in codes:
+                    if len(column_codes) == row:
+                        column_codes.append(_MISSING)
+    os.replace(text_tmp, os.path.join(folder_path, DOCSTORE_TEXT_FILENAME))
+
+    metadata = np.full((len(stored), len(keys)), _MISSING, dtype=np.int32)
+    for column, column_codes in enumerate(codes):
+        metadata[:, column] = np.frombuffer(column_codes, dtype=np.int32) if len(column_codes) else []
+    save_array(folder_path, DOCSTORE_IDS_FILENAME, id_array(stored))
+    save_array(folder_path, DOCSTORE_OFFSETS_FILENAME, np.frombuffer(offsets, dtype=np.int64))
+    save_array(folder_path, DOCSTORE_METADATA_FILENAME, metadata)
+
+    def write_columns(path: str) -> None:
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(
+                {
+                    "version": DOCSTORE_FORMAT_VERSION,
+                    "keys": list(keys),
+                    "values": [list(column_values) for column_values in values],
+                },
+                f,
+            )
+
+    # Written last: its presence marks a complete docstore
+    _replace(folder_path, DOCSTORE_COLUMNS_FILENAME, write_columns)
+
+
+def _save_npy(path: str, values: np.ndarray) -> None:
+    with open(path, "wb") as f:
+        np.save(f, values)
+
+
+def save_array(folder_path: str, filename: str, values: np.ndarray) -> None:
+    """Atomically write an array that ``load_array`` can memory map."""
+    _replace(folder_path, filename, lambda path: _save_npy(path, values))
+
+
+def has_docstore(folder_path: str) -> bool:
+    """Whether ``folder_path`` holds a docstore written by ``save_docstore``."""
+    return os.path.exists(os.path.join(folder_path, DOCSTORE_COLUMNS_FILENAME))
+
+
+def load_docstore(folder_path: str) -> Tuple[ColumnarDocstore, PositionIds]:
+    """Memory map a saved docstore and its position -> id map."""
+    return ColumnarDocstore.load(folder_path), PositionIds.load(folder_path)
@@ -0,0 +1,159 @@
+import hashlib
+import re
+import sqlite3
+import threading
+import uuid
+import zlib
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+import numpy as np
+from langchain_community.docstore.document import Document
+
+DEDUP_THRESHOLD = 0.9
+DUPLICATE_SOURCES_KEY = "duplicate_sources"
+DEDUP_CACHE_KB = 16 * 1024  # SQLite page cache of the deduplicator's signature store
+
+_MERSENNE_PRIME = np.uint64((1 << 61) - 1)
+_WORD_RE = re.compile(r"\w+")
+
+
+def _lsh_bands(num_perm: int, threshold: float) -> Tuple[int, int]:
+    """Pick (bands, rows) whose LSH S-curve turns at about ``threshold``."""
+    options = [(num_perm // rows, rows) for rows in range(1, num_perm + 1) if num_perm % rows == 0]
+    return min(options, key=lambda br: abs((1 / br[0]) ** (1 / br[1]) - threshold))
+
+
+class ChunkDeduplicator:
+    """Drops exact and near-duplicate chunks from a stream before they are embedded.
+
+    Exact duplicates are caught by a hash of the normalised text. Near
+    duplicates are found with MinHash signatures over word shingles and
+    banded locality-sensitive hashing, so each chunk is compared only with the
+    few kept chunks that share a band; a candidate counts as a duplicate when
+    the estimated Jaccard similarity is at least ``threshold``. Work grows
+    linearly with the number of chunks.
+
+    Hashes, signatures and band buckets of kept chunks live in a private
+    temporary SQLite database on disk, so resident memory is bounded by its
+    page cache (``DEDUP_CACHE_KB``) rather than growing with the corpus; only
+    ``provenance`` grows, with the number of duplicates found.
+
+    Kept chunks are given a stable ``id``; the sources of the duplicates they
+    absorbed are recorded in ``provenance``. Once the chunks are stored,
+    ``AWSVectorStore.record_duplicate_sources`` registers them with the store,
+    while ``apply_provenance`` only writes them to a docstore's metadata.
+    """
+
+    def __init__(
+        self,
+        threshold: float = DEDUP_THRESHOLD,
+        num_perm: int = 128,
+        shingle_size: int = 5,
+        seed: int = 1,
+    ):
+        self.threshold = threshold
+        self.num_perm = num_perm
+        self.shingle_size = shingle_size
+        self.bands, self.rows = _lsh_bands(num_perm, threshold)
+
+        rng = np.random.default_rng(seed)
+        self._a = rng.integers(1, 1 << 32, num_perm, dtype=np.uint64)
+        self._b = rng.integers(0, 1 << 32, num_perm, dtype=np.uint64)
+
+        # An empty filename is a temporary database SQLite deletes when it is closed
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect("", check_same_thread=False)
+        self._conn.execute(f"PRAGMA cache_size=-{DEDUP_CACHE_KB}")
+        self._conn.execute("PRAGMA journal_mode=OFF")
+        self._conn.execute("PRAGMA synchronous=OFF")
+        self._conn.execute("CREATE TABLE exact (digest BLOB PRIMARY KEY, kept_id TEXT NOT NULL) WITHOUT ROWID")
+        self._conn.execute("CREATE TABLE kept (position INTEGER PRIMARY KEY, kept_id TEXT NOT NULL, signature BLOB NOT NULL)")
+        self._conn.execute("CREATE TABLE buckets (key BLOB NOT NULL, position INTEGER NOT NULL)")
+        self._conn.execute("CREATE INDEX buckets_key ON buckets (key)")
+        self._num_kept = 0
+        self.provenance: Dict[str, List[str]] = {}
+        self.seen = 0
+        self.exact_duplicates = 0
+        self.near_duplicates = 0
+
+    def signature(self, text: str) -> np.ndarray:
+        """Return the MinHash signature of a text's word shingles."""
+        words = _WORD_RE.findall(text.lower())
+        n = self.shingle_size
+        shingles = {" ".join(words[i:i + n]) for i in range(max(1, len(words) - n + 1))}
+        hashes = np.fromiter(
+            (zlib.crc32(shingle.encode("utf-8")) for shingle in shingles),
+            dtype=np.uint64,
+            count=len(shingles),
+        )
+        permuted = (np.outer(self._a, hashes) + self._b[:, None]) % _MERSENNE_PRIME
+        return permuted.min(axis=1).astype(np.uint32)
+
+    def _find_duplicate(self, signature: np.ndarray) -> Tuple[Optional[str], List[bytes]]:
+        """Return the id of a kept chunk similar to ``signature`` (if any) and the signature's band keys."""
+        keys = [
+            band.to_bytes(2, "little") + signature[band * self.rows:(band + 1) * self.rows].tobytes()
+            for band in range(self.bands)
+        ]
+        candidates = self._conn.execute(
+            "SELECT kept.kept_id, kept.signature FROM kept WHERE kept.position IN "
+            f"(SELECT position FROM buckets WHERE key IN ({', '.join('?' * len(keys))})) ORDER BY kept.position",
+            keys,
+        )
+        for kept_id, candidate in candidates:
+            if np.mean(np.frombuffer(candidate, dtype=np.uint32) == signature) >= self.threshold:
+                return kept_id, keys
+        return None, keys
+
+    def _keep(self, chunk: Document, digest: bytes, signature: np.ndarray, keys: List[bytes]) -> str:
+        """Record a chunk as kept and return its id. Caller holds the lock."""
+        kept_id = chunk.id or str(uuid.uuid4())
+        position = self._num_kept
+        self._num_kept += 1
+        self._conn.execute("INSERT OR IGNORE INTO exact VALUES (?, ?)", (digest, kept_id))
+        self._conn.execute("INSERT INTO kept VALUES (?, ?, ?)", (position, kept_id, signature.tobytes()))
+        self._conn.executemany("INSERT INTO buckets VALUES (?, ?)", [(key, position) for key in keys])
+        return kept_id
+
+    def deduplicate(self, chunks: Iterable[Document]) -> Iterator[Document]:
+        """Lazily yield the chunks that are not duplicates of an earlier chunk."""
+        for chunk in chunks:
+            self.seen += 1
+            source = chunk.metadata.get("source", "unknown")
+            normalized = " ".join(chunk.page_content.lower().split())
+            digest = hashlib.sha1(normalized.encode("utf-8")).digest()
+            with self._lock:
+                row = self._conn.execute("SELECT kept_id FROM exact WHERE digest = ?", (digest,)).fetchone()
+                if row is not None:
+                    self.exact_duplicates += 1
+                    self.provenance.setdefault(row[0], []).append(source)
+                    continue
+
+                signature = self.signature(normalized)
+                match, keys = self._find_duplicate(signature)
+                if match is not None:
+                    self.near_duplicates += 1
+                    self.provenance.setdefault(match, []).append(source)
+                    continue
+
+                kept_id = self._keep(chunk, digest, signature, keys)
+            yield Document(id=kept_id, page_content=chunk.page_content, metadata=chunk.metadata)
+
+    def apply_provenance(self, docstore) -> None:
+        """Record the sources of dropped duplicates in the metadata of the chunks that were kept."""
+        for kept_id, sources in self.provenance.items():
+            doc = docstore.search(kept_id)
+            if isinstance(doc, Document):
+                doc.metadata[DUPLICATE_SOURCES_KEY] = sorted(set(sources))
+
+    def close(self) -> None:
+        """Drop the temporary signature store."""
+        self._conn.close()
+
+    def report(self) -> str:
+        dropped = self.exact_duplicates + self.near_duplicates
+        return (
+            f"[INFO] Deduplication dropped {dropped} of {self.seen} chunks "
+            f"({self.exact_duplicates} exact, {self.near_duplicates} near-duplicate, "
+            f"Jaccard >= {self.threshold})"
+        )
@@ -0,0 +1,221 @@
+import hashlib
+import os
+import sqlite3
+import threading
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+from steps.embeddings import embedding_model_id
+
+DEFAULT_CACHE_DIR = "embedding_cache"
+KEYS_FILENAME = "keys.sqlite"
+WRITE_LOCK_TIMEOUT = 60.0  # Seconds a writer waits for another process's append
+
+
+def text_hash(text: str) -> str:
+    """Return the sha256 hex digest of a chunk's text."""
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+class EmbeddingCache:
+    """On-disk cache of chunk embeddings keyed by (model id, sha256 of text).
+
+    Keys live in a small SQLite table mapping each key to a row number. The
+    vectors of each model are appended to a flat float16 (or float32) matrix
+    file that is read back through a memory map, so looking up cached vectors
+    does not load the whole cache into memory.
+
+    Several processes (e.g. API workers warming up together) can share one
+    cache directory: writes take SQLite's database write lock for the whole
+    append, so each writer numbers its rows after the previous one's vectors.
+    """
+
+    def __init__(self, path: str = DEFAULT_CACHE_DIR, dtype: str = "float16"):
+        os.makedirs(path, exist_ok=True)
+        self.path = path
+        self.dtype = np.dtype(dtype)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(
+            os.path.join(path, KEYS_FILENAME), timeout=WRITE_LOCK_TIMEOUT, check_same_thread=False
+        )
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS models "
+            "(model TEXT PRIMARY KEY, dim INTEGER NOT NULL, dtype TEXT NOT NULL, rows INTEGER NOT NULL)"
+        )
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings "
+            "(model TEXT NOT NULL, hash TEXT NOT NULL, row INTEGER NOT NULL, PRIMARY KEY (model, hash))"
+        )
+        self._conn.commit()
+        self._maps: Dict[str, np.memmap] = {}
+        self.hits = 0
+        self.misses = 0
+
+    def _matrix_path(self, model_id: str) -> str:
+        digest = hashlib.sha1(model_id.encode("utf-8")).hexdigest()[:16]
+        return os.path.join(self.path, f"vectors-{digest}.bin")
+
+    def _model_info(self, model_id: str) -> Optional[tuple]:
+        return self._conn.execute(
+            "SELECT dim, dtype, rows FROM models WHERE model = ?", (model_id,)
+        ).fetchone()
+
+    def _matrix(self, model_id: str, dim: int, dtype: np.dtype, rows: int) -> np.memmap:
+        """Return a memory map covering at least ``rows`` rows. Caller holds the lock."""
+        matrix = self._maps.get(model_id)
+        if matrix is None or matrix.shape[0] < rows:
+            matrix = np.memmap(self._matrix_path(model_id), dtype=dtype, mode="r", shape=(rows, dim))
+            self._maps[model_id] = matrix
+        return matrix
+
+    def _lookup_rows(self, model_id: str, hashes: Sequence[str]) -> Dict[str, int]:
+        """Map cached hashes to matrix rows. Caller holds the lock."""
+        rows: Dict[str, int] = {}
+        unique = list(set(hashes))
+        # Stay well below SQLite's bound parameter limit
+        for start in range(0, len(unique), 500):
+            batch = unique[start:start + 500]
+            placeholders = ",".join("?" * len(batch))
+            rows.update(self._conn.execute(
+                f"SELECT hash, row FROM embeddings WHERE model = ? AND hash IN ({placeholders})",
+                (model_id, *batch),
+            ).fetchall())
+        return rows
+
+    def get_many(self, model_id: str, hashes: Sequence[str]) -> List[Optional[np.ndarray]]:
+        """Look up cached vectors.
+
+        Args:
+            model_id: Identifier of the embedding model.
+            hashes: Text hashes (see ``text_hash``).
+
+        Returns:
+            One float32 vector per hash, or None where the cache has no entry.
+        """
+        results: List[Optional[np.ndarray]] = [None] * len(hashes)
+        with self._lock:
+            info = self._model_info(model_id)
+            if info is None:
+                self.misses += len(hashes)
+                return results
+            dim, dtype, total_rows = info
+
+            rows = self._lookup_rows(model_id, hashes)
+            if rows:
+                matrix = self._matrix(model_id, dim, np.dtype(dtype), total_rows)
+                for i, key in enumerate(hashes):
+                    row = rows.get(key)
+                    if row is not None:
+                        results[i] = np.asarray(matrix[row], dtype=np.float32)
+
+            found = sum(1 for vector in results if vector is not None)
+            self.hits += found
+            self.misses += len(hashes) - found
+        return results
+
+    def put_many(self, model_id: str, hashes: Sequence[str], vectors: Sequence[Sequence[float]]) -> None:
+        """Store vectors for the given text hashes.
+
+        Args:
+            model_id: Identifier of the embedding model.
+            hashes: Text hashes (see ``text_hash``).
+            vectors: One embedding per hash.
+        """
+        if not hashes:
+            return
+        matrix = np.asarray(vectors, dtype=np.float32)
+        with self._lock:
+            # Held until commit, so no other process appends between numbering and writing rows
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._append(model_id, hashes, matrix)
+            except BaseException:
+                self._conn.rollback()
+                raise
+            self._conn.commit()
+
+    def _append(self, model_id: str, hashes: Sequence[str], matrix: np.ndarray) -> None:
+        """Write vectors for uncached hashes. Caller holds the lock and a write transaction."""
+        self._conn.execute(
+            "INSERT OR IGNORE INTO models (model, dim, dtype, rows) VALUES (?, ?, ?, 0)",
+            (model_id, matrix.shape[1], self.dtype.name),
+        )
+        dim, dtype, rows = self._model_info(model_id)
+        if matrix.shape[1] != dim:
+            raise ValueError(f"Embedding size {matrix.shape[1]} does not match cached size {dim} for {model_id}")
+
+        new_keys = {}
+        for key, vector in zip(hashes, matrix):
+            if key not in new_keys:
+                new_keys[key] = vector
+        existing = self._lookup_rows(model_id, list(new_keys))
+        to_write = [(key, vector) for key, vector in new_keys.items() if key not in existing]
+        if not to_write:
+            return
+
+        # Append vectors first so a crash never leaves keys pointing past the file end.
+        # Rows are numbered from the file size, so rows orphaned by a crash are skipped.
+        matrix_path = self._matrix_path(model_id)
+        if os.path.exists(matrix_path):
+            rows = os.path.getsize(matrix_path) // (dim * np.dtype(dtype).itemsize)
+        with open(matrix_path, "ab") as f:
+            f.write(np.stack([vector for _, vector in to_write]).astype(dtype).tobytes())
+        self._conn.executemany(
+            "INSERT OR IGNORE INTO embeddings (model, hash, row) VALUES (?, ?, ?)",
+            [(model_id, key, rows + i) for i, (key, _) in enumerate(to_write)],
+        )
+        self._conn.execute(
+            "UPDATE models SET rows = ? WHERE model = ?", (rows + len(to_write), model_id)
+        )
+
+    def stats(self) -> Dict[str, float]:
+        """Return hit/miss counters and the cache's size on disk."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            size = sum(
+                os.path.getsize(os.path.join(self.path, name))
+                for name in os.listdir(self.path)
+                if os.path.isfile(os.path.join(self.path, name))
+            )
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "bytes": size,
+            }
+
+    def close(self) -> None:
+        with self._lock:
+            self._maps.clear()
+            self._conn.close()
+
+
+class CachedEmbeddings(Embeddings):
+    """Embeddings wrapper that serves document embeddings from an ``EmbeddingCache``.
+
+    Only texts missing from the cache are sent to the underlying model. Query
+    embeddings are not cached.
+    """
+
+    def __init__(self, underlying_embeddings: Embeddings, cache: EmbeddingCache):
+        self.underlying_embeddings = underlying_embeddings
+        self.cache = cache
+        self.model_id = embedding_model_id(underlying_embeddings)
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        hashes = [text_hash(text) for text in texts]
+        cached = self.cache.get_many(self.model_id, hashes)
+
+        missing = [i for i, vector in enumerate(cached) if vector is None]
+        if missing:
+            computed = self.underlying_embeddings.embed_documents([texts[i] for i in missing])
+            self.cache.put_many(self.model_id, [hashes[i] for i in missing], computed)
+            for i, vector in zip(missing, computed):
+                cached[i] = vector
+
+        return [vector.tolist() if isinstance(vector, np.ndarray) else list(vector) for vector in cached]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.underlying_embeddings.embed_query(text)
@@ -0,0 +1,159 @@
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from functools import partial
+from multiprocessing import get_context
+from typing import Callable, List, Optional, Sequence
+
+from langchain_core.embeddings import Embeddings
+
+from steps.embeddings import embedding_registry, get_embeddings
+
+EMBEDDING_BATCH_SIZE = int(os.getenv("EMBEDDING_BATCH_SIZE", "64"))
+EMBEDDING_WORKERS = int(os.getenv("EMBEDDING_WORKERS", "0"))
+PROGRESS_EVERY = 0.1  # Report progress every 10% of the chunks
+
+# Embedding model of a pool worker process, created once by _init_worker
+_worker_embeddings: Optional[Embeddings] = None
+
+
+def _init_worker(factory: Callable[[], Embeddings], threads: int) -> None:
+    """Load the embedding model in a pool worker and pin its thread count."""
+    global _worker_embeddings
+    try:
+        import torch
+        # Without this every worker spawns one thread per core and they fight
+        torch.set_num_threads(threads)
+    except ImportError:
+        pass
+    _worker_embeddings = factory()
+
+
+def _embed_in_worker(batch: List[str]) -> List[List[float]]:
+    return _worker_embeddings.embed_documents(batch)
+
+
+def length_buckets(texts: Sequence[str], batch_size: int) -> List[List[int]]:
+    """Group text indices into batches of similar length.
+
+    Sorting by length before batching keeps texts that pad to the same length
+    together, which cuts wasted work in transformer encoders.
+
+    Args:
+        texts: Texts to embed.
+        batch_size: Maximum number of texts per batch.
+
+    Returns:
+        Lists of indices into ``texts``, one per batch.
+    """
+    order = sorted(range(len(texts)), key=lambda i: len(texts[i]))
+    return [order[start:start + batch_size] for start in range(0, len(order), batch_size)]
+
+
+class BatchedEmbeddings(Embeddings):
+    """Embeddings wrapper that embeds documents in length-bucketed batches.
+
+    With ``num_workers`` above 1, batches are sharded across a process pool in
+    which every worker loads its own copy of the model from ``factory``, by
+    default the registry entry ``underlying_embeddings`` was loaded from. Vectors
+    are always returned in the order of the input texts. Query embeddings go
+    straight to the underlying model.
+
+    The pool is started on first use and kept for later calls, so streaming
+    index builds pay the model load once; call ``close`` when done.
+    """
+
+    def __init__(
+        self,
+        underlying_embeddings: Embeddings,
+        batch_size: int = EMBEDDING_BATCH_SIZE,
+        num_workers: int = EMBEDDING_WORKERS,
+        factory: Optional[Callable[[], Embeddings]] = None,
+    ):
+        if factory is None:
+            model_key = embedding_registry.key_of(underlying_embeddings)
+            if model_key is not None:
+                factory = partial(get_embeddings, model_key)
+            elif num_workers > 1:
+                raise ValueError(
+                    "Embedding workers need a factory for models not loaded through get_embeddings"
+                )
+        self.underlying_embeddings = underlying_embeddings
+        self.batch_size = max(1, batch_size)
+        self.num_workers = num_workers
+        self.factory = factory
+        self._pool: Optional[ProcessPoolExecutor] = None
+
+    def _get_pool(self) -> ProcessPoolExecutor:
+        if self._pool is None:
+            threads = max(1, (os.cpu_count() or 1) // self.num_workers)
+            # Spawn rather than fork: forked tokenizers and torch thread pools can deadlock
+            self._pool = ProcessPoolExecutor(
+                max_workers=self.num_workers,
+                mp_context=get_context("spawn"),
+                initializer=_init_worker,
+                initargs=(self.factory, threads),
+            )
+        return self._pool
+
+    def close(self) -> None:
+        """Shut down the worker pool, if one was started."""
+        if self._pool is not None:
+            self._pool.shutdown()
+            self._pool = None
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        if not texts:
+            return []
+        batches = length_buckets(texts, self.batch_size)
+        vectors: List[Optional[List[float]]] = [None] * len(texts)
+        progress = _Progress(len(texts))
+
+        if self.num_workers > 1 and len(batches) > 1:
+            pool = self._get_pool()
+            futures = {
+                pool.submit(_embed_in_worker, [texts[i] for i in batch]): batch
+                for batch in batches
+            }
+            for future in as_completed(futures):
+                batch = futures[future]
+                for i, vector in zip(batch, future.result()):
+                    vectors[i] = vector
+                progress.update(len(batch))
+        else:
+            for batch in batches:
+                embedded = self.underlying_embeddings.embed_documents([texts[i] for i in batch])
+                for i, vector in zip(batch, embedded):
+                    vectors[i] = vector
+                progress.update(len(batch))
+
+        progress.finish()
+        return vectors
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.underlying_embeddings.embed_query(text)
+
+
+class _Progress:
+    """Prints embedding progress and throughput at regular intervals."""
+
+    def __init__(self, total: int):
+        self.total = total
+        self.done = 0
+        self.started = time.perf_counter()
+        self._step = max(1, int(total * PROGRESS_EVERY))
+        self._next_report = self._step
+
+    def _rate(self) -> float:
+        elapsed = time.perf_counter() - self.started
+        return self.done / elapsed if elapsed > 0 else 0.0
+
+    def update(self, count: int) -> None:
+        self.done += count
+        if self.done >= self._next_report and self.done < self.total:
+            print(f"[INFO] Embedded {self.done}/{self.total} chunks ({self._rate():.1f} chunks/sec)")
+            self._next_report = self.done + self._step
+
+    def finish(self) -> None:
+        elapsed = time.perf_counter() - self.started
+        print(f"[INFO] Embedded {self.total} chunks in {elapsed:.2f}s ({self._rate():.1f} chunks/sec)")
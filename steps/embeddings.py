@@ -0,0 +1,137 @@
+import os
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+from langchain_core.embeddings import Embeddings
+
+HUGGINGFACE_MODEL_NAME = "sentence-transformers/all-MiniLM-L6-v2"
+FAKE_EMBEDDING_SIZE = 1536
+
+
+def default_model_key() -> str:
+    """Return the registry key of the embedding model to use in this environment."""
+    if os.getenv("OPENAI_API_KEY"):
+        return "openai"
+    return f"huggingface:{HUGGINGFACE_MODEL_NAME}"
+
+
+def load_embeddings(model_key: str) -> Embeddings:
+    """Construct the embedding model for a registry key.
+
+    OpenAI embeddings are used for ``"openai"``, otherwise the local HuggingFace
+    sentence-transformers model. If sentence-transformers is not installed a fake
+    embedding is returned so the pipeline can still run end to end.
+    """
+    if model_key == "openai":
+        from langchain_openai import OpenAIEmbeddings
+        return OpenAIEmbeddings()
+    try:
+        from langchain_community.embeddings import HuggingFaceEmbeddings
+        return HuggingFaceEmbeddings(model_name=model_key.split(":", 1)[-1])
+    except ImportError:
+        from langchain_community.embeddings import FakeEmbeddings
+        return FakeEmbeddings(size=FAKE_EMBEDDING_SIZE)
+
+
+def _model_size_bytes(embeddings: Embeddings) -> Optional[int]:
+    """Return the size of a local model's weights, or None for remote models."""
+    client = getattr(embeddings, "client", None)
+    parameters = getattr(client, "parameters", None)
+    if not callable(parameters):
+        return None
+    try:
+        return sum(p.numel() * p.element_size() for p in parameters())
+    except Exception:
+        return None
+
+
+class EmbeddingRegistry:
+    """Process-wide cache of embedding models keyed by model key.
+
+    Each model is constructed once, on first use, and shared by index builds,
+    index loads, the query path and the caches. Concurrent first requests for
+    the same model wait for a single load instead of loading it twice.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._load_locks: Dict[str, threading.Lock] = {}
+        self._models: Dict[str, Embeddings] = {}
+        self._metrics: Dict[str, Dict[str, Any]] = {}
+
+    def get(self, model_key: str) -> Embeddings:
+        """Return the shared model for ``model_key``, loading it if needed."""
+        model = self._models.get(model_key)
+        if model is not None:
+            return model
+
+        with self._lock:
+            load_lock = self._load_locks.setdefault(model_key, threading.Lock())
+        with load_lock:
+            model = self._models.get(model_key)
+            if model is None:
+                started = time.perf_counter()
+                model = load_embeddings(model_key)
+                load_seconds = time.perf_counter() - started
+                with self._lock:
+                    self._models[model_key] = model
+                    self._metrics[model_key] = {
+                        "model": model_key,
+                        "model_id": embedding_model_id(model),
+                        "load_seconds": round(load_seconds, 3),
+                        "size_bytes": _model_size_bytes(model),
+                    }
+                print(f"[INFO] Loaded embedding model {model_key} in {load_seconds:.2f}s")
+        return model
+
+    def key_of(self, model: Embeddings) -> Optional[str]:
+        """Return the key ``model`` was loaded under, or None if it was not loaded here."""
+        with self._lock:
+            return next((key for key, loaded in self._models.items() if loaded is model), None)
+
+    def metrics(self) -> List[Dict[str, Any]]:
+        """Return load time and weight size of every loaded model."""
+        with self._lock:
+            return [dict(m) for m in self._metrics.values()]
+
+    def clear(self) -> None:
+        """Forget every loaded model."""
+        with self._lock:
+            self._models.clear()
+            self._metrics.clear()
+
+
+embedding_registry = EmbeddingRegistry()
+
+
+def get_embeddings(model_key: Optional[str] = None) -> Embeddings:
+    """Return the shared embedding model used for the AWS knowledge base.
+
+    Args:
+        model_key: Registry key of the model; defaults to ``default_model_key()``.
+
+    Returns:
+        The process-wide instance of that model.
+    """
+    return embedding_registry.get(model_key or default_model_key())
+
+
+def embedding_model_id(embeddings: Embeddings) -> str:
+    """Return a stable identifier for an embedding model, e.g. for cache keys.
+
+    Args:
+        embeddings: The embedding model instance.
+
+    Returns:
+        A string such as ``"HuggingFaceEmbeddings:sentence-transformers/all-MiniLM-L6-v2"``.
+    """
+    # Wrappers such as CachedEmbeddings are identified by the model they wrap
+    while hasattr(embeddings, "underlying_embeddings"):
+        embeddings = embeddings.underlying_embeddings
+    name = (
+        getattr(embeddings, "model_name", None)
+        or getattr(embeddings, "model", None)
+        or getattr(embeddings, "size", None)
+    )
+    return f"{type(embeddings).__name__}:{name}"
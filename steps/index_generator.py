@@ -1,33 +1,220 @@
+import hashlib
+import json
 import os
-from typing import List
+from typing import Iterable, List, Optional
 from langchain.schema.vectorstore import VectorStore
-from langchain.text_splitter import CharacterTextSplitter
 from langchain_community.docstore.document import Document
-from langchain_community.vectorstores import FAISS
+from langchain_core.embeddings import Embeddings
+
+from materializers.faiss_materializer import load_vector_store, save_vector_store
+from steps.ann_index import IndexSpec
+from steps.deduplication import DEDUP_THRESHOLD, ChunkDeduplicator
+from steps.embedding_cache import CachedEmbeddings, EmbeddingCache
+from steps.embedding_engine import EMBEDDING_BATCH_SIZE, EMBEDDING_WORKERS, BatchedEmbeddings
+from steps.embeddings import embedding_model_id, get_embeddings
+from steps.sharded_store import ShardedVectorStore
+from steps.text_splitter import TokenTextSplitter, get_tokenizer
+from steps.vector_store import AWSVectorStore
+
+CHUNK_SIZE = 250  # Tokens of the embedding model; within MiniLM's 254-token input limit
+CHUNK_OVERLAP = 0
+
 
 def index_generator(
-    documents: List[Document],
+    documents: Iterable[Document],
+    chunk_size: int = CHUNK_SIZE,
+    chunk_overlap: int = CHUNK_OVERLAP,
+    embeddings: Optional[Embeddings] = None,
+    embedding_cache: Optional[EmbeddingCache] = None,
+    batch_size: int = EMBEDDING_BATCH_SIZE,
+    num_workers: int = EMBEDDING_WORKERS,
+    index_spec: Optional[IndexSpec] = None,
+    dedup_threshold: Optional[float] = DEDUP_THRESHOLD,
+    num_shards: int = 1,
+    shard_by: str = "hash",
 ):
+    embeddings = embeddings or get_embeddings()
+    text_splitter = get_text_splitter(chunk_size, chunk_overlap, embeddings)
+    chunks = text_splitter.split_documents(documents)
 
-    if os.getenv("OPENAI_API_KEY"):
-        from langchain_openai import OpenAIEmbeddings
-        embeddings = OpenAIEmbeddings()
-    else:
-        try:
-            from langchain_community.embeddings import HuggingFaceEmbeddings
-            embeddings = HuggingFaceEmbeddings(model_name="sentence-transformers/all-MiniLM-L6-v2")
-        except ImportError:
-            from langchain_community.embeddings import FakeEmbeddings
-            embeddings = FakeEmbeddings(size=1536)  
-    
-    text_splitter = CharacterTextSplitter(chunk_size=1000, chunk_overlap=0)
-    compiled_texts = text_splitter.split_documents(documents)
-
-    print(f"Created vector store with {len(compiled_texts)} text chunks using embedding approach")
-
-    vector_store = FAISS.from_documents(
-        compiled_texts,
-        embeddings
-    )
+    # Boilerplate repeated across pages is dropped before it costs an embedding
+    deduplicator = None
+    if dedup_threshold is not None:
+        deduplicator = ChunkDeduplicator(threshold=dedup_threshold)
+        chunks = deduplicator.deduplicate(chunks)
+
+    batched_embeddings = BatchedEmbeddings(embeddings, batch_size=batch_size, num_workers=num_workers)
+    build_embeddings = batched_embeddings
+    if embedding_cache is not None:
+        # Unchanged chunks are served from disk; only cache misses are embedded
+        build_embeddings = CachedEmbeddings(batched_embeddings, embedding_cache)
+
+    # Chunks are produced lazily and embedded batch by batch as they are split
+    try:
+        if num_shards > 1:
+            vector_store = ShardedVectorStore.from_chunk_stream(
+                chunks,
+                build_embeddings,
+                index_spec=index_spec,
+                num_shards=num_shards,
+                shard_by=shard_by
+            )
+        else:
+            vector_store = AWSVectorStore.from_chunk_stream(
+                chunks,
+                build_embeddings,
+                index_spec=index_spec
+            )
+    finally:
+        batched_embeddings.close()
 
+    return finalize_vector_store(vector_store, embeddings, deduplicator)
+
+
+def finalize_vector_store(
+    vector_store: VectorStore,
+    embeddings: Embeddings,
+    deduplicator: Optional[ChunkDeduplicator] = None,
+) -> VectorStore:
+    """Record duplicate provenance in a freshly built store and report its size.
+
+    The store is switched from the build's embedding wrappers to the plain
+    ``embeddings`` model, so later upserts do not restart the closed worker pool.
+    """
+    shards = list(vector_store.shards.values()) if isinstance(vector_store, ShardedVectorStore) else [vector_store]
+    for shard in shards:
+        shard.embedding_function = embeddings
+    if isinstance(vector_store, ShardedVectorStore):
+        vector_store.embedding = embeddings
+    if deduplicator is not None:
+        for shard in shards:
+            shard.record_duplicate_sources(deduplicator.provenance)
+        print(deduplicator.report())
+        deduplicator.close()
+
+    total = sum(shard.index.ntotal for shard in shards)
+    print(f"Created vector store with {total} text chunks in {len(shards)} shard(s) using embedding approach")
     return vector_store
+
+
+def get_text_splitter(
+    chunk_size: int = CHUNK_SIZE,
+    chunk_overlap: int = CHUNK_OVERLAP,
+    embeddings: Optional[Embeddings] = None,
+) -> TokenTextSplitter:
+    """Return the text splitter used to chunk knowledge base documents.
+
+    Chunks are sized in tokens of the embedding model's own tokenizer.
+    """
+    tokenizer = get_tokenizer(embeddings or get_embeddings())
+    return TokenTextSplitter(tokenizer, chunk_size=chunk_size, chunk_overlap=chunk_overlap)
+
+
+def index_fingerprint(
+    documents: List[Document],
+    chunk_size: int,
+    chunk_overlap: int,
+    model_id: str,
+    index_params: Optional[dict] = None,
+    dedup_threshold: Optional[float] = None,
+) -> str:
+    """Hash everything that determines the contents of a built index.
+
+    Args:
+        documents: The documents to index, in order.
+        chunk_size: Text splitter chunk size.
+        chunk_overlap: Text splitter chunk overlap.
+        model_id: Identifier of the embedding model (see ``embedding_model_id``).
+        index_params: Parameters of the FAISS index type (see ``IndexSpec.build_params``).
+        dedup_threshold: Jaccard threshold of near-duplicate removal, or None if disabled.
+
+    Returns:
+        A hex digest usable as a directory name.
+    """
+    digest = hashlib.sha256()
+    params = {"chunk_size": chunk_size, "chunk_overlap": chunk_overlap, "model": model_id}
+    if index_params:
+        params["index"] = index_params
+    if dedup_threshold is not None:
+        params["dedup_threshold"] = dedup_threshold
+    digest.update(json.dumps(params, sort_keys=True).encode("utf-8"))
+    for doc in documents:
+        digest.update(json.dumps(doc.metadata, sort_keys=True, default=str).encode("utf-8"))
+        digest.update(b"\0")
+        digest.update(doc.page_content.encode("utf-8"))
+        digest.update(b"\0")
+    return digest.hexdigest()[:32]
+
+
+def cached_index_generator(
+    documents: List[Document],
+    index_dir: str,
+    chunk_size: int = CHUNK_SIZE,
+    chunk_overlap: int = CHUNK_OVERLAP,
+    embedding_cache: Optional[EmbeddingCache] = None,
+    index_spec: Optional[IndexSpec] = None,
+    dedup_threshold: Optional[float] = DEDUP_THRESHOLD,
+    num_shards: int = 1,
+    shard_by: str = "hash",
+) -> VectorStore:
+    """Load a previously built index for these documents, or build and persist one.
+
+    Indexes are stored under ``index_dir`` in a directory named after the
+    fingerprint of the documents, chunking parameters and embedding model, so any
+    change to those produces a new index instead of reusing a stale one.
+
+    Args:
+        documents: The documents to index.
+        index_dir: Directory holding persisted indexes.
+        chunk_size: Text splitter chunk size.
+        chunk_overlap: Text splitter chunk overlap.
+        embedding_cache: Optional on-disk cache of chunk embeddings used on rebuilds.
+        index_spec: FAISS index type and parameters; query-time knobs are applied to
+            loaded indexes as well.
+        dedup_threshold: Jaccard similarity above which chunks count as duplicates;
+            None keeps every chunk.
+        num_shards: Split the index into this many shards, built in parallel.
+        shard_by: Assign chunks to shards by a hash of their source ("hash") or
+            by their category ("category").
+
+    Returns:
+        The loaded or freshly built FAISS vector store.
+    """
+    embeddings = get_embeddings()
+    index_spec = index_spec or IndexSpec()
+    index_params = index_spec.build_params()
+    if num_shards > 1:
+        index_params.update(num_shards=num_shards, shard_by=shard_by)
+    key = index_fingerprint(
+        documents,
+        chunk_size,
+        chunk_overlap,
+        embedding_model_id(embeddings),
+        index_params=index_params,
+        dedup_threshold=dedup_threshold,
+    )
+    path = os.path.join(index_dir, key)
+
+    if os.path.isdir(path):
+        try:
+            vector_store = load_vector_store(path, embeddings=embeddings, index_spec=index_spec)
+            print(f"Loaded cached vector store {key} from {index_dir}")
+            return vector_store
+        except Exception as e:
+            print(f"[WARNING] Could not load cached vector store {key}, rebuilding: {e}")
+
+    vector_store = index_generator(
+        documents,
+        chunk_size,
+        chunk_overlap,
+        embeddings=embeddings,
+        embedding_cache=embedding_cache,
+        index_spec=index_spec,
+        dedup_threshold=dedup_threshold,
+        num_shards=num_shards,
+        shard_by=shard_by,
+    )
+    save_vector_store(vector_store, path)
+    print(f"Saved vector store {key} to {index_dir}")
+    # Serve the memory-mapped copy; the built store holds every vector and chunk in memory
+    return load_vector_store(path, embeddings=embeddings, index_spec=index_spec)
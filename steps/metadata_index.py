@@ -0,0 +1,302 @@
+from array import array
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, Iterable, Iterator, List, Mapping, Optional, Set, Tuple, Union
+
+import faiss
+import numpy as np
+
+from steps.columnar_docstore import ColumnarDocstore, PositionIds
+from steps.deduplication import DUPLICATE_SOURCES_KEY
+
+FILTERABLE_FIELDS = ("category", "source")
+
+Filters = Dict[str, List[str]]
+
+# Filters of the query being answered; read by the vector store, whose search
+# is reached through the agent's retriever tool rather than called directly
+retrieval_filters: ContextVar[Optional[Filters]] = ContextVar("retrieval_filters", default=None)
+
+
+def normalize_filters(filters: Optional[Mapping[str, Union[str, Iterable[str]]]]) -> Optional[Filters]:
+    """Validate metadata filters and bring them into ``{field: [values]}`` form.
+
+    A document matches when, for every field, its value is one of the listed
+    values (OR within a field, AND across fields).
+
+    Args:
+        filters: Field to value or list of values, e.g.
+            ``{"category": ["compute", "storage"]}``.
+
+    Returns:
+        The normalised filters, or None when there is nothing to filter on.
+
+    Raises:
+        ValueError: If a field is not filterable or has no values.
+    """
+    if not filters:
+        return None
+    normalized: Filters = {}
+    for field, values in filters.items():
+        if field not in FILTERABLE_FIELDS:
+            raise ValueError(f"Cannot filter on '{field}'; filterable fields are {', '.join(FILTERABLE_FIELDS)}")
+        values = [values] if isinstance(values, str) else sorted({str(value) for value in values})
+        if not values:
+            raise ValueError(f"Filter on '{field}' needs at least one value")
+        normalized[field] = values
+    return dict(sorted(normalized.items()))
+
+
+def pop_filters(kwargs: Dict[str, Any]) -> Optional[Filters]:
+    """Pop explicit ``filters`` from search kwargs, falling back to the query's context."""
+    filters = kwargs.pop("filters", None)
+    return normalize_filters(filters) if filters else retrieval_filters.get()
+
+
+@contextmanager
+def use_filters(filters: Optional[Filters]) -> Iterator[None]:
+    """Apply metadata filters to vector store searches made in this context."""
+    token = retrieval_filters.set(normalize_filters(filters))
+    try:
+        yield
+    finally:
+        retrieval_filters.reset(token)
+
+
+def _field_values(metadata: Mapping[str, Any], field: str) -> List[str]:
+    """Return the values a chunk is indexed under for ``field``.
+
+    A chunk kept by deduplication also stands for the sources of the
+    duplicates it absorbed.
+    """
+    if field == "source":
+        duplicates = metadata.get(DUPLICATE_SOURCES_KEY) or []
+        return [str(metadata.get("source", "unknown"))] + [str(source) for source in duplicates]
+    value = metadata.get(field)
+    return [] if value is None else [str(value)]
+
+
+class MetadataIndex:
+    """Inverted index from metadata values to FAISS positions.
+
+    Every ``(field, value)`` pair has a posting list of the positions of the
+    chunks carrying it. ``mask`` turns filters into a boolean mask over the
+    index, which ``selector`` packs into a FAISS ID selector so the search
+    only visits matching vectors.
+
+    For a store loaded from disk, the saved chunks are indexed straight from
+    the docstore's metadata columns, without reading any chunk.
+    """
+
+    def __init__(self, fields: Tuple[str, ...] = FILTERABLE_FIELDS):
+        self.fields = fields
+        self._postings: Dict[Tuple[str, str], array] = {}
+        self._positions: Dict[str, int] = {}
+        self._saved_ids: Optional[np.ndarray] = None  # Memory-mapped ids by saved position
+        self._saved_live: Optional[np.ndarray] = None  # Saved positions still indexed from the columns
+        self._saved_moved: Optional[np.ndarray] = None  # Current position of each saved one after compaction
+        self._removed = array("q")
+
+    def __len__(self) -> int:
+        return len(self._positions)
+
+    def add(self, positions: Iterable[int], docstore_ids: Iterable[str], metadatas: Iterable[Mapping[str, Any]]) -> None:
+        """Index chunks stored at the given FAISS positions."""
+        for position, docstore_id, metadata in zip(positions, docstore_ids, metadatas):
+            self._positions[docstore_id] = position
+            for field in self.fields:
+                for value in _field_values(metadata, field):
+                    postings = self._postings.get((field, value))
+                    if postings is None:
+                        postings = self._postings[(field, value)] = array("q")
+                    postings.append(position)
+
+    def _extend(self, key: Tuple[str, str], positions: np.ndarray) -> None:
+        postings = self._postings.get(key)
+        if postings is None:
+            postings = self._postings[key] = array("q")
+        postings.frombytes(np.asarray(positions, dtype=np.int64).tobytes())
+
+    def update(self, docstore_id: str, old: Mapping[str, Any], new: Mapping[str, Any]) -> None:
+        """Re-index a chunk whose metadata changed, at the position it already has."""
+        position = self._positions.get(docstore_id)
+        if position is None and self._saved_ids is not None:
+            found = self._find_saved(self._saved_ids == docstore_id.encode("utf-8"))
+            position = int(found[0]) if len(found) else None
+        if position is None:
+            return
+        for field in self.fields:
+            before, after = set(_field_values(old, field)), set(_field_values(new, field))
+            for value in before - after:
+                postings = self._postings.get((field, value))
+                if postings is None:
+                    continue
+                kept = np.frombuffer(postings, dtype=np.int64)
+                kept = kept[kept != position]
+                if len(kept):
+                    self._postings[(field, value)] = array("q", kept.tobytes())
+                else:
+                    del self._postings[(field, value)]
+            for value in sorted(after - before):
+                self._extend((field, value), np.array([position]))
+
+    def remove(self, docstore_ids: Iterable[str]) -> None:
+        """Stop matching the given chunks."""
+        unresolved = []
+        for docstore_id in docstore_ids:
+            position = self._positions.pop(docstore_id, None)
+            if position is not None:
+                self._removed.append(position)
+            else:
+                unresolved.append(docstore_id)
+        if unresolved and self._saved_ids is not None and len(self._saved_ids):
+            ids = np.array([docstore_id.encode("utf-8") for docstore_id in unresolved])
+            saved = np.flatnonzero(np.isin(self._saved_ids, ids) & self._saved_live)
+            self._saved_live[saved] = False
+            self._removed.frombytes(self._current(saved).astype(np.int64).tobytes())
+
+    def renumber(self, new_positions: np.ndarray) -> None:
+        """Move chunks to new FAISS positions after the index was compacted.
+
+        Args:
+            new_positions: New position of each old position, -1 for removed vectors.
+        """
+        for key, postings in list(self._postings.items()):
+            moved = new_positions[np.frombuffer(postings, dtype=np.int64)]
+            moved = moved[moved >= 0]
+            if len(moved):
+                self._postings[key] = array("q", moved.tobytes())
+            else:
+                del self._postings[key]
+        moved = new_positions.tolist()
+        self._positions = {
+            docstore_id: moved[position]
+            for docstore_id, position in self._positions.items()
+            if moved[position] >= 0
+        }
+        removed = new_positions[np.frombuffer(self._removed, dtype=np.int64)]
+        self._removed = array("q", removed[removed >= 0].tobytes())
+        if self._saved_ids is not None:
+            if self._saved_moved is None:
+                moved = np.array(new_positions[:len(self._saved_ids)])
+            else:
+                moved = np.where(self._saved_moved >= 0, new_positions[self._saved_moved], -1)
+            self._saved_moved = moved
+            self._saved_live &= moved >= 0
+
+    def _find_saved(self, matches: np.ndarray) -> np.ndarray:
+        """Return the current positions of the still indexed saved chunks selected by ``matches``."""
+        return self._current(np.flatnonzero(matches & self._saved_live))
+
+    def _current(self, saved: np.ndarray) -> np.ndarray:
+        """Map saved positions to where compaction has moved them."""
+        return saved if self._saved_moved is None else self._saved_moved[saved]
+
+    def values(self, field: str) -> List[str]:
+        """Return the distinct values of a field."""
+        return sorted(value for f, value in self._postings if f == field)
+
+    def mask(self, filters: Filters, size: int) -> np.ndarray:
+        """Return a boolean mask over ``size`` positions of the chunks matching ``filters``."""
+        selected = np.ones(size, dtype=bool)
+        for field, values in filters.items():
+            field_mask = np.zeros(size, dtype=bool)
+            for value in values:
+                postings = self._postings.get((field, value))
+                if postings is not None:
+                    positions = np.frombuffer(postings, dtype=np.int64)
+                    field_mask[positions[positions < size]] = True
+            selected &= field_mask
+        if len(self._removed):
+            removed = np.frombuffer(self._removed, dtype=np.int64)
+            selected[removed[removed < size]] = False
+        return selected
+
+    def _add_saved(
+        self, ids: np.ndarray, hidden: np.ndarray, docstore: ColumnarDocstore, exclude: Set[str]
+    ) -> Dict[int, str]:
+        """Index the chunks at the saved positions of a loaded store from its metadata columns.
+
+        Args:
+            ids: Memory-mapped saved ids by position; only read, never copied.
+            hidden: Saved positions deleted or reassigned since loading.
+            docstore: The store's docstore.
+            exclude: Ids of chunks not to index.
+
+        Returns:
+            Position -> id of the saved positions whose chunk was replaced
+            since loading, which the columns no longer describe.
+        """
+        rows = docstore.saved_rows(ids)
+        dropped = ids == b""
+        dropped[hidden] = True
+        if exclude:
+            dropped |= np.isin(ids, np.array([docstore_id.encode("utf-8") for docstore_id in exclude]))
+        replaced = np.flatnonzero((rows < 0) & ~dropped)
+        replaced = {int(position): ids[position].decode("utf-8") for position in replaced}
+        rows[dropped] = -1
+        self._saved_ids = ids
+        self._saved_live = rows >= 0
+        positions = np.flatnonzero(rows >= 0)
+        rows = rows[positions]
+        for field in self.fields:
+            codes, values = docstore.metadata_column(field)
+            codes = np.asarray(codes[rows]) if codes is not None else np.full(len(rows), -1, dtype=np.int32)
+            # Group positions by value code; the stable sort keeps each group in position order
+            order = np.argsort(codes, kind="stable")
+            groups = np.split(order, np.flatnonzero(np.diff(codes[order])) + 1)
+            for group in groups:
+                if not len(group):
+                    continue
+                code = int(codes[group[0]])
+                value = values[code] if code >= 0 else ("unknown" if field == "source" else None)
+                if value is not None:
+                    self._extend((field, str(value)), positions[group])
+        # Chunks kept by deduplication also stand for their duplicates' sources
+        codes, values = docstore.metadata_column(DUPLICATE_SOURCES_KEY)
+        if "source" in self.fields and codes is not None:
+            codes = np.asarray(codes[rows])
+            for code in np.unique(codes[codes >= 0]).tolist():
+                for source in values[code]:
+                    self._extend(("source", str(source)), positions[codes == code])
+        return replaced
+
+    @classmethod
+    def build(cls, index_to_docstore_id: Mapping[int, str], docstore, exclude: Iterable[str] = ()) -> "MetadataIndex":
+        """Index every chunk of a vector store except those in ``exclude``."""
+        exclude = set(exclude)
+        index = cls()
+        positions = index_to_docstore_id.items()
+        if isinstance(docstore, ColumnarDocstore) and isinstance(index_to_docstore_id, PositionIds):
+            replaced = index._add_saved(
+                index_to_docstore_id.saved_ids(), index_to_docstore_id.hidden(), docstore, exclude
+            )
+            positions = {**replaced, **index_to_docstore_id.added()}.items()
+        for position, docstore_id in positions:
+            if docstore_id in exclude:
+                continue
+            doc = docstore.search(docstore_id)
+            metadata = getattr(doc, "metadata", None)
+            if metadata is not None:
+                index.add([position], [docstore_id], [metadata])
+        return index
+
+
+def selector(mask: np.ndarray) -> faiss.IDSelector:
+    """Pack a boolean mask into a bitmap ID selector."""
+    return faiss.IDSelectorBitmap(np.packbits(mask, bitorder="little"))
+
+
+def search_parameters(index: faiss.Index, sel: faiss.IDSelector, exhaustive: bool = False) -> faiss.SearchParameters:
+    """Search parameters restricting ``index`` to ``sel``, keeping its query-time knobs.
+
+    With ``exhaustive``, IVF indexes probe every list and HNSW widens its beam,
+    for selective filters whose matches a normal search could miss.
+    """
+    ivf = faiss.try_extract_index_ivf(index)
+    if ivf is not None:
+        return faiss.SearchParametersIVF(sel=sel, nprobe=ivf.nlist if exhaustive else ivf.nprobe)
+    if isinstance(index, faiss.IndexHNSW):
+        ef = index.hnsw.efSearch
+        return faiss.SearchParametersHNSW(sel=sel, efSearch=max(ef, index.ntotal) if exhaustive else ef)
+    return faiss.SearchParameters(sel=sel)
@@ -0,0 +1,123 @@
+import json
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import faiss
+import numpy as np
+from langchain_community.docstore.document import Document
+
+RETRIEVAL_CACHE_MAX_ENTRIES = 4096
+RETRIEVAL_CACHE_THRESHOLD = 0.98  # Minimum cosine similarity between a query and a cached one
+
+SearchResult = List[Tuple[Document, float]]
+CacheKey = Tuple[np.ndarray, str]
+
+
+def normalize(embedding: Sequence[float]) -> np.ndarray:
+    """Return a query embedding as a (1, dim) float32 array with unit norm."""
+    vector = np.array([embedding], dtype=np.float32)
+    faiss.normalize_L2(vector)
+    return vector
+
+
+class RetrievalCache:
+    """Bounded LRU cache of vector store search results.
+
+    A search hits when an earlier search used exactly the same options
+    (``k``, filters, ...) and a query embedding whose cosine similarity with
+    this one is at least ``threshold``. The cached query vectors of each set
+    of options live in a small inner-product FAISS index, as in the agent's
+    semantic answer cache. ``clear`` must be called whenever the index
+    changes; it also bumps a generation counter so a search that started
+    before the change cannot store its now stale result afterwards.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = RETRIEVAL_CACHE_MAX_ENTRIES,
+        threshold: float = RETRIEVAL_CACHE_THRESHOLD,
+    ):
+        self.max_entries = max_entries
+        self.threshold = threshold
+        self._indexes: Dict[str, faiss.IndexIDMap2] = {}
+        self._entries: "OrderedDict[int, Tuple[str, SearchResult, float]]" = OrderedDict()
+        self._next_id = 0
+        self._lock = threading.Lock()
+        self.generation = 0
+        self.hits = 0
+        self.misses = 0
+        self.seconds_saved = 0.0
+
+    def key(self, embedding: Sequence[float], **options: Any) -> CacheKey:
+        """Build the cache key of a search: the unit query vector and its options."""
+        return normalize(embedding), json.dumps(options, sort_keys=True, default=str)
+
+    def get(self, key: CacheKey) -> Optional[SearchResult]:
+        """Return the cached result of a near-identical search, or None on a miss."""
+        vector, namespace = key
+        with self._lock:
+            index = self._indexes.get(namespace)
+            if index is not None:
+                scores, ids = index.search(vector, 1)
+                if ids[0][0] >= 0 and scores[0][0] >= self.threshold:
+                    entry_id = int(ids[0][0])
+                    self._entries.move_to_end(entry_id)
+                    self.hits += 1
+                    _, results, seconds = self._entries[entry_id]
+                    self.seconds_saved += seconds
+                    return list(results)
+            self.misses += 1
+            return None
+
+    def put(self, key: CacheKey, results: SearchResult, seconds: float, generation: int) -> None:
+        """Cache a search result that took ``seconds`` to compute.
+
+        Args:
+            key: Key from ``key``.
+            results: The search result.
+            seconds: Time the search took, credited to ``seconds_saved`` on hits.
+            generation: ``generation`` read before the search started.
+        """
+        vector, namespace = key
+        with self._lock:
+            if generation != self.generation:
+                return
+            index = self._indexes.get(namespace)
+            if index is None:
+                index = self._indexes[namespace] = faiss.IndexIDMap2(faiss.IndexFlatIP(vector.shape[1]))
+
+            entry_id = self._next_id
+            self._next_id += 1
+            index.add_with_ids(vector, np.asarray([entry_id], dtype=np.int64))
+            self._entries[entry_id] = (namespace, list(results), seconds)
+
+            while len(self._entries) > self.max_entries:
+                self._remove(next(iter(self._entries)))
+
+    def _remove(self, entry_id: int) -> None:
+        """Drop an entry from the map and its index. Caller must hold the lock."""
+        namespace, _, _ = self._entries.pop(entry_id)
+        index = self._indexes[namespace]
+        index.remove_ids(np.asarray([entry_id], dtype=np.int64))
+        if index.ntotal == 0:
+            del self._indexes[namespace]
+
+    def clear(self) -> None:
+        """Drop every cached result, e.g. after the index changed."""
+        with self._lock:
+            self._indexes.clear()
+            self._entries.clear()
+            self.generation += 1
+
+    def stats(self) -> Dict[str, Any]:
+        """Return hit/miss counters, current size and search time saved."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "seconds_saved": round(self.seconds_saved, 4),
+            }
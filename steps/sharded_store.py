@@ -0,0 +1,484 @@
+import heapq
+import json
+import math
+import os
+import queue
+import threading
+import time
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from itertools import chain, islice
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from langchain_community.docstore.document import Document
+from langchain_core.embeddings import Embeddings
+from langchain_core.vectorstores import VectorStore
+
+from materializers.faiss_materializer import save_vector_store
+from steps.ann_index import IndexSpec
+from steps.metadata_index import Filters, pop_filters
+from steps.retrieval_cache import RetrievalCache
+from steps.sparse_index import tokenize
+from steps.vector_store import (
+    HYBRID_CANDIDATE_FACTOR,
+    STREAM_BATCH_SIZE,
+    AWSVectorStore,
+    fuse_candidates,
+    rrf_relevance_score_fn,
+)
+
+MANIFEST_FILENAME = "manifest.json"
+MANIFEST_VERSION = 1
+SHARD_STRATEGIES = ("hash", "category")
+SHARD_SEARCH_WORKERS = int(os.getenv("SHARD_SEARCH_WORKERS", "8"))
+SHARD_QUEUE_SIZE = 2 * STREAM_BATCH_SIZE  # Chunks buffered per shard while building
+
+# FAISS releases the GIL while searching, so shards are searched on threads
+_shard_search_pool = ThreadPoolExecutor(max_workers=SHARD_SEARCH_WORKERS, thread_name_prefix="shard-search")
+
+_END = object()
+
+
+def shard_key(doc: Document, shard_by: str) -> str:
+    """Return the metadata value that decides a chunk's shard."""
+    field = "category" if shard_by == "category" else "source"
+    return str(doc.metadata.get(field, "unknown"))
+
+
+def shard_for_key(key: str, num_shards: int) -> int:
+    """Map a shard key to a shard id with a hash that is stable across processes."""
+    return zlib.crc32(key.encode("utf-8")) % num_shards
+
+
+def shard_dirname(shard_id: int) -> str:
+    return f"shard-{shard_id:03d}"
+
+
+class ShardedVectorStore(VectorStore):
+    """Knowledge base split across several independent ``AWSVectorStore`` shards.
+
+    Chunks are assigned to one of ``num_shards`` shards by a hash of their
+    source (``shard_by="hash"``, so a source's chunks stay together) or of
+    their category (``shard_by="category"``, so category-filtered queries
+    only search the shards holding those categories). A query is embedded
+    once, searched on every shard concurrently, and the per-shard top ``k``
+    lists are merged with a heap; hybrid candidates are merged the same way
+    and fused once, so RRF ranks are global rather than per shard.
+
+    Shards are built in parallel, persisted next to a JSON manifest, and can
+    be rebuilt one at a time while the others keep serving.
+    """
+
+    def __init__(
+        self,
+        embedding: Embeddings,
+        shards: Dict[int, AWSVectorStore],
+        num_shards: int,
+        shard_by: str = "hash",
+        index_spec: Optional[IndexSpec] = None,
+    ):
+        if shard_by not in SHARD_STRATEGIES:
+            raise ValueError(f"Unknown shard strategy '{shard_by}'; expected one of {', '.join(SHARD_STRATEGIES)}")
+        self.embedding = embedding
+        # Replaced, never modified in place, so searches can read it without a lock
+        self.shards = dict(shards)
+        self.num_shards = num_shards
+        self.shard_by = shard_by
+        self.index_spec = index_spec or IndexSpec()
+        self.retrieval_cache: Optional[RetrievalCache] = None
+        self._mutation_lock = threading.Lock()
+
+    @property
+    def embeddings(self) -> Embeddings:
+        return self.embedding
+
+    @property
+    def ntotal(self) -> int:
+        """Number of vectors across all shards, including deleted ones not yet compacted."""
+        return sum(shard.index.ntotal for shard in self.shards.values())
+
+    def shard_for(self, doc: Document) -> int:
+        return shard_for_key(shard_key(doc, self.shard_by), self.num_shards)
+
+    # Building
+
+    @classmethod
+    def from_chunk_stream(
+        cls,
+        chunks: Iterable[Document],
+        embedding: Embeddings,
+        index_spec: Optional[IndexSpec] = None,
+        num_shards: int = 2,
+        shard_by: str = "hash",
+        batch_size: int = STREAM_BATCH_SIZE,
+        num_chunks: Optional[int] = None,
+    ) -> "ShardedVectorStore":
+        """Build the shards in parallel from one stream of chunks.
+
+        The stream is routed into a bounded queue per shard, each drained by
+        its own builder thread, so memory stays bounded and a slow shard only
+        stalls the stream once its queue is full.
+
+        Args:
+            chunks: Chunks to index, e.g. a lazy text splitter output.
+            embedding: Embedding model for the chunks and later queries.
+            index_spec: Index type and parameters of every shard.
+            num_shards: Number of shards; shards that get no chunks are left out.
+            shard_by: ``"hash"`` (by source) or ``"category"``.
+            batch_size: Chunks embedded per call to the embedding model.
+            num_chunks: Expected number of chunks, if known; each shard's index
+                is sized for an even share of them.
+
+        Returns:
+            The populated sharded store.
+        """
+        if shard_by not in SHARD_STRATEGIES:
+            raise ValueError(f"Unknown shard strategy '{shard_by}'; expected one of {', '.join(SHARD_STRATEGIES)}")
+        index_spec = index_spec or IndexSpec()
+        shard_chunks = math.ceil(num_chunks / num_shards) if num_chunks is not None else None
+        queues = [queue.Queue(maxsize=SHARD_QUEUE_SIZE) for _ in range(num_shards)]
+
+        def build(shard_id: int) -> Optional[AWSVectorStore]:
+            stream = _drain(queues[shard_id])
+            try:
+                first = next(stream, None)
+                if first is None:
+                    return None
+                started = time.perf_counter()
+                shard = AWSVectorStore.from_chunk_stream(
+                    chain([first], stream), embedding, index_spec, batch_size, shard_chunks
+                )
+                print(
+                    f"[INFO] Built shard {shard_id} with {shard.index.ntotal} chunks "
+                    f"in {time.perf_counter() - started:.2f}s"
+                )
+                return shard
+            finally:
+                # Keep consuming after a failure so the router never blocks on this queue
+                for _ in stream:
+                    pass
+
+        with ThreadPoolExecutor(max_workers=num_shards, thread_name_prefix="shard-build") as pool:
+            futures = [pool.submit(build, shard_id) for shard_id in range(num_shards)]
+            try:
+                for chunk in chunks:
+                    queues[shard_for_key(shard_key(chunk, shard_by), num_shards)].put(chunk)
+            finally:
+                for shard_queue in queues:
+                    shard_queue.put(_END)
+            shards = {shard_id: future.result() for shard_id, future in enumerate(futures)}
+
+        shards = {shard_id: shard for shard_id, shard in shards.items() if shard is not None}
+        if not shards:
+            raise ValueError("Cannot build a vector store without any chunks")
+        return cls(embedding, shards, num_shards, shard_by, index_spec)
+
+    def rebuild_shard(
+        self,
+        shard_id: int,
+        embeddings: Optional[Embeddings] = None,
+        index_spec: Optional[IndexSpec] = None,
+        folder_path: Optional[str] = None,
+    ) -> AWSVectorStore:
+        """Re-index one shard from its live chunks and swap it in.
+
+        Other shards keep serving throughout, and the old shard serves until the
+        new one is ready. Chunk ids are kept, so the shard's tombstones and
+        fragmentation are gone afterwards but results are otherwise unchanged.
+
+        Args:
+            shard_id: Shard to rebuild.
+            embeddings: Model to embed the chunks with, e.g. one backed by the
+                embedding cache; defaults to the store's model.
+            index_spec: New index type and parameters; defaults to the store's.
+            folder_path: If given, persist the rebuilt shard and manifest there.
+
+        Returns:
+            The new shard.
+        """
+        with self._mutation_lock:
+            chunks = self.shards[shard_id].live_documents()
+            shard = AWSVectorStore.from_chunk_stream(
+                chunks,
+                embeddings or self.embedding,
+                index_spec or self.index_spec,
+                num_chunks=len(chunks),
+            )
+            self.shards = {**self.shards, shard_id: shard}
+            self._invalidate_retrievals()
+            if folder_path is not None:
+                save_vector_store(shard, os.path.join(folder_path, shard_dirname(shard_id)))
+                self._write_manifest(folder_path)
+        print(f"[INFO] Rebuilt shard {shard_id} with {shard.index.ntotal} chunks")
+        return shard
+
+    def configure_search(self, index_spec: IndexSpec) -> None:
+        """Apply the spec's query-time knobs to every shard."""
+        self.index_spec = self.index_spec.model_copy(
+            update=index_spec.model_dump(exclude=set(self.index_spec.build_params()))
+        )
+        for shard in self.shards.values():
+            shard.configure_search(index_spec)
+        self._invalidate_retrievals()
+
+    def _invalidate_retrievals(self) -> None:
+        if self.retrieval_cache is not None:
+            self.retrieval_cache.clear()
+
+    # Search
+
+    def similarity_search(self, query: str, k: int = 4, **kwargs: Any) -> List[Document]:
+        return [doc for doc, _ in self.similarity_search_with_score(query, k=k, **kwargs)]
+
+    def similarity_search_with_score(
+        self,
+        query: str,
+        k: int = 4,
+        filter: Optional[Any] = None,
+        fetch_k: int = 20,
+        **kwargs: Any,
+    ) -> List[Tuple[Document, float]]:
+        filters = pop_filters(kwargs)
+        embedding = self.embedding.embed_query(query)
+        cache = self.retrieval_cache
+        # Callable filters have no stable cache key
+        if cache is None or callable(filter):
+            return self._scatter_gather(query, embedding, k, filter, fetch_k, filters, **kwargs)
+
+        generation = cache.generation
+        # Sparse scores depend on the query's terms, so hybrid searches also key on those
+        hybrid = any(shard.hybrid_enabled for shard in self.shards.values())
+        sparse_query = sorted(set(tokenize(query))) if hybrid else None
+        key = cache.key(
+            embedding, k=k, filter=filter, fetch_k=fetch_k, filters=filters, sparse_query=sparse_query, **kwargs
+        )
+        cached = cache.get(key)
+        if cached is not None:
+            return cached
+        started = time.perf_counter()
+        results = self._scatter_gather(query, embedding, k, filter, fetch_k, filters, **kwargs)
+        cache.put(key, results, time.perf_counter() - started, generation)
+        return results
+
+    def _select_relevance_score_fn(self) -> Callable[[float], float]:
+        """Map hybrid RRF scores, or dense distances, onto relevance in [0, 1]."""
+        shards = list(self.shards.values())
+        if all(shard.hybrid_enabled for shard in shards):
+            return rrf_relevance_score_fn(shards[0].rrf_k)
+        return shards[0]._select_relevance_score_fn()
+
+    def _route(self, filters: Optional[Filters]) -> List[AWSVectorStore]:
+        """Return the shards that can hold chunks matching ``filters``."""
+        shards = self.shards
+        if self.shard_by == "category" and filters and "category" in filters:
+            wanted = {shard_for_key(category, self.num_shards) for category in filters["category"]}
+            return [shard for shard_id, shard in shards.items() if shard_id in wanted]
+        return list(shards.values())
+
+    def _scatter_gather(
+        self,
+        query: str,
+        embedding: List[float],
+        k: int,
+        filter: Optional[Any],
+        fetch_k: int,
+        filters: Optional[Filters],
+        **kwargs: Any,
+    ) -> List[Tuple[Document, float]]:
+        """Search the shards concurrently and merge their sorted top ``k`` lists.
+
+        RRF scores only reflect ranks within one shard, so for hybrid search
+        the shards return their dense and BM25 candidates instead; those are
+        merged by distance and BM25 score and fused once across all shards.
+        """
+        shards = self._route(filters)
+        if not shards:
+            return []
+        if all(shard.hybrid_enabled for shard in shards):
+            score_threshold = kwargs.pop("score_threshold", None)
+            candidates = k * HYBRID_CANDIDATE_FACTOR
+            futures = [
+                _shard_search_pool.submit(
+                    shard.hybrid_candidates, query, embedding, candidates, filter, fetch_k, filters, **kwargs
+                )
+                for shard in shards
+            ]
+            results = [future.result() for future in futures]
+            dense = _merge_hits([hits for hits, _ in results], shards[0].dense_higher_is_better, candidates)
+            sparse = _merge_hits([hits for _, hits in results], True, candidates)
+            return fuse_candidates(dense, sparse, k, shards[0].rrf_k, score_threshold)
+
+        futures = [
+            _shard_search_pool.submit(
+                shard.search_with_embedding, query, embedding, k, filter, fetch_k, filters=filters, **kwargs
+            )
+            for shard in shards
+        ]
+        return _merge_hits([future.result() for future in futures], shards[0].higher_is_better, k)
+
+    # Mutation
+
+    def add_texts(
+        self,
+        texts: Iterable[str],
+        metadatas: Optional[List[dict]] = None,
+        **kwargs: Any,
+    ) -> List[str]:
+        texts = list(texts)
+        metadatas = metadatas or [{} for _ in texts]
+        chunks = [Document(page_content=text, metadata=metadata) for text, metadata in zip(texts, metadatas)]
+        ids = []
+        with self._mutation_lock:
+            for shard_id, shard_chunks in self._group_by_shard(chunks).items():
+                shard = self.shards.get(shard_id)
+                if shard is None:
+                    shard = self._create_shard(shard_id, shard_chunks)
+                    ids.extend(shard.index_to_docstore_id.values())
+                else:
+                    ids.extend(shard.add_documents(shard_chunks))
+            self._invalidate_retrievals()
+        return ids
+
+    def _group_by_shard(self, chunks: Iterable[Document]) -> Dict[int, List[Document]]:
+        groups: Dict[int, List[Document]] = {}
+        for chunk in chunks:
+            groups.setdefault(self.shard_for(chunk), []).append(chunk)
+        return groups
+
+    def _create_shard(self, shard_id: int, chunks: List[Document]) -> AWSVectorStore:
+        """Build a shard that had no chunks yet. Caller holds the mutation lock."""
+        shard = AWSVectorStore.from_chunk_stream(chunks, self.embedding, self.index_spec)
+        self.shards = {**self.shards, shard_id: shard}
+        return shard
+
+    def upsert_source_chunks(self, source: str, chunks: List[Document]) -> Dict[str, int]:
+        """Replace the chunks of one source in whichever shards hold or receive them.
+
+        Args:
+            source: The ``metadata["source"]`` value the chunks belong to.
+            chunks: The complete new set of chunks for that source.
+
+        Returns:
+            Counts of added, unchanged and removed chunks.
+        """
+        totals = {"added": 0, "unchanged": 0, "removed": 0}
+        with self._mutation_lock:
+            groups = self._group_by_shard(chunks)
+            for shard_id in sorted(set(groups) | set(self.shards)):
+                shard = self.shards.get(shard_id)
+                if shard is None:
+                    self._create_shard(shard_id, groups[shard_id])
+                    totals["added"] += len(groups[shard_id])
+                    continue
+                counts = shard.upsert_source_chunks(source, groups.get(shard_id, []))
+                for name, count in counts.items():
+                    totals[name] += count
+            self._invalidate_retrievals()
+        return totals
+
+    def delete_source(self, source: str) -> int:
+        """Remove every chunk of a source from all shards.
+
+        Returns:
+            Number of chunks removed (0 if the source is unknown).
+        """
+        with self._mutation_lock:
+            removed = sum(shard.delete_source(source) for shard in self.shards.values())
+            self._invalidate_retrievals()
+        return removed
+
+    def sources(self) -> List[str]:
+        """Return the sources currently in the knowledge base."""
+        return sorted({source for shard in self.shards.values() for source in shard.sources()})
+
+    # Persistence
+
+    def save_local(self, folder_path: str) -> None:
+        """Save every shard in its own directory, plus the shard manifest."""
+        os.makedirs(folder_path, exist_ok=True)
+        with self._mutation_lock:
+            for shard_id, shard in self.shards.items():
+                shard_path = os.path.join(folder_path, shard_dirname(shard_id))
+                os.makedirs(shard_path, exist_ok=True)
+                shard.save_local(shard_path)
+            self._write_manifest(folder_path)
+
+    def _write_manifest(self, folder_path: str) -> None:
+        """Atomically write the manifest describing the shard layout. Caller holds the mutation lock."""
+        manifest = {
+            "version": MANIFEST_VERSION,
+            "num_shards": self.num_shards,
+            "shard_by": self.shard_by,
+            "index_spec": self.index_spec.model_dump(),
+            "shards": [
+                {
+                    "id": shard_id,
+                    "path": shard_dirname(shard_id),
+                    "chunks": shard.index.ntotal,
+                    "sources": len(shard.sources()),
+                }
+                for shard_id, shard in sorted(self.shards.items())
+            ],
+        }
+        tmp_path = os.path.join(folder_path, f".{MANIFEST_FILENAME}.tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(manifest, f, indent=2)
+        os.replace(tmp_path, os.path.join(folder_path, MANIFEST_FILENAME))
+
+    @classmethod
+    def load_local(cls, folder_path: str, embeddings: Embeddings, **kwargs: Any) -> "ShardedVectorStore":
+        """Load the shards listed in a manifest, in parallel."""
+        with open(os.path.join(folder_path, MANIFEST_FILENAME), encoding="utf-8") as f:
+            manifest = json.load(f)
+        if manifest.get("version") != MANIFEST_VERSION:
+            raise ValueError(f"Unsupported shard manifest version {manifest.get('version')}")
+
+        def load(entry: Dict[str, Any]) -> AWSVectorStore:
+            return AWSVectorStore.load_local(
+                os.path.join(folder_path, entry["path"]),
+                embeddings=embeddings,
+                **kwargs,
+            )
+
+        entries = manifest["shards"]
+        with ThreadPoolExecutor(max_workers=max(1, len(entries)), thread_name_prefix="shard-load") as pool:
+            shards = dict(zip((entry["id"] for entry in entries), pool.map(load, entries)))
+        return cls(
+            embeddings,
+            shards,
+            manifest["num_shards"],
+            manifest["shard_by"],
+            IndexSpec(**manifest["index_spec"]),
+        )
+
+    @classmethod
+    def from_texts(
+        cls,
+        texts: List[str],
+        embedding: Embeddings,
+        metadatas: Optional[List[dict]] = None,
+        **kwargs: Any,
+    ) -> "ShardedVectorStore":
+        metadatas = metadatas or [{} for _ in texts]
+        chunks = [Document(page_content=text, metadata=metadata) for text, metadata in zip(texts, metadatas)]
+        return cls.from_chunk_stream(chunks, embedding, num_chunks=len(chunks), **kwargs)
+
+
+def is_sharded(folder_path: str) -> bool:
+    """Whether a persisted vector store directory holds a sharded store."""
+    return os.path.exists(os.path.join(folder_path, MANIFEST_FILENAME))
+
+
+def _merge_hits(
+    results: List[List[Tuple[Document, float]]],
+    higher_is_better: bool,
+    k: int,
+) -> List[Tuple[Document, float]]:
+    """Merge per-shard hit lists, each sorted best first, into the overall top ``k``."""
+    merged = heapq.merge(*results, key=lambda hit: hit[1], reverse=higher_is_better)
+    return list(islice(merged, k))
+
+
+def _drain(shard_queue: queue.Queue) -> Iterator[Document]:
+    while (chunk := shard_queue.get()) is not _END:
+        yield chunk
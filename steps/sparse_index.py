@@ -0,0 +1,335 @@
+import json
+import math
+import os
+import re
+import threading
+from array import array
+from collections import Counter
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from steps.columnar_docstore import id_array, load_array, save_array
+
+BM25_FORMAT_VERSION = 2
+BM25_META_FILENAME = "bm25.json"
+BM25_TERMS_FILENAME = "bm25_terms.npy"
+BM25_OFFSETS_FILENAME = "bm25_offsets.npy"
+BM25_POSTINGS_FILENAME = "bm25_postings.npy"
+BM25_TFS_FILENAME = "bm25_tfs.npy"
+BM25_IDS_FILENAME = "bm25_ids.npy"
+BM25_LENGTHS_FILENAME = "bm25_lengths.npy"
+BM25_VECTOR_POSITIONS_FILENAME = "bm25_vector_positions.npy"
+
+# Keeps AWS identifiers such as "t3.medium", "s3:GetObject" or "us-east-1" whole
+_TOKEN_RE = re.compile(r"[a-z0-9]+(?:[._:/-][a-z0-9]+)*")
+_PART_RE = re.compile(r"[a-z0-9]+")
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercase and split text into terms.
+
+    Compound identifiers are indexed whole and as their parts, so both
+    ``"t3.medium"`` and ``"medium"`` match a chunk mentioning ``t3.medium``.
+    """
+    terms = []
+    for token in _TOKEN_RE.findall(text.lower()):
+        terms.append(token)
+        parts = _PART_RE.findall(token)
+        if len(parts) > 1:
+            terms.extend(parts)
+    return terms
+
+
+class BM25Index:
+    """Okapi BM25 inverted index over chunks identified by docstore id.
+
+    Every term has a posting list of (document, term frequency) pairs, and
+    IDFs are computed for the query's terms only, so a query touches just the
+    posting lists of its own terms.
+
+    Documents can carry the position of their vector in the FAISS index, so
+    searches can be restricted by a boolean mask over those positions, such as
+    the one ``MetadataIndex.mask`` returns for metadata filters.
+
+    A loaded index keeps its terms, postings and ids memory mapped and looks
+    terms up by binary search; documents added after loading are held in
+    memory until the next save.
+    """
+
+    def __init__(self, k1: float = 1.5, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self._lock = threading.Lock()
+        # Saved documents occupy the first positions; their postings stay on disk
+        self._saved_ids = np.empty(0, dtype="S1")
+        self._saved_terms = np.empty(0, dtype="S1")
+        self._saved_offsets = np.zeros(1, dtype=np.int64)
+        self._saved_postings = np.empty(0, dtype=np.int32)
+        self._saved_tfs = np.empty(0, dtype=np.float32)
+        self._added_ids: List[str] = []
+        self._doc_positions: Dict[str, int] = {}  # Only documents added since loading
+        self._doc_lengths = array("f")
+        self._vector_positions = array("q")
+        self._postings: Dict[str, Tuple[array, array]] = {}
+        self._deleted = bytearray()  # One flag per position, read as a numpy bool array
+        self._num_deleted = 0
+        self._avg_length = 0.0
+        self._dirty = True
+
+    def __len__(self) -> int:
+        return len(self._deleted) - self._num_deleted
+
+    def _delete(self, position: int) -> None:
+        """Mark a position deleted. Caller holds the lock."""
+        if not self._deleted[position]:
+            self._deleted[position] = 1
+            self._num_deleted += 1
+
+    def _doc_id(self, position: int) -> str:
+        if position < len(self._saved_ids):
+            return self._saved_ids[position].decode("utf-8")
+        return self._added_ids[position - len(self._saved_ids)]
+
+    def _delete_saved(self, docstore_ids: List[str]) -> None:
+        """Delete saved documents by id. Caller holds the lock."""
+        if not docstore_ids or not len(self._saved_ids):
+            return
+        for position in np.flatnonzero(np.isin(self._saved_ids, id_array(docstore_ids))).tolist():
+            self._delete(position)
+
+    def add(
+        self,
+        docstore_ids: Iterable[str],
+        texts: Iterable[str],
+        vector_positions: Optional[Iterable[int]] = None,
+    ) -> None:
+        """Index chunks. Re-adding a docstore id replaces its previous text.
+
+        Args:
+            docstore_ids: Ids of the chunks.
+            texts: Text of each chunk.
+            vector_positions: FAISS position of each chunk's vector, needed to
+                search with a ``mask``.
+        """
+        docstore_ids = list(docstore_ids)
+        if vector_positions is None:
+            vector_positions = [-1] * len(docstore_ids)
+        with self._lock:
+            self._delete_saved(docstore_ids)
+            for docstore_id, text, vector_position in zip(docstore_ids, texts, vector_positions):
+                if docstore_id in self._doc_positions:
+                    self._delete(self._doc_positions[docstore_id])
+                position = len(self._deleted)
+                self._added_ids.append(docstore_id)
+                self._doc_positions[docstore_id] = position
+                self._deleted.append(0)
+                self._vector_positions.append(vector_position)
+                terms = Counter(tokenize(text))
+                self._doc_lengths.append(sum(terms.values()))
+                for term, tf in terms.items():
+                    postings = self._postings.get(term)
+                    if postings is None:
+                        postings = self._postings[term] = (array("i"), array("f"))
+                    postings[0].append(position)
+                    postings[1].append(tf)
+            self._dirty = True
+
+    def remove(self, docstore_ids: Iterable[str]) -> None:
+        """Stop returning the given chunks."""
+        with self._lock:
+            unresolved = []
+            for docstore_id in docstore_ids:
+                position = self._doc_positions.pop(docstore_id, None)
+                if position is not None:
+                    self._delete(position)
+                else:
+                    unresolved.append(docstore_id)
+            self._delete_saved(unresolved)
+            self._dirty = True
+
+    def renumber(self, new_positions: np.ndarray) -> None:
+        """Move documents to new vector positions after the FAISS index was compacted.
+
+        Args:
+            new_positions: New position of each old position, -1 for removed vectors.
+        """
+        with self._lock:
+            old = np.frombuffer(self._vector_positions, dtype=np.int64)
+            renumbered = np.where(old >= 0, new_positions[np.maximum(old, 0)], -1)
+            self._vector_positions = array("q", renumbered.tobytes())
+
+    def _refresh(self) -> None:
+        """Recompute the average document length after changes. Caller holds the lock."""
+        if not self._dirty:
+            return
+        lengths = np.frombuffer(self._doc_lengths, dtype=np.float32)
+        if self._num_deleted:
+            lengths = lengths[~np.frombuffer(self._deleted, dtype=bool)]
+        live = len(self)
+        self._avg_length = float(np.sum(lengths)) / live if live else 0.0
+        self._dirty = False
+
+    def _term_postings(self, term: str) -> Tuple[np.ndarray, np.ndarray]:
+        """Return a term's document positions and term frequencies. Caller holds the lock."""
+        positions, tfs = [], []
+        key = term.encode("utf-8")
+        i = int(np.searchsorted(self._saved_terms, key))
+        if i < len(self._saved_terms) and self._saved_terms[i] == key:
+            start, end = self._saved_offsets[i], self._saved_offsets[i + 1]
+            positions.append(self._saved_postings[start:end])
+            tfs.append(self._saved_tfs[start:end])
+        postings = self._postings.get(term)
+        if postings is not None:
+            positions.append(np.frombuffer(postings[0], dtype=np.int32))
+            tfs.append(np.frombuffer(postings[1], dtype=np.float32))
+        if len(positions) == 1:
+            return positions[0], tfs[0]
+        if not positions:
+            return np.empty(0, dtype=np.int32), np.empty(0, dtype=np.float32)
+        return np.concatenate(positions), np.concatenate(tfs)
+
+    def search(
+        self,
+        query: str,
+        k: int,
+        mask: Optional[np.ndarray] = None,
+    ) -> List[Tuple[str, float]]:
+        """Return the ``k`` best matching docstore ids with their BM25 scores.
+
+        With ``mask``, a boolean array over vector positions, only documents
+        whose vector position it selects are ranked.
+        """
+        with self._lock:
+            self._refresh()
+            if not self._avg_length:
+                return []
+            lengths = np.frombuffer(self._doc_lengths, dtype=np.float32)
+            live = len(self)
+
+            doc_parts, score_parts = [], []
+            for term in set(tokenize(query)):
+                positions, tf = self._term_postings(term)
+                if not len(positions):
+                    continue
+                idf = math.log(1 + (live - len(positions) + 0.5) / (len(positions) + 0.5))
+                norm = self.k1 * (1 - self.b + self.b * lengths[positions] / self._avg_length)
+                doc_parts.append(positions)
+                score_parts.append(idf * tf * (self.k1 + 1) / (tf + norm))
+            if not doc_parts:
+                return []
+
+            positions, inverse = np.unique(np.concatenate(doc_parts), return_inverse=True)
+            scores = np.bincount(inverse, weights=np.concatenate(score_parts))
+            if self._num_deleted:
+                live = ~np.frombuffer(self._deleted, dtype=bool)[positions]
+                positions, scores = positions[live], scores[live]
+            if mask is not None:
+                vector_positions = np.frombuffer(self._vector_positions, dtype=np.int64)[positions]
+                keep = (vector_positions >= 0) & (vector_positions < len(mask))
+                keep[keep] = mask[vector_positions[keep]]
+                positions, scores = positions[keep], scores[keep]
+
+            top = np.argsort(-scores)[:k] if len(scores) <= k else np.argpartition(-scores, k)[:k]
+            top = top[np.argsort(-scores[top])]
+            return [(self._doc_id(int(positions[i])), float(scores[i])) for i in top]
+
+    def save(self, folder_path: str) -> None:
+        """Write the live postings to ``folder_path`` as memory-mappable arrays.
+
+        Postings are stored sorted by term, so a loaded index finds a term by
+        binary search without building a dictionary.
+        """
+        with self._lock:
+            deleted = np.frombuffer(self._deleted, dtype=bool)
+            live = np.flatnonzero(~deleted)
+            remap = np.full(len(deleted), -1, dtype=np.int64)
+            remap[live] = np.arange(len(live), dtype=np.int64)
+
+            added_terms = list(self._postings)
+            encoded_terms = np.array([term.encode("utf-8") for term in added_terms], dtype=bytes)
+            terms = np.unique(np.concatenate([self._saved_terms, encoded_terms]))
+            added_counts = [len(self._postings[term][0]) for term in added_terms]
+            term_index = np.concatenate([
+                np.repeat(np.searchsorted(terms, self._saved_terms), np.diff(self._saved_offsets)),
+                np.repeat(np.searchsorted(terms, encoded_terms), added_counts),
+            ]).astype(np.int64)
+            positions = np.concatenate(
+                [self._saved_postings] + [np.frombuffer(self._postings[term][0], dtype=np.int32) for term in added_terms]
+            ).astype(np.int64)
+            tfs = np.concatenate(
+                [self._saved_tfs] + [np.frombuffer(self._postings[term][1], dtype=np.float32) for term in added_terms]
+            ).astype(np.float32)
+
+            keep = ~deleted[positions]
+            term_index, positions, tfs = term_index[keep], remap[positions[keep]], tfs[keep]
+            order = np.lexsort((positions, term_index))
+            counts = np.bincount(term_index, minlength=len(terms))
+            present = counts > 0
+            offsets = np.concatenate([[0], np.cumsum(counts[present])]).astype(np.int64)
+
+            ids = np.concatenate([self._saved_ids, id_array(self._added_ids)]) if self._added_ids else self._saved_ids
+            save_array(folder_path, BM25_TERMS_FILENAME, terms[present])
+            save_array(folder_path, BM25_OFFSETS_FILENAME, offsets)
+            save_array(folder_path, BM25_POSTINGS_FILENAME, positions[order].astype(np.int32))
+            save_array(folder_path, BM25_TFS_FILENAME, tfs[order])
+            save_array(folder_path, BM25_IDS_FILENAME, ids[live])
+            save_array(folder_path, BM25_LENGTHS_FILENAME, np.frombuffer(self._doc_lengths, dtype=np.float32)[live])
+            save_array(
+                folder_path,
+                BM25_VECTOR_POSITIONS_FILENAME,
+                np.frombuffer(self._vector_positions, dtype=np.int64)[live],
+            )
+            # Written last: its presence marks a complete index
+            tmp_path = os.path.join(folder_path, f".{BM25_META_FILENAME}.tmp")
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump({"version": BM25_FORMAT_VERSION, "k1": self.k1, "b": self.b}, f)
+            os.replace(tmp_path, os.path.join(folder_path, BM25_META_FILENAME))
+
+    @classmethod
+    def load(cls, folder_path: str) -> Optional["BM25Index"]:
+        """Memory map an index saved with ``save``, or return None if there is none.
+
+        Indexes saved in an older format count as none, so the caller rebuilds them.
+        """
+        meta_path = os.path.join(folder_path, BM25_META_FILENAME)
+        if not os.path.exists(meta_path):
+            return None
+        with open(meta_path, encoding="utf-8") as f:
+            meta = json.load(f)
+        if meta.get("version") != BM25_FORMAT_VERSION:
+            return None
+
+        def load(filename: str) -> np.ndarray:
+            return load_array(os.path.join(folder_path, filename))
+
+        index = cls(k1=meta["k1"], b=meta["b"])
+        index._saved_terms = load(BM25_TERMS_FILENAME)
+        index._saved_offsets = load(BM25_OFFSETS_FILENAME)
+        index._saved_postings = load(BM25_POSTINGS_FILENAME)
+        index._saved_tfs = load(BM25_TFS_FILENAME)
+        index._saved_ids = load(BM25_IDS_FILENAME)
+        # Per-document columns are small and change with the index, so they are copied
+        index._doc_lengths = array("f", np.ascontiguousarray(load(BM25_LENGTHS_FILENAME), dtype=np.float32).tobytes())
+        index._vector_positions = array(
+            "q", np.ascontiguousarray(load(BM25_VECTOR_POSITIONS_FILENAME), dtype=np.int64).tobytes()
+        )
+        index._deleted = bytearray(len(index._saved_ids))
+        return index
+
+
+def reciprocal_rank_fusion(rankings: List[List[str]], k: int = 60) -> List[Tuple[str, float]]:
+    """Fuse ranked id lists by summing ``1 / (k + rank)`` per id.
+
+    Args:
+        rankings: Ranked lists of ids, best first.
+        k: RRF constant; larger values flatten the contribution of top ranks.
+
+    Returns:
+        Ids with fused scores, best first.
+    """
+    scores: Dict[str, float] = {}
+    for ranking in rankings:
+        for rank, item in enumerate(ranking, start=1):
+            scores[item] = scores.get(item, 0.0) + 1.0 / (k + rank)
+    return sorted(scores.items(), key=lambda item: item[1], reverse=True)
@@ -0,0 +1,146 @@
+import os
+from typing import Iterable, List, Optional, Tuple
+
+import requests
+from langchain_community.docstore.document import Document
+from langchain_core.embeddings import Embeddings
+from langchain_core.vectorstores import VectorStore
+
+from steps.ann_index import IndexSpec
+from steps.deduplication import DEDUP_THRESHOLD, ChunkDeduplicator
+from steps.embedding_cache import CachedEmbeddings, EmbeddingCache
+from steps.embedding_engine import EMBEDDING_BATCH_SIZE, EMBEDDING_WORKERS, BatchedEmbeddings
+from steps.embeddings import get_embeddings
+from steps.index_generator import CHUNK_OVERLAP, CHUNK_SIZE, finalize_vector_store, get_text_splitter
+from steps.sharded_store import ShardedVectorStore
+from steps.streaming_pipeline import PIPELINE_LOG_INTERVAL, PIPELINE_QUEUE_SIZE, Stage, StreamingPipeline
+from steps.vector_store import STREAM_BATCH_SIZE, AWSVectorStore
+
+INGEST_STREAMING = os.getenv("INGEST_STREAMING", "false").lower() in ("1", "true", "yes")
+INGEST_FETCH_WORKERS = int(os.getenv("INGEST_FETCH_WORKERS", "8"))
+INGEST_EXTRACT_WORKERS = int(os.getenv("INGEST_EXTRACT_WORKERS", "2"))
+FETCH_TIMEOUT = 30  # Seconds per page request
+
+
+def fetch_page(url: str) -> List[Tuple[str, str]]:
+    """Download one page, returning ``[(url, html)]`` or nothing if it cannot be fetched."""
+    try:
+        response = requests.get(url, timeout=FETCH_TIMEOUT, headers={"User-Agent": "aws-support-agent-ingest"})
+        response.raise_for_status()
+    except requests.RequestException as e:
+        print(f"[ERROR] Fetching {url} failed: {e}")
+        return []
+    return [(url, response.text)]
+
+
+def extract_text(page: Tuple[str, str]) -> List[Document]:
+    """Turn a downloaded page into a document with its visible text.
+
+    Uses ``unstructured`` (as ``web_url_loader`` does) when it is installed,
+    and BeautifulSoup otherwise.
+    """
+    url, html = page
+    try:
+        from unstructured.partition.html import partition_html
+        text = "\n\n".join(str(element) for element in partition_html(text=html))
+    except ImportError:
+        from bs4 import BeautifulSoup
+        soup = BeautifulSoup(html, "html.parser")
+        for tag in soup(["script", "style", "noscript"]):
+            tag.decompose()
+        text = "\n\n".join(line.strip() for line in soup.get_text("\n").splitlines() if line.strip())
+    if not text.strip():
+        return []
+    return [Document(page_content=text, metadata={"source": url})]
+
+
+def streaming_index_generator(
+    urls: Iterable[str],
+    chunk_size: int = CHUNK_SIZE,
+    chunk_overlap: int = CHUNK_OVERLAP,
+    embeddings: Optional[Embeddings] = None,
+    embedding_cache: Optional[EmbeddingCache] = None,
+    batch_size: int = EMBEDDING_BATCH_SIZE,
+    num_workers: int = EMBEDDING_WORKERS,
+    index_spec: Optional[IndexSpec] = None,
+    dedup_threshold: Optional[float] = DEDUP_THRESHOLD,
+    num_shards: int = 1,
+    shard_by: str = "hash",
+    fetch_workers: int = INGEST_FETCH_WORKERS,
+    extract_workers: int = INGEST_EXTRACT_WORKERS,
+    queue_size: int = PIPELINE_QUEUE_SIZE,
+    log_interval: float = PIPELINE_LOG_INTERVAL,
+) -> VectorStore:
+    """Fetch, extract, split, embed and index pages as concurrent streaming stages.
+
+    Unlike ``web_url_loader`` followed by ``index_generator``, no stage waits
+    for the previous one to finish: pages are downloaded while earlier pages
+    are being embedded and added to the index. Stages are connected by
+    bounded queues, so memory held in flight depends on ``queue_size`` and
+    ``batch_size`` rather than on the number of pages; what grows with the
+    corpus is only the index itself (the deduplicator keeps its signatures
+    on disk).
+
+    Args:
+        urls: Pages to ingest.
+        chunk_size: Text splitter chunk size, in tokens.
+        chunk_overlap: Text splitter chunk overlap, in tokens.
+        embeddings: Embedding model; defaults to the knowledge base model.
+        embedding_cache: Optional on-disk cache of chunk embeddings.
+        batch_size: Chunks per embedding call.
+        num_workers: Embedding worker processes (see ``BatchedEmbeddings``).
+        index_spec: FAISS index type and parameters.
+        dedup_threshold: Jaccard similarity above which chunks count as
+            duplicates; None keeps every chunk.
+        num_shards: Split the index into this many shards; shards embed
+            their own chunks, so the pipeline then ends after splitting.
+        shard_by: ``"hash"`` (by source) or ``"category"``.
+        fetch_workers: Concurrent page downloads.
+        extract_workers: Threads extracting text from downloaded pages.
+        queue_size: Items buffered between two stages.
+        log_interval: Seconds between progress lines.
+
+    Returns:
+        The populated vector store.
+    """
+    embeddings = embeddings or get_embeddings()
+    splitter = get_text_splitter(chunk_size, chunk_overlap, embeddings)
+    deduplicator = ChunkDeduplicator(threshold=dedup_threshold) if dedup_threshold is not None else None
+
+    def split(doc: Document) -> Iterable[Document]:
+        chunks = splitter.split_documents([doc])
+        return deduplicator.deduplicate(chunks) if deduplicator is not None else chunks
+
+    batched_embeddings = BatchedEmbeddings(embeddings, batch_size=batch_size, num_workers=num_workers)
+    build_embeddings = batched_embeddings
+    if embedding_cache is not None:
+        build_embeddings = CachedEmbeddings(batched_embeddings, embedding_cache)
+
+    def embed(chunks: List[Document]) -> List[Tuple[List[Document], List[List[float]]]]:
+        return [(chunks, build_embeddings.embed_documents([chunk.page_content for chunk in chunks]))]
+
+    stages = [
+        Stage("fetch", fetch_page, workers=fetch_workers),
+        Stage("extract", extract_text, workers=extract_workers),
+        Stage("split", split),
+    ]
+    if num_shards <= 1:
+        # Hand the embedder as many chunks per call as a non-streaming build does
+        stages.append(Stage("embed", embed, batch_size=STREAM_BATCH_SIZE))
+    pipeline = StreamingPipeline(stages, queue_size=queue_size, log_interval=log_interval)
+
+    try:
+        if num_shards > 1:
+            vector_store = ShardedVectorStore.from_chunk_stream(
+                pipeline.run(urls),
+                build_embeddings,
+                index_spec=index_spec,
+                num_shards=num_shards,
+                shard_by=shard_by
+            )
+        else:
+            vector_store = AWSVectorStore.from_embedded_batches(pipeline.run(urls), build_embeddings, index_spec)
+    finally:
+        batched_embeddings.close()
+
+    return finalize_vector_store(vector_store, embeddings, deduplicator)
@@ -0,0 +1,197 @@
+import queue
+import threading
+import time
+from typing import Any, Callable, Iterable, Iterator, List, Optional
+
+PIPELINE_QUEUE_SIZE = 64  # Items waiting between two stages
+PIPELINE_LOG_INTERVAL = 10.0  # Seconds between progress lines
+
+_END = object()
+_POLL_SECONDS = 0.1
+
+
+class Stage:
+    """One step of a ``StreamingPipeline``.
+
+    Args:
+        name: Name used in progress logs.
+        fn: Called with one input item, or a list of up to ``batch_size`` items,
+            and returns (or yields) the output items.
+        workers: Threads running ``fn`` concurrently. Output order is only
+            preserved with a single worker.
+        batch_size: If set, ``fn`` receives lists of items instead of single items.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        fn: Callable[[Any], Optional[Iterable[Any]]],
+        workers: int = 1,
+        batch_size: Optional[int] = None,
+    ):
+        self.name = name
+        self.fn = fn
+        self.workers = max(1, workers)
+        self.batch_size = batch_size
+        self.items_in = 0
+        self.items_out = 0
+        self._lock = threading.Lock()
+
+    def _record(self, items_in: int = 0, items_out: int = 0) -> None:
+        with self._lock:
+            self.items_in += items_in
+            self.items_out += items_out
+
+
+class StreamingPipeline:
+    """Runs stages concurrently, connected by bounded queues.
+
+    Every stage reads from the queue of the stage before it and writes to its
+    own. A stage blocks when its output queue is full, which stops it from
+    taking input, so the slowest stage throttles everything upstream of it and
+    at most ``queue_size`` items wait between any two stages, however large the
+    input is. The output of the last stage is yielded to the caller, which acts
+    as the final stage.
+
+    Progress (items in/out, throughput and queue depth per stage) is printed
+    every ``log_interval`` seconds. If a stage raises, the pipeline stops and
+    the exception is re-raised to the caller.
+    """
+
+    def __init__(
+        self,
+        stages: List[Stage],
+        queue_size: int = PIPELINE_QUEUE_SIZE,
+        log_interval: float = PIPELINE_LOG_INTERVAL,
+    ):
+        self.stages = stages
+        self.queue_size = queue_size
+        self.log_interval = log_interval
+        self._stop = threading.Event()
+        self._error: Optional[BaseException] = None
+        self._queues: List[queue.Queue] = []
+        self._started = 0.0
+        self.items_consumed = 0
+
+    def run(self, source: Iterable[Any]) -> Iterator[Any]:
+        """Feed ``source`` through the stages and lazily yield the final outputs."""
+        self._stop.clear()
+        self._error = None
+        self._started = time.perf_counter()
+        self._queues = [queue.Queue(maxsize=self.queue_size) for _ in range(len(self.stages) + 1)]
+
+        threads = [threading.Thread(target=self._feed, args=(source,), name="pipeline-source", daemon=True)]
+        for i, stage in enumerate(self.stages):
+            remaining = [stage.workers]
+            for worker in range(stage.workers):
+                threads.append(threading.Thread(
+                    target=self._work,
+                    args=(stage, self._queues[i], self._queues[i + 1], remaining),
+                    name=f"pipeline-{stage.name}-{worker}",
+                    daemon=True,
+                ))
+        monitor = threading.Thread(target=self._monitor, name="pipeline-monitor", daemon=True)
+        for thread in threads + [monitor]:
+            thread.start()
+
+        try:
+            while True:
+                item = self._get(self._queues[-1])
+                if item is _END:
+                    break
+                self.items_consumed += 1
+                yield item
+        finally:
+            # Also reached when the caller stops consuming early
+            self._stop.set()
+            for thread in threads:
+                thread.join()
+            monitor.join()
+        if self._error is not None:
+            raise self._error
+        self._log(final=True)
+
+    def _put(self, target: queue.Queue, item: Any) -> bool:
+        """Put an item, blocking while the queue is full. Returns False once the pipeline stops."""
+        while not self._stop.is_set():
+            try:
+                target.put(item, timeout=_POLL_SECONDS)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _get(self, source: queue.Queue) -> Any:
+        """Take an item, blocking while the queue is empty. Returns _END once the pipeline stops."""
+        while True:
+            try:
+                return source.get(timeout=_POLL_SECONDS)
+            except queue.Empty:
+                if self._stop.is_set():
+                    return _END
+
+    def _fail(self, error: BaseException) -> None:
+        if self._error is None:
+            self._error = error
+        self._stop.set()
+
+    def _feed(self, source: Iterable[Any]) -> None:
+        try:
+            for item in source:
+                if not self._put(self._queues[0], item):
+                    return
+            self._put(self._queues[0], _END)
+        except Exception as e:
+            self._fail(e)
+
+    def _work(self, stage: Stage, inbox: queue.Queue, outbox: queue.Queue, remaining: List[int]) -> None:
+        try:
+            finished = False
+            while not finished:
+                if stage.batch_size:
+                    batch = []
+                    while len(batch) < stage.batch_size:
+                        item = self._get(inbox)
+                        if item is _END:
+                            finished = True
+                            break
+                        batch.append(item)
+                    if not batch:
+                        break
+                    arg, count = batch, len(batch)
+                else:
+                    arg = self._get(inbox)
+                    if arg is _END:
+                        break
+                    count = 1
+                stage._record(items_in=count)
+                for output in stage.fn(arg) or ():
+                    if not self._put(outbox, output):
+                        return
+                    stage._record(items_out=1)
+            # Let sibling workers of this stage see the end of the input too
+            self._put(inbox, _END)
+        except Exception as e:
+            print(f"[ERROR] Pipeline stage '{stage.name}' failed: {e}")
+            self._fail(e)
+        finally:
+            with stage._lock:
+                remaining[0] -= 1
+                last = remaining[0] == 0
+            if last:
+                self._put(outbox, _END)
+
+    def _monitor(self) -> None:
+        while not self._stop.wait(self.log_interval):
+            self._log()
+
+    def _log(self, final: bool = False) -> None:
+        elapsed = max(time.perf_counter() - self._started, 1e-9)
+        parts = []
+        for stage, inbox in zip(self.stages, self._queues):
+            depth = "" if final else f", queue {inbox.qsize()}/{self.queue_size}"
+            parts.append(f"{stage.name} {stage.items_in}->{stage.items_out} ({stage.items_in / elapsed:.1f}/s{depth})")
+        depth = "" if final else f" (queue {self._queues[-1].qsize()}/{self.queue_size})"
+        parts.append(f"sink {self.items_consumed}{depth}")
+        label = "finished in" if final else "running for"
+        print(f"[INFO] Pipeline {label} {elapsed:.1f}s: " + " | ".join(parts))
@@ -0,0 +1,191 @@
+import math
+from typing import Callable, Iterable, Iterator, List, Optional, Sequence
+
+from langchain_community.docstore.document import Document
+from langchain_core.embeddings import Embeddings
+
+DEFAULT_SEPARATORS = ["\n\n", "\n", ". ", " ", ""]
+CHARS_PER_TOKEN = 4  # Rough estimate used when the model's tokenizer is unavailable
+
+
+class Tokenizer:
+    """Counts tokens the way an embedding model does and cuts text at token boundaries.
+
+    Args:
+        count: Returns the number of tokens in a text.
+        cut: Splits a text into pieces of at most ``max_tokens`` tokens.
+        max_tokens: Longest input the model embeds without truncating, if known.
+        name: Description used in log messages.
+    """
+
+    def __init__(
+        self,
+        count: Callable[[str], int],
+        cut: Callable[[str, int], List[str]],
+        max_tokens: Optional[int],
+        name: str,
+    ):
+        self.count = count
+        self.cut = cut
+        self.max_tokens = max_tokens
+        self.name = name
+
+
+def _huggingface_tokenizer(client) -> Tokenizer:
+    tokenizer = client.tokenizer
+    # Leave room for the [CLS] / [SEP] tokens the model adds
+    special = tokenizer.num_special_tokens_to_add() if hasattr(tokenizer, "num_special_tokens_to_add") else 2
+
+    def count(text: str) -> int:
+        return len(tokenizer(text, add_special_tokens=False)["input_ids"])
+
+    def cut(text: str, max_tokens: int) -> List[str]:
+        offsets = tokenizer(text, add_special_tokens=False, return_offsets_mapping=True)["offset_mapping"]
+        starts = [offsets[i][0] for i in range(0, len(offsets), max_tokens)]
+        return [text[start:end] for start, end in zip(starts, starts[1:] + [len(text)])]
+
+    return Tokenizer(count, cut, client.max_seq_length - special, f"huggingface:{tokenizer.name_or_path}")
+
+
+def _tiktoken_tokenizer(model: str, max_tokens: int) -> Tokenizer:
+    import tiktoken
+
+    try:
+        encoding = tiktoken.encoding_for_model(model)
+    except KeyError:
+        encoding = tiktoken.get_encoding("cl100k_base")
+
+    def count(text: str) -> int:
+        return len(encoding.encode(text, disallowed_special=()))
+
+    def cut(text: str, max_tokens: int) -> List[str]:
+        tokens = encoding.encode(text, disallowed_special=())
+        return [encoding.decode(tokens[i:i + max_tokens]) for i in range(0, len(tokens), max_tokens)]
+
+    return Tokenizer(count, cut, max_tokens, f"tiktoken:{encoding.name}")
+
+
+def _approximate_tokenizer() -> Tokenizer:
+    def count(text: str) -> int:
+        return math.ceil(len(text) / CHARS_PER_TOKEN)
+
+    def cut(text: str, max_tokens: int) -> List[str]:
+        size = max_tokens * CHARS_PER_TOKEN
+        return [text[i:i + size] for i in range(0, len(text), size)]
+
+    return Tokenizer(count, cut, None, "approximate")
+
+
+def get_tokenizer(embeddings: Embeddings) -> Tokenizer:
+    """Return the tokenizer and input limit of an embedding model.
+
+    Local sentence-transformers models use their own tokenizer and
+    ``max_seq_length``; OpenAI models use tiktoken and ``embedding_ctx_length``.
+    Other models fall back to an estimate of four characters per token.
+    """
+    while hasattr(embeddings, "underlying_embeddings"):
+        embeddings = embeddings.underlying_embeddings
+
+    client = getattr(embeddings, "client", None)
+    if hasattr(client, "tokenizer") and hasattr(client, "max_seq_length"):
+        return _huggingface_tokenizer(client)
+    if hasattr(embeddings, "embedding_ctx_length"):
+        try:
+            return _tiktoken_tokenizer(embeddings.model, embeddings.embedding_ctx_length)
+        except Exception as e:
+            # tiktoken missing, or its encoding files could not be downloaded
+            print(f"[WARNING] tiktoken unavailable, estimating token counts: {e}")
+    return _approximate_tokenizer()
+
+
+class TokenTextSplitter:
+    """Splits documents into chunks of at most ``chunk_size`` tokens.
+
+    Text is split on the first separator that occurs in it; pieces that are
+    still too long are split with the next separator, down to token
+    boundaries. Adjacent pieces are then merged back into chunks, carrying up
+    to ``chunk_overlap`` tokens of context into the next chunk.
+
+    ``chunk_size`` is capped at the embedding model's input limit, so no chunk
+    is silently truncated by the embedder. Documents are consumed and chunks
+    produced lazily, so memory use does not grow with the corpus.
+    """
+
+    def __init__(
+        self,
+        tokenizer: Tokenizer,
+        chunk_size: int,
+        chunk_overlap: int = 0,
+        separators: Sequence[str] = DEFAULT_SEPARATORS,
+    ):
+        if tokenizer.max_tokens is not None and chunk_size > tokenizer.max_tokens:
+            print(
+                f"[WARNING] chunk_size {chunk_size} exceeds the {tokenizer.max_tokens} token input "
+                f"limit of {tokenizer.name}; using {tokenizer.max_tokens}"
+            )
+            chunk_size = tokenizer.max_tokens
+        if chunk_overlap >= chunk_size:
+            raise ValueError(f"chunk_overlap ({chunk_overlap}) must be smaller than chunk_size ({chunk_size})")
+        self.tokenizer = tokenizer
+        self.chunk_size = chunk_size
+        self.chunk_overlap = chunk_overlap
+        self.separators = list(separators)
+
+    def split_documents(self, documents: Iterable[Document]) -> Iterator[Document]:
+        """Lazily split documents, copying each document's metadata to its chunks."""
+        for doc in documents:
+            for text in self.split_text(doc.page_content):
+                yield Document(page_content=text, metadata=dict(doc.metadata))
+
+    def split_text(self, text: str) -> Iterator[str]:
+        """Lazily split a text into chunks."""
+        yield from self._merge(self._pieces(text, self.separators))
+
+    def _pieces(self, text: str, separators: List[str]) -> Iterator[tuple]:
+        """Yield (piece, token count) pairs that each fit in a chunk."""
+        separator, remaining = "", []
+        for i, candidate in enumerate(separators):
+            if candidate == "" or candidate in text:
+                separator, remaining = candidate, separators[i + 1:]
+                break
+
+        if separator == "":
+            # No separator left: cut at token boundaries
+            for piece in self.tokenizer.cut(text, self.chunk_size):
+                yield piece, self.tokenizer.count(piece)
+            return
+
+        parts = text.split(separator)
+        for i, part in enumerate(parts):
+            # Keep the separator attached so chunks read naturally when joined
+            piece = part + separator if i < len(parts) - 1 else part
+            if not piece.strip():
+                continue
+            tokens = self.tokenizer.count(piece)
+            if tokens <= self.chunk_size:
+                yield piece, tokens
+            else:
+                yield from self._pieces(piece, remaining)
+
+    def _merge(self, pieces: Iterable[tuple]) -> Iterator[str]:
+        """Greedily pack pieces into chunks of at most ``chunk_size`` tokens."""
+        window: List[tuple] = []
+        total = 0
+        for piece, tokens in pieces:
+            if window and total + tokens > self.chunk_size:
+                yield from self._emit(window)
+                # Keep a tail of the chunk as overlap, as long as the new piece still fits
+                while window and (total > self.chunk_overlap or total + tokens > self.chunk_size):
+                    total -= window.pop(0)[1]
+            window.append((piece, tokens))
+            total += tokens
+        if window:
+            yield from self._emit(window)
+
+    def _emit(self, window: List[tuple]) -> Iterator[str]:
+        text = "".join(p for p, _ in window).strip()
+        # Tokens can merge across piece boundaries; never hand the embedder an oversized chunk
+        if self.tokenizer.count(text) <= self.chunk_size:
+            yield text
+        else:
+            yield from (piece.strip() for piece in self.tokenizer.cut(text, self.chunk_size))
@@ -0,0 +1,1078 @@
+import bisect
+import functools
+import hashlib
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from itertools import chain, islice
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+import faiss
+import numpy as np
+from langchain_community.docstore.document import Document
+from langchain_community.docstore.in_memory import InMemoryDocstore
+from langchain_community.vectorstores import FAISS
+from langchain_community.vectorstores.utils import DistanceStrategy
+from langchain_core.embeddings import Embeddings
+from langchain_core.runnables.config import run_in_executor
+
+from steps.columnar_docstore import has_docstore, id_array, load_array, load_docstore, save_array, save_docstore
+from steps.ann_index import (
+    DEFAULT_RERANK_FACTOR,
+    DEFAULT_RRF_K,
+    MIN_POINTS_PER_LIST,
+    IndexSpec,
+    build_index,
+    compact_index,
+    configure_search,
+)
+from steps.deduplication import DUPLICATE_SOURCES_KEY
+from steps.metadata_index import (
+    Filters,
+    MetadataIndex,
+    pop_filters,
+    search_parameters,
+    selector,
+)
+from steps.retrieval_cache import RetrievalCache
+from steps.sparse_index import BM25Index, reciprocal_rank_fusion, tokenize
+
+SOURCES_FILENAME = "sources.json"
+SOURCES_FORMAT_VERSION = 2
+SOURCE_CODES_FILENAME = "source_codes.npy"
+SOURCE_HASHES_FILENAME = "source_hashes.npy"
+SOURCE_IDS_FILENAME = "source_ids.npy"
+RERANK_VECTORS_FILENAME = "rerank_vectors.npy"
+RERANK_IDS_FILENAME = "rerank_ids.json"
+COMPACTION_MAX_TOMBSTONES = 1000
+COMPACTION_TOMBSTONE_RATIO = 0.1
+STREAM_BATCH_SIZE = 1024  # Chunks embedded per call when building from a stream
+HYBRID_CANDIDATE_FACTOR = 4  # Hits taken from each retriever per fused result
+# Filters matching at most this many chunks are scored exactly instead of searched
+FILTER_EXACT_MAX_MATCHES = int(os.getenv("FILTER_EXACT_MAX_MATCHES", "4096"))
+
+# Runs BM25 lookups while the calling thread embeds the query and searches FAISS
+_sparse_search_pool = ThreadPoolExecutor(max_workers=4, thread_name_prefix="bm25-search")
+
+
+def chunk_hash(doc: Document) -> str:
+    """Return a content hash identifying a chunk within its source."""
+    digest = hashlib.sha256(doc.page_content.encode("utf-8"))
+    # Provenance added by deduplication does not change what the chunk is
+    metadata = {key: value for key, value in doc.metadata.items() if key != DUPLICATE_SOURCES_KEY}
+    digest.update(json.dumps(metadata, sort_keys=True, default=str).encode("utf-8"))
+    return digest.hexdigest()
+
+
+def _held_sources(doc: Document) -> List[str]:
+    """Return the sources a chunk stands for: its own, then those of the duplicates it absorbed."""
+    return [doc.metadata.get("source", "unknown")] + list(doc.metadata.get(DUPLICATE_SOURCES_KEY) or [])
+
+
+def _source_hash(doc: Document, source: str) -> str:
+    """Return the hash identifying ``doc`` within ``source``, as if that source had produced it."""
+    if source == doc.metadata.get("source", "unknown"):
+        return chunk_hash(doc)
+    return chunk_hash(Document(page_content=doc.page_content, metadata={**doc.metadata, "source": source}))
+
+
+class _ReadWriteLock:
+    """Many concurrent readers or one writer."""
+
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._readers = 0
+        self._writer = False
+
+    @contextmanager
+    def read(self):
+        with self._cond:
+            while self._writer:
+                self._cond.wait()
+            self._readers += 1
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._readers -= 1
+                if self._readers == 0:
+                    self._cond.notify_all()
+
+    @contextmanager
+    def write(self):
+        with self._cond:
+            while self._writer or self._readers:
+                self._cond.wait()
+            self._writer = True
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._writer = False
+                self._cond.notify_all()
+
+
+class _RerankVectors:
+    """Full-precision vectors keyed by docstore id, used to rerank search hits exactly.
+
+    Vectors loaded from disk stay memory mapped; vectors added since the last
+    save are held in memory until the next save rewrites the file.
+    """
+
+    def __init__(self, matrix: np.ndarray, ids: List[str]):
+        self._matrix = matrix
+        self._rows = {docstore_id: row for row, docstore_id in enumerate(ids)}
+        self._added: Dict[str, np.ndarray] = {}
+
+    def add(self, ids: List[str], vectors: List[List[float]]) -> None:
+        for docstore_id, vector in zip(ids, vectors):
+            self._added[docstore_id] = np.asarray(vector, dtype=np.float32)
+
+    def get(self, docstore_id: str) -> Optional[np.ndarray]:
+        vector = self._added.get(docstore_id)
+        if vector is None:
+            row = self._rows.get(docstore_id)
+            if row is not None:
+                vector = np.asarray(self._matrix[row], dtype=np.float32)
+        return vector
+
+    def save(self, folder_path: str, ids: List[str], batch_size: int = 10_000) -> None:
+        """Write the vectors of ``ids`` to ``folder_path`` without loading them all at once."""
+        ids = [docstore_id for docstore_id in ids if docstore_id in self._added or docstore_id in self._rows]
+        dim = self._matrix.shape[1]
+        out = np.lib.format.open_memmap(
+            os.path.join(folder_path, RERANK_VECTORS_FILENAME),
+            mode="w+",
+            dtype=np.float32,
+            shape=(len(ids), dim),
+        )
+        for start in range(0, len(ids), batch_size):
+            batch = ids[start:start + batch_size]
+            out[start:start + len(batch)] = np.stack([self.get(docstore_id) for docstore_id in batch])
+        out.flush()
+        with open(os.path.join(folder_path, RERANK_IDS_FILENAME), "w", encoding="utf-8") as f:
+            json.dump(ids, f)
+
+    @classmethod
+    def load(cls, folder_path: str) -> Optional["_RerankVectors"]:
+        path = os.path.join(folder_path, RERANK_VECTORS_FILENAME)
+        if not os.path.exists(path):
+            return None
+        with open(os.path.join(folder_path, RERANK_IDS_FILENAME), encoding="utf-8") as f:
+            ids = json.load(f)
+        return cls(np.load(path, mmap_mode="r"), ids)
+
+
+class AWSVectorStore(FAISS):
+    """FAISS vector store that supports per-source updates of the knowledge base.
+
+    Chunks are tracked per ``metadata["source"]`` by content hash, so upserting a
+    source only embeds chunks that actually changed. Deleted chunks are
+    tombstoned and skipped at search time; once enough tombstones pile up they
+    are removed from the index by a background compaction that works on a copy
+    of the index, so searches keep running while it happens.
+
+    When the index stores compressed vectors (see ``IndexSpec.storage``), full
+    precision copies can be kept in a memory-mapped file and used to rerank the
+    top ``k * rerank_factor`` hits exactly.
+
+    A BM25 index over the same chunks is kept alongside the FAISS index. With
+    ``hybrid`` enabled, text queries run the keyword and vector searches in
+    parallel and merge them by reciprocal rank fusion; the returned scores are
+    then RRF scores, where higher is better.
+
+    Searches can be restricted to chunks of given categories or sources with
+    ``filters`` (or the ``retrieval_filters`` context). Those are answered
+    from a metadata inverted index by searching only the matching vectors, so
+    scoped queries still return ``k`` hits when the scope has ``k`` chunks.
+
+    Text query results can be memoised in a ``retrieval_cache``, which is
+    cleared by every change to the index or its search settings.
+    """
+
+    def __init__(self, *args: Any, **kwargs: Any):
+        super().__init__(*args, **kwargs)
+        self._rw_lock = _ReadWriteLock()
+        self._mutation_lock = threading.Lock()
+        # Source -> {chunk hash: docstore id}; for a loaded store only the sources changed
+        # since loading, an empty map marking a deleted one
+        self._source_index: Optional[Dict[str, Dict[str, str]]] = None
+        # Sorted source names and per-chunk (source code, chunk hash, docstore id) columns of a loaded store
+        self._saved_sources: Optional[Tuple[List[str], np.ndarray, np.ndarray, np.ndarray]] = None
+        self._tombstones: Set[str] = set()
+        self._compacting = False
+        self._rerank_vectors: Optional[_RerankVectors] = None
+        self.rerank_factor = DEFAULT_RERANK_FACTOR
+        self._sparse_index: Optional[BM25Index] = None
+        self.hybrid = True
+        self.rrf_k = DEFAULT_RRF_K
+        self._metadata_index: Optional[MetadataIndex] = None
+        self._metadata_index_lock = threading.Lock()
+        self.retrieval_cache: Optional[RetrievalCache] = None
+
+    @classmethod
+    def from_documents_with_spec(
+        cls,
+        documents: List[Document],
+        embedding: Embeddings,
+        index_spec: Optional[IndexSpec] = None,
+    ) -> "AWSVectorStore":
+        """Embed documents and index them in the FAISS index described by ``index_spec``.
+
+        Args:
+            documents: Chunks to index.
+            embedding: Embedding model for the chunks and later queries.
+            index_spec: Index type and parameters; defaults to choosing by corpus size.
+
+        Returns:
+            The populated vector store.
+        """
+        return cls.from_chunk_stream(documents, embedding, index_spec, num_chunks=len(documents))
+
+    @classmethod
+    def from_chunk_stream(
+        cls,
+        chunks: Iterable[Document],
+        embedding: Embeddings,
+        index_spec: Optional[IndexSpec] = None,
+        batch_size: int = STREAM_BATCH_SIZE,
+        num_chunks: Optional[int] = None,
+    ) -> "AWSVectorStore":
+        """Build a store from a stream of chunks, embedding and adding them batch by batch.
+
+        Only the first ``index_spec.train_sample`` chunks are buffered, to choose
+        and train the index; after that each batch is embedded and added as it
+        arrives. With ``kind="auto"``, a stream that outlasts the sample and has
+        no ``num_chunks`` gets an IVF-Flat index with as many lists as the
+        sample can train, which keeps working however large the corpus grows.
+
+        Args:
+            chunks: Chunks to index, e.g. a lazy text splitter output.
+            embedding: Embedding model for the chunks and later queries.
+            index_spec: Index type and parameters; defaults to choosing by corpus size.
+            batch_size: Chunks embedded per call to the embedding model.
+            num_chunks: Expected number of chunks, if known.
+
+        Returns:
+            The populated vector store.
+        """
+        batches = (
+            (batch, embedding.embed_documents([doc.page_content for doc in batch]))
+            for batch in _batched(chunks, batch_size)
+        )
+        return cls.from_embedded_batches(batches, embedding, index_spec, num_chunks)
+
+    @classmethod
+    def from_embedded_batches(
+        cls,
+        batches: Iterable[Tuple[List[Document], List[List[float]]]],
+        embedding: Embeddings,
+        index_spec: Optional[IndexSpec] = None,
+        num_chunks: Optional[int] = None,
+    ) -> "AWSVectorStore":
+        """Build a store from a stream of already embedded batches of chunks.
+
+        Like ``from_chunk_stream``, for pipelines that embed chunks themselves.
+
+        Args:
+            batches: ``(chunks, vectors)`` pairs.
+            embedding: Embedding model of the vectors, used for later queries.
+            index_spec: Index type and parameters; defaults to choosing by corpus size.
+            num_chunks: Expected number of chunks, if known.
+
+        Returns:
+            The populated vector store.
+
+        Raises:
+            ValueError: If there are no chunks.
+        """
+        index_spec = index_spec or IndexSpec()
+        batches = iter(batches)
+
+        head_docs: List[Document] = []
+        head_vectors: List[List[float]] = []
+        for docs, vectors in batches:
+            head_docs.extend(docs)
+            head_vectors.extend(vectors)
+            if len(head_docs) >= index_spec.train_sample:
+                break
+        if not head_docs:
+            raise ValueError("Cannot build a vector store without any chunks")
+        build_spec = index_spec
+        if len(head_docs) >= index_spec.train_sample and index_spec.kind == "auto" and num_chunks is None:
+            pending = next(batches, None)
+            if pending is not None:
+                # The corpus size is unknown; the sample alone would size the index for the sample
+                build_spec = index_spec.model_copy(update={
+                    "kind": "ivf_flat",
+                    "nlist": index_spec.nlist or max(1, len(head_docs) // MIN_POINTS_PER_LIST),
+                })
+                print(f"[INFO] Stream outlasts the {len(head_docs)}-chunk sample; building an IVF-Flat index")
+                batches = chain([pending], batches)
+
+        index = build_index(np.asarray(head_vectors, dtype=np.float32), build_spec, num_vectors=num_chunks)
+        store = cls(embedding, index, InMemoryDocstore(), {})
+        if index_spec.rerank:
+            store._rerank_vectors = _RerankVectors(np.empty((0, index.d), dtype=np.float32), [])
+        store._sparse_index = BM25Index()
+        store._metadata_index = MetadataIndex()
+
+        store._add_chunks(head_docs, head_vectors)
+        del head_docs, head_vectors
+        for docs, vectors in batches:
+            store._add_chunks(docs, vectors)
+
+        store.configure_search(index_spec)
+        return store
+
+    def _add_chunks(self, chunks: List[Document], vectors: List[List[float]]) -> List[str]:
+        """Add embedded chunks to the index, docstore, BM25 index and rerank vectors."""
+        texts = [chunk.page_content for chunk in chunks]
+        ids = [chunk.id for chunk in chunks]
+        ids = self.add_embeddings(
+            zip(texts, vectors),
+            metadatas=[chunk.metadata for chunk in chunks],
+            ids=ids if any(ids) else None,
+        )
+        start = self.index.ntotal - len(ids)
+        if self._rerank_vectors is not None:
+            self._rerank_vectors.add(ids, vectors)
+        if self._sparse_index is not None:
+            self._sparse_index.add(ids, texts, range(start, start + len(ids)))
+        if self._metadata_index is not None:
+            self._metadata_index.add(range(start, start + len(ids)), ids, [chunk.metadata for chunk in chunks])
+        self._invalidate_retrievals()
+        return ids
+
+    def _invalidate_retrievals(self) -> None:
+        """Forget cached search results after the index changed."""
+        if self.retrieval_cache is not None:
+            self.retrieval_cache.clear()
+
+    def configure_search(self, index_spec: IndexSpec) -> None:
+        """Apply the spec's query-time knobs to this store."""
+        configure_search(self.index, index_spec)
+        self.rerank_factor = index_spec.rerank_factor
+        self.hybrid = index_spec.hybrid
+        self.rrf_k = index_spec.rrf_k
+        self._invalidate_retrievals()
+
+    def _build_sparse_index(self) -> BM25Index:
+        """Index the live chunks of the docstore, e.g. for stores saved without BM25."""
+        sparse_index = BM25Index()
+        live = [
+            (position, docstore_id, self.docstore.search(docstore_id))
+            for position, docstore_id in self.index_to_docstore_id.items()
+            if docstore_id not in self._tombstones
+        ]
+        live = [(position, docstore_id, doc) for position, docstore_id, doc in live if isinstance(doc, Document)]
+        sparse_index.add(
+            [docstore_id for _, docstore_id, _ in live],
+            [doc.page_content for _, _, doc in live],
+            [position for position, _, _ in live],
+        )
+        return sparse_index
+
+    def _ensure_metadata_index(self) -> MetadataIndex:
+        """Build the metadata value -> FAISS position index on first use."""
+        with self._metadata_index_lock:
+            if self._metadata_index is None:
+                self._metadata_index = MetadataIndex.build(
+                    self.index_to_docstore_id, self.docstore, exclude=self._tombstones
+                )
+            return self._metadata_index
+
+    def filter_values(self, field: str) -> List[str]:
+        """Return the values a filterable metadata field takes in the knowledge base."""
+        with self._rw_lock.read():
+            return self._ensure_metadata_index().values(field)
+
+    # Search
+
+    def similarity_search_with_score(
+        self,
+        query: str,
+        k: int = 4,
+        filter: Optional[Any] = None,
+        fetch_k: int = 20,
+        **kwargs: Any,
+    ) -> List[Tuple[Document, float]]:
+        return self.search_with_embedding(query, self._embed_query(query), k=k, filter=filter, fetch_k=fetch_k, **kwargs)
+
+    def search_with_embedding(
+        self,
+        query: str,
+        embedding: List[float],
+        k: int = 4,
+        filter: Optional[Any] = None,
+        fetch_k: int = 20,
+        **kwargs: Any,
+    ) -> List[Tuple[Document, float]]:
+        """``similarity_search_with_score`` for a query that is already embedded.
+
+        Lets callers that search several stores with one query embed it once.
+        """
+        filters = pop_filters(kwargs)
+        cache = self.retrieval_cache
+        # Callable filters have no stable cache key
+        if cache is None or callable(filter):
+            return self._search_query(query, embedding, k, filter, fetch_k, filters, **kwargs)
+
+        generation = cache.generation
+        # Sparse scores depend on the query's terms, so hybrid searches also key on those
+        sparse_query = sorted(set(tokenize(query))) if self.hybrid_enabled else None
+        key = cache.key(
+            embedding, k=k, filter=filter, fetch_k=fetch_k, filters=filters, sparse_query=sparse_query, **kwargs
+        )
+        cached = cache.get(key)
+        if cached is not None:
+            return cached
+        started = time.perf_counter()
+        results = self._search_query(query, embedding, k, filter, fetch_k, filters, **kwargs)
+        cache.put(key, results, time.perf_counter() - started, generation)
+        return results
+
+    async def asimilarity_search_with_score(
+        self,
+        query: str,
+        k: int = 4,
+        filter: Optional[Any] = None,
+        fetch_k: int = 20,
+        **kwargs: Any,
+    ) -> List[Tuple[Document, float]]:
+        return await run_in_executor(
+            None, self.similarity_search_with_score, query, k=k, filter=filter, fetch_k=fetch_k, **kwargs
+        )
+
+    def _search_query(
+        self,
+        query: str,
+        embedding: List[float],
+        k: int,
+        filter: Optional[Any],
+        fetch_k: int,
+        filters: Optional[Filters],
+        **kwargs: Any,
+    ) -> List[Tuple[Document, float]]:
+        """Run a dense search, or a hybrid dense + BM25 search fused by RRF.
+
+        A ``score_threshold`` applies to the scores returned: distances for a
+        dense search, fused RRF scores for a hybrid one.
+        """
+        if not self.hybrid_enabled:
+            return self.similarity_search_with_score_by_vector(
+                embedding, k=k, filter=filter, fetch_k=fetch_k, filters=filters, **kwargs
+            )
+
+        score_threshold = kwargs.pop("score_threshold", None)
+        dense, sparse = self.hybrid_candidates(
+            query, embedding, k * HYBRID_CANDIDATE_FACTOR, filter, fetch_k, filters, **kwargs
+        )
+        return fuse_candidates(dense, sparse, k, self.rrf_k, score_threshold)
+
+    def _select_relevance_score_fn(self) -> Callable[[float], float]:
+        """Map hybrid RRF scores, or dense distances, onto relevance in [0, 1]."""
+        if self.hybrid_enabled and self.override_relevance_score_fn is None:
+            return rrf_relevance_score_fn(self.rrf_k)
+        return super()._select_relevance_score_fn()
+
+    def hybrid_candidates(
+        self,
+        query: str,
+        embedding: List[float],
+        candidates: int,
+        filter: Optional[Any],
+        fetch_k: int,
+        filters: Optional[Filters],
+        **kwargs: Any,
+    ) -> Tuple[List[Tuple[Document, float]], List[Tuple[Document, float]]]:
+        """Return the dense and BM25 hit lists that a hybrid search fuses.
+
+        Dense hits carry their raw distances and BM25 hits their BM25 scores,
+        so lists from several stores can be merged before a single fusion.
+        """
+        sparse_future = _sparse_search_pool.submit(self._sparse_search, query, candidates, filter, fetch_k, filters)
+        dense = self.similarity_search_with_score_by_vector(
+            embedding, k=candidates, filter=filter, fetch_k=max(fetch_k, candidates), filters=filters, **kwargs
+        )
+        return dense, sparse_future.result()
+
+    def _sparse_search(
+        self,
+        query: str,
+        k: int,
+        filter: Optional[Any],
+        fetch_k: int,
+        filters: Optional[Filters] = None,
+    ) -> List[Tuple[Document, float]]:
+        """Return the top BM25 hits, applying the same metadata filters as dense search."""
+        filter_func = self._create_filter_func(filter) if filter is not None else None
+        with self._rw_lock.read():
+            mask = self._ensure_metadata_index().mask(filters, self.index.ntotal) if filters else None
+            hits = self._sparse_index.search(query, max(k, fetch_k) if filter_func else k, mask=mask)
+            results = []
+            for docstore_id, score in hits:
+                doc = self.docstore.search(docstore_id)
+                if not isinstance(doc, Document):
+                    continue
+                if filter_func is not None and not filter_func(doc.metadata):
+                    continue
+                results.append((doc, score))
+            return results[:k]
+
+    def similarity_search_with_score_by_vector(
+        self,
+        embedding: List[float],
+        k: int = 4,
+        filter: Optional[Any] = None,
+        fetch_k: int = 20,
+        **kwargs: Any,
+    ) -> List[Tuple[Document, float]]:
+        filters = pop_filters(kwargs)
+        with self._rw_lock.read():
+            search = functools.partial(self._search_filtered, filters=filters) if filters else self._search_live
+            if self._rerank_vectors is None or self.rerank_factor <= 1:
+                return search(embedding, k, filter, fetch_k, **kwargs)
+
+            candidates = k * self.rerank_factor
+            hits = search(embedding, candidates, filter, max(fetch_k, candidates), **kwargs)
+            return self._rerank(embedding, hits)[:k]
+
+    def _search_live(
+        self,
+        embedding: List[float],
+        k: int,
+        filter: Optional[Any],
+        fetch_k: int,
+        **kwargs: Any,
+    ) -> List[Tuple[Document, float]]:
+        """Search, skipping tombstoned chunks. Caller holds the read lock."""
+        if not self._tombstones:
+            return super().similarity_search_with_score_by_vector(
+                embedding, k=k, filter=filter, fetch_k=fetch_k, **kwargs
+            )
+
+        # Over-fetch so tombstoned hits can be dropped without returning fewer than k
+        extra = len(self._tombstones)
+        hits = super().similarity_search_with_score_by_vector(
+            embedding,
+            k=min(k + extra, self.index.ntotal),
+            filter=filter,
+            fetch_k=fetch_k + extra,
+            **kwargs,
+        )
+        return [(doc, score) for doc, score in hits if doc.id not in self._tombstones][:k]
+
+    def _search_filtered(
+        self,
+        embedding: List[float],
+        k: int,
+        filter: Optional[Any],
+        fetch_k: int,
+        filters: Filters,
+        **kwargs: Any,
+    ) -> List[Tuple[Document, float]]:
+        """Search only the live chunks matching ``filters``. Caller holds the read lock.
+
+        The top ``k`` are taken among matches instead of filtering a global top
+        ``k``. Up to ``FILTER_EXACT_MAX_MATCHES`` matches are scored directly
+        from their stored vectors; larger match sets are handed to FAISS as an
+        ID selector.
+        """
+        mask = self._ensure_metadata_index().mask(filters, self.index.ntotal)
+        matches = int(mask.sum())
+        if not matches:
+            return []
+        fetch = min(fetch_k if filter is not None else k, matches)
+
+        query = np.asarray([embedding], dtype=np.float32)
+        if self._normalize_L2:
+            faiss.normalize_L2(query)
+        found = None
+        if matches <= FILTER_EXACT_MAX_MATCHES:
+            found = self._score_positions(query, np.flatnonzero(mask), fetch)
+        if found is not None:
+            distances, positions = found
+        else:
+            sel = selector(mask)
+            distances, positions = self.index.search(query, fetch, params=search_parameters(self.index, sel))
+            if np.count_nonzero(positions[0] >= 0) < fetch:
+                # Approximate indexes can miss matches of a selective filter; look harder
+                distances, positions = self.index.search(
+                    query, fetch, params=search_parameters(self.index, sel, exhaustive=True)
+                )
+
+        filter_func = self._create_filter_func(filter) if filter is not None else None
+        score_threshold = kwargs.get("score_threshold")
+        results = []
+        for distance, position in zip(distances[0], positions[0]):
+            if position < 0:
+                continue
+            doc = self.docstore.search(self.index_to_docstore_id[position])
+            if not isinstance(doc, Document):
+                continue
+            if filter_func is not None and not filter_func(doc.metadata):
+                continue
+            if score_threshold is not None and not self._within_threshold(float(distance), score_threshold):
+                continue
+            results.append((doc, float(distance)))
+        return results[:k]
+
+    def _score_positions(
+        self, query: np.ndarray, positions: np.ndarray, fetch: int
+    ) -> Optional[Tuple[np.ndarray, np.ndarray]]:
+        """Score the vectors at ``positions`` against ``query`` and return the best ``fetch``.
+
+        Returns FAISS-style ``(distances, positions)`` rows, or None if the
+        index cannot reconstruct its vectors (IVF without a direct map).
+        """
+        try:
+            vectors = self.index.reconstruct_batch(positions.astype(np.int64))
+        except RuntimeError:
+            return None
+        if self.index.metric_type == faiss.METRIC_INNER_PRODUCT:
+            scores = vectors @ query[0]
+            order = np.argsort(-scores, kind="stable")[:fetch]
+        else:
+            scores = np.sum((vectors - query[0]) ** 2, axis=1)
+            order = np.argsort(scores, kind="stable")[:fetch]
+        return scores[order][None, :], positions[order][None, :]
+
+    @property
+    def hybrid_enabled(self) -> bool:
+        """Whether text searches are hybrid dense + BM25 searches."""
+        return self.hybrid and self._sparse_index is not None
+
+    @property
+    def higher_is_better(self) -> bool:
+        """Whether larger scores from text searches mean closer matches."""
+        return self.hybrid_enabled or self.dense_higher_is_better
+
+    @property
+    def dense_higher_is_better(self) -> bool:
+        """Whether larger scores from vector searches mean closer matches."""
+        return self.distance_strategy in (DistanceStrategy.MAX_INNER_PRODUCT, DistanceStrategy.JACCARD)
+
+    def _within_threshold(self, score: float, score_threshold: float) -> bool:
+        if self.dense_higher_is_better:
+            return score >= score_threshold
+        return score <= score_threshold
+
+    def _rerank(self, embedding: List[float], hits: List[Tuple[Document, float]]) -> List[Tuple[Document, float]]:
+        """Re-score hits by exact squared L2 distance to their full-precision vectors."""
+        query = np.asarray(embedding, dtype=np.float32)
+        rescored = []
+        for doc, score in hits:
+            vector = self._rerank_vectors.get(doc.id)
+            if vector is not None:
+                score = float(np.sum((vector - query) ** 2))
+            rescored.append((doc, score))
+        return sorted(rescored, key=lambda hit: hit[1])
+
+    # Mutation
+
+    def _ensure_source_index(self) -> Dict[str, Dict[str, str]]:
+        """Build the source -> {chunk hash: docstore id} map on first use.
+
+        A loaded store starts with an empty map of changed sources on top of
+        its saved columns instead.
+        """
+        if self._source_index is None and self._saved_sources is not None:
+            self._source_index = {}
+        if self._source_index is None:
+            source_index = {}
+            for docstore_id in self.index_to_docstore_id.values():
+                doc = self.docstore.search(docstore_id)
+                if isinstance(doc, Document):
+                    for source in _held_sources(doc):
+                        source_index.setdefault(source, {})[_source_hash(doc, source)] = docstore_id
+            self._source_index = source_index
+        return self._source_index
+
+    def _source_chunks(self, source: str) -> Dict[str, str]:
+        """Return a copy of one source's chunk hash -> docstore id map.
+
+        Sources unchanged since loading are read from the memory-mapped
+        columns, touching only that source's rows.
+        """
+        source_index = self._ensure_source_index()
+        if source in source_index or self._saved_sources is None:
+            return dict(source_index.get(source, {}))
+        names, codes, hashes, ids = self._saved_sources
+        code = bisect.bisect_left(names, source)
+        if code == len(names) or names[code] != source:
+            return {}
+        rows = np.flatnonzero(codes == code)
+        return {
+            digest.decode("utf-8"): docstore_id.decode("utf-8")
+            for digest, docstore_id in zip(hashes[rows].tolist(), ids[rows].tolist())
+        }
+
+    def _set_source_chunks(self, source: str, chunks: Dict[str, str]) -> None:
+        """Replace one source's chunk map; an empty map deletes the source."""
+        if chunks or self._saved_sources is not None:
+            self._source_index[source] = chunks
+        else:
+            self._source_index.pop(source, None)
+
+    def _replace_metadata(self, docstore_id: str, doc: Document, metadata: Dict[str, Any]) -> None:
+        """Store ``doc`` with new metadata and re-index it. Caller holds the write lock."""
+        self.docstore.delete([docstore_id])
+        self.docstore.add({docstore_id: Document(id=docstore_id, page_content=doc.page_content, metadata=metadata)})
+        if self._metadata_index is not None:
+            self._metadata_index.update(docstore_id, doc.metadata, metadata)
+
+    def _detach_source(self, source: str, docstore_ids: Iterable[str]) -> List[str]:
+        """Drop ``source`` from chunks and return those no other source holds.
+
+        A chunk that also stands for the sources of duplicates dropped at build
+        time is re-homed to the first of them instead of being removed.
+        Caller holds the write lock.
+        """
+        orphaned = []
+        for docstore_id in docstore_ids:
+            doc = self.docstore.search(docstore_id)
+            remaining = [held for held in _held_sources(doc) if held != source] if isinstance(doc, Document) else []
+            if not remaining:
+                orphaned.append(docstore_id)
+                continue
+            metadata = {**doc.metadata, "source": remaining[0], DUPLICATE_SOURCES_KEY: remaining[1:]}
+            if not remaining[1:]:
+                del metadata[DUPLICATE_SOURCES_KEY]
+            self._replace_metadata(docstore_id, doc, metadata)
+        return orphaned
+
+    def record_duplicate_sources(self, provenance: Dict[str, List[str]]) -> None:
+        """Register the sources of dropped duplicates with the chunks kept in their place.
+
+        Each kept chunk lists them under ``DUPLICATE_SOURCES_KEY``, is found by
+        source filters for any of them, and survives the deletion of its own
+        source while one of them remains.
+
+        Args:
+            provenance: Docstore id of a kept chunk -> sources of its duplicates,
+                as collected by ``ChunkDeduplicator``. Ids of other stores are ignored.
+        """
+        with self._mutation_lock:
+            added: Dict[str, Dict[str, str]] = {}
+            with self._rw_lock.write():
+                for docstore_id, sources in provenance.items():
+                    doc = self.docstore.search(docstore_id)
+                    if not isinstance(doc, Document):
+                        continue
+                    held = _held_sources(doc)
+                    duplicates = held[1:] + sorted(set(sources) - set(held))
+                    if duplicates == held[1:]:
+                        continue
+                    self._replace_metadata(docstore_id, doc, {**doc.metadata, DUPLICATE_SOURCES_KEY: duplicates})
+                    for source in duplicates:
+                        added.setdefault(source, {})[_source_hash(doc, source)] = docstore_id
+                for source, chunks in added.items():
+                    self._set_source_chunks(source, {**self._source_chunks(source), **chunks})
+                self._invalidate_retrievals()
+
+    def upsert_source_chunks(self, source: str, chunks: List[Document]) -> Dict[str, int]:
+        """Replace the chunks of one source, embedding only new or changed chunks.
+
+        Args:
+            source: The ``metadata["source"]`` value the chunks belong to.
+            chunks: The complete new set of chunks for that source.
+
+        Returns:
+            Counts of added, unchanged and removed chunks.
+        """
+        with self._mutation_lock:
+            existing = self._source_chunks(source)
+            new_chunks = {chunk_hash(chunk): chunk for chunk in chunks}
+
+            to_add = [(h, chunk) for h, chunk in new_chunks.items() if h not in existing]
+            to_remove = [docstore_id for h, docstore_id in existing.items() if h not in new_chunks]
+
+            kept = {h: docstore_id for h, docstore_id in existing.items() if h in new_chunks}
+            if to_add:
+                vectors = self._embed_documents([chunk.page_content for _, chunk in to_add])
+                with self._rw_lock.write():
+                    ids = self._add_chunks([chunk for _, chunk in to_add], vectors)
+                kept.update({h: docstore_id for (h, _), docstore_id in zip(to_add, ids)})
+
+            with self._rw_lock.write():
+                orphaned = self._detach_source(source, to_remove)
+                self._tombstones.update(orphaned)
+                if self._sparse_index is not None:
+                    self._sparse_index.remove(orphaned)
+                if self._metadata_index is not None:
+                    self._metadata_index.remove(orphaned)
+                self._invalidate_retrievals()
+                self._set_source_chunks(source, kept)
+
+        self._maybe_compact()
+        return {
+            "added": len(to_add),
+            "unchanged": len(new_chunks) - len(to_add),
+            "removed": len(to_remove),
+        }
+
+    def delete_source(self, source: str) -> int:
+        """Remove every chunk of a source from search results.
+
+        Chunks that also stand for another source's dropped duplicates stay
+        searchable, re-homed to that source.
+
+        Args:
+            source: The ``metadata["source"]`` value to delete.
+
+        Returns:
+            Number of chunks removed (0 if the source is unknown).
+        """
+        with self._mutation_lock:
+            chunk_ids = self._source_chunks(source)
+            with self._rw_lock.write():
+                orphaned = self._detach_source(source, chunk_ids.values())
+                self._tombstones.update(orphaned)
+                if self._sparse_index is not None:
+                    self._sparse_index.remove(orphaned)
+                if self._metadata_index is not None:
+                    self._metadata_index.remove(orphaned)
+                self._invalidate_retrievals()
+                self._set_source_chunks(source, {})
+
+        self._maybe_compact()
+        return len(chunk_ids)
+
+    def live_documents(self) -> List[Document]:
+        """Return copies of every chunk that has not been deleted, with their ids."""
+        with self._rw_lock.read():
+            live = [
+                (docstore_id, self.docstore.search(docstore_id))
+                for docstore_id in self.index_to_docstore_id.values()
+                if docstore_id not in self._tombstones
+            ]
+            return [
+                Document(id=docstore_id, page_content=doc.page_content, metadata=dict(doc.metadata))
+                for docstore_id, doc in live
+                if isinstance(doc, Document)
+            ]
+
+    def sources(self) -> List[str]:
+        """Return the sources currently in the knowledge base."""
+        with self._mutation_lock:
+            if self._saved_sources is None:
+                return sorted(self._ensure_source_index())
+            changed = self._source_index or {}
+            return sorted(
+                {name for name in self._saved_sources[0] if name not in changed}
+                | {name for name, chunks in changed.items() if chunks}
+            )
+
+    # Compaction
+
+    def _needs_compaction(self) -> bool:
+        limit = min(COMPACTION_MAX_TOMBSTONES, COMPACTION_TOMBSTONE_RATIO * self.index.ntotal)
+        return len(self._tombstones) >= max(1, limit)
+
+    def _maybe_compact(self) -> None:
+        """Start a background compaction if tombstones have piled up."""
+        with self._mutation_lock:
+            if self._compacting or not self._needs_compaction():
+                return
+            self._compacting = True
+        threading.Thread(target=self.compact, name="faiss-compaction", daemon=True).start()
+
+    def compact(self) -> int:
+        """Physically remove tombstoned chunks from the index and docstore.
+
+        The index is copied and compacted while searches keep using the current
+        one; only the final swap blocks readers.
+
+        Returns:
+            Number of chunks removed.
+        """
+        try:
+            with self._mutation_lock:
+                tombstones = set(self._tombstones)
+                if not tombstones:
+                    return 0
+
+                keep_positions = [
+                    position for position, docstore_id in sorted(self.index_to_docstore_id.items())
+                    if docstore_id not in tombstones
+                ]
+
+                new_index = compact_index(self.index, keep_positions)
+                new_mapping = {
+                    new_position: self.index_to_docstore_id[old_position]
+                    for new_position, old_position in enumerate(keep_positions)
+                }
+                new_positions = np.full(self.index.ntotal, -1, dtype=np.int64)
+                new_positions[keep_positions] = np.arange(len(keep_positions), dtype=np.int64)
+
+                with self._rw_lock.write():
+                    self.index = new_index
+                    self.index_to_docstore_id = new_mapping
+                    self.docstore.delete(list(tombstones))
+                    self._tombstones -= tombstones
+                    if self._sparse_index is not None:
+                        self._sparse_index.renumber(new_positions)
+                    with self._metadata_index_lock:
+                        if self._metadata_index is not None:
+                            self._metadata_index.renumber(new_positions)
+                    self._invalidate_retrievals()
+
+            print(f"Compacted vector store: removed {len(tombstones)} chunks")
+            return len(tombstones)
+        finally:
+            self._compacting = False
+
+    # Persistence
+
+    def save_local(self, folder_path: str, index_name: str = "index") -> None:
+        """Save the index, docstore, BM25 index, source -> chunk id map and any rerank vectors.
+
+        The docstore is written as memory-mappable columns (see
+        ``save_docstore``) instead of LangChain's pickle.
+        """
+        with self._mutation_lock, self._rw_lock.read():
+            os.makedirs(folder_path, exist_ok=True)
+            faiss.write_index(self.index, os.path.join(folder_path, f"{index_name}.faiss"))
+            save_docstore(folder_path, self.docstore, self.index_to_docstore_id)
+            self._save_sources(folder_path)
+            if self._rerank_vectors is not None:
+                live_ids = [
+                    docstore_id for docstore_id in self.index_to_docstore_id.values()
+                    if docstore_id not in self._tombstones
+                ]
+                self._rerank_vectors.save(folder_path, live_ids)
+            if self._sparse_index is not None:
+                self._sparse_index.save(folder_path)
+
+    def _save_sources(self, folder_path: str) -> None:
+        """Write the source map as memory-mappable columns plus a JSON list of names and tombstones."""
+        source_index = {name: chunks for name, chunks in self._ensure_source_index().items() if chunks}
+        if self._saved_sources is not None and not self._source_index:
+            names, codes, hashes, ids = self._saved_sources
+        else:
+            names = sorted(source_index)
+            sizes = [len(source_index[name]) for name in names]
+            codes = np.repeat(np.arange(len(names), dtype=np.int32), sizes)
+            hashes = id_array([digest for name in names for digest in source_index[name]])
+            ids = id_array([docstore_id for name in names for docstore_id in source_index[name].values()])
+            if self._saved_sources is not None:
+                # Keep the saved rows of unchanged sources, renumbered into the merged name list
+                saved_names, saved_codes, saved_hashes, saved_ids = self._saved_sources
+                changed = names
+                names = sorted(changed + [name for name in saved_names if name not in self._source_index])
+                renumber = np.asarray(
+                    [-1 if name in self._source_index else bisect.bisect_left(names, name) for name in saved_names],
+                    dtype=np.int32,
+                )
+                rows = np.flatnonzero(renumber[saved_codes] >= 0)
+                changed_codes = np.asarray([bisect.bisect_left(names, name) for name in changed], dtype=np.int32)
+                codes = np.concatenate([renumber[saved_codes[rows]], np.repeat(changed_codes, sizes)])
+                hashes = np.concatenate([saved_hashes[rows], hashes])
+                ids = np.concatenate([saved_ids[rows], ids])
+        save_array(folder_path, SOURCE_CODES_FILENAME, codes)
+        save_array(folder_path, SOURCE_HASHES_FILENAME, hashes)
+        save_array(folder_path, SOURCE_IDS_FILENAME, ids)
+        with open(os.path.join(folder_path, SOURCES_FILENAME), "w", encoding="utf-8") as f:
+            json.dump(
+                {
+                    "version": SOURCES_FORMAT_VERSION,
+                    "sources": names,
+                    "tombstones": sorted(self._tombstones),
+                },
+                f,
+            )
+
+    @classmethod
+    def load_local(
+        cls,
+        folder_path: str,
+        embeddings: Embeddings,
+        index_name: str = "index",
+        *,
+        allow_dangerous_deserialization: bool = False,
+        **kwargs: Any,
+    ) -> "AWSVectorStore":
+        """Load a saved store with its source map and BM25 index, memory mapping any rerank vectors.
+
+        The docstore, source map and BM25 postings are memory mapped: chunks
+        are only read when a search returns them, and a source's chunk ids are
+        only read from the source map when that source is changed. Stores in LangChain's pickle format are only loaded if
+        ``allow_dangerous_deserialization`` is set. Stores saved without a
+        BM25 index get one built from their docstore.
+        """
+        if has_docstore(folder_path):
+            index = faiss.read_index(os.path.join(folder_path, f"{index_name}.faiss"))
+            docstore, index_to_docstore_id = load_docstore(folder_path)
+            store = cls(embeddings, index, docstore, index_to_docstore_id, **kwargs)
+        else:
+            store = super().load_local(
+                folder_path,
+                embeddings,
+                index_name,
+                allow_dangerous_deserialization=allow_dangerous_deserialization,
+                **kwargs,
+            )
+        sources_path = os.path.join(folder_path, SOURCES_FILENAME)
+        if os.path.exists(sources_path):
+            with open(sources_path, encoding="utf-8") as f:
+                state = json.load(f)
+            if state.get("version") == SOURCES_FORMAT_VERSION:
+                store._saved_sources = (
+                    state["sources"],
+                    load_array(os.path.join(folder_path, SOURCE_CODES_FILENAME)),
+                    load_array(os.path.join(folder_path, SOURCE_HASHES_FILENAME)),
+                    load_array(os.path.join(folder_path, SOURCE_IDS_FILENAME)),
+                )
+            else:
+                # Saved with the whole source map in JSON
+                store._source_index = state["sources"]
+            store._tombstones = set(state["tombstones"])
+        store._rerank_vectors = _RerankVectors.load(folder_path)
+        store._sparse_index = BM25Index.load(folder_path) or store._build_sparse_index()
+        return store
+
+
+def fuse_candidates(
+    dense: List[Tuple[Document, float]],
+    sparse: List[Tuple[Document, float]],
+    k: int,
+    rrf_k: int = DEFAULT_RRF_K,
+    score_threshold: Optional[float] = None,
+) -> List[Tuple[Document, float]]:
+    """Fuse ranked dense and BM25 hits by RRF and return the top ``k`` with RRF scores.
+
+    With ``score_threshold``, only hits whose fused score reaches it are kept.
+    """
+    docs = {doc.id: doc for doc, _ in dense + sparse}
+    fused = reciprocal_rank_fusion(
+        [[doc.id for doc, _ in dense], [doc.id for doc, _ in sparse]],
+        k=rrf_k,
+    )
+    if score_threshold is not None:
+        fused = [(docstore_id, score) for docstore_id, score in fused if score >= score_threshold]
+    return [(docs[docstore_id], score) for docstore_id, score in fused[:k]]
+
+
+def rrf_relevance_score_fn(rrf_k: int = DEFAULT_RRF_K) -> Callable[[float], float]:
+    """Return a map of fused RRF scores onto [0, 1], 1 meaning first in both rankings."""
+    best = 2.0 / (rrf_k + 1)
+    return lambda score: min(1.0, score / best)
+
+
+def _batched(items: Iterable[Any], size: int) -> Iterator[List[Any]]:
+    """Yield lists of up to ``size`` items from an iterable."""
+    iterator = iter(items)
+    while batch := list(islice(iterator, size)):
+        yield batch
+
+
+def group_by_source(documents: Iterable[Document]) -> Dict[str, List[Document]]:
+    """Group documents by their ``metadata["source"]``."""
+    groups: Dict[str, List[Document]] = {}
+    for doc in documents:
+        groups.setdefault(doc.metadata.get("source", "unknown"), []).append(doc)
+    return groups
@@ -0,0 +1,110 @@
+"""
+Tests for selectable FAISS index types.
+"""
+import faiss
+import numpy as np
+import pytest
+from langchain_community.docstore.document import Document
+
+import steps.index_generator as index_generator
+from steps.ann_index import IndexSpec, build_index, choose_index_kind, index_factory_string
+from steps.vector_store import AWSVectorStore
+from test_vector_store import CountingEmbeddings
+
+
+def test_auto_kind_follows_corpus_size():
+    assert choose_index_kind(1_000) == "flat"
+    assert choose_index_kind(100_000) == "hnsw"
+    assert choose_index_kind(1_000_000) == "ivf_flat"
+    assert choose_index_kind(10_000_000) == "ivf_pq"
+
+
+def test_factory_strings():
+    assert index_factory_string(IndexSpec(kind="ivf_flat", nlist=64), 10_000, 384) == "IVF64,Flat"
+    assert index_factory_string(IndexSpec(kind="ivf_pq", nlist=64), 10_000, 384) == "IVF64,PQ64x8"
+    assert index_factory_string(IndexSpec(kind="hnsw", hnsw_m=16), 10_000, 384) == "HNSW16"
+
+
+@pytest.mark.parametrize("kind", ["ivf_flat", "ivf_pq", "hnsw"])
+def test_trained_index_finds_exact_neighbour(kind):
+    rng = np.random.default_rng(0)
+    vectors = rng.standard_normal((3000, 32)).astype(np.float32)
+    index = build_index(vectors, IndexSpec(kind=kind, nlist=16, nprobe=16, pq_m=8, pq_bits=4))
+    index.add(vectors)
+
+    _, ids = index.search(vectors[:20], 1)
+
+    assert (ids[:, 0] == np.arange(20)).mean() >= 0.9
+
+
+def test_streamed_index_is_sized_for_the_whole_corpus():
+    docs = [Document(page_content=f"chunk {'a' * (i % 40)} {'b' * (i // 40)}") for i in range(120)]
+    spec = IndexSpec(train_sample=50)
+
+    store = AWSVectorStore.from_chunk_stream(iter(docs), CountingEmbeddings(), spec, num_chunks=20_000)
+    unsized = AWSVectorStore.from_chunk_stream(iter(docs), CountingEmbeddings(), spec, batch_size=10)
+    explicit = AWSVectorStore.from_chunk_stream(iter(docs), CountingEmbeddings(), spec.model_copy(update={"kind": "flat"}))
+
+    assert "HNSW" in type(store.index).__name__
+    assert faiss.extract_index_ivf(unsized.index).nlist == 1
+    assert store.index.ntotal == unsized.index.ntotal == explicit.index.ntotal == 120
+    assert unsized.similarity_search(docs[70].page_content, k=1)[0].page_content == docs[70].page_content
+
+
+def test_hnsw_store_compacts_by_rebuilding():
+    docs = [Document(page_content=text, metadata={"source": text}) for text in ("EC2", "S3", "IAM")]
+    store = AWSVectorStore.from_documents_with_spec(docs, CountingEmbeddings(), IndexSpec(kind="hnsw"))
+    store.delete_source("S3")
+    store.compact()
+
+    assert store.index.ntotal == 2
+    assert store.similarity_search("S3", k=1)[0].metadata["source"] != "S3"
+
+
+def test_int8_store_reranks_from_saved_vectors(tmp_path):
+    docs = [Document(page_content=text, metadata={"source": text}) for text in ("EC2", "S3", "IAM", "VPC")]
+    spec = IndexSpec(kind="flat", storage="int8", rerank=True)
+    store = AWSVectorStore.from_documents_with_spec(docs, CountingEmbeddings(), spec)
+    store.save_local(str(tmp_path))
+
+    loaded = AWSVectorStore.load_local(str(tmp_path), CountingEmbeddings(), allow_dangerous_deserialization=True)
+    hits = loaded.similarity_search_with_score_by_vector(CountingEmbeddings().embed_query("IAM"), k=2)
+
+    assert hits[0][0].metadata["source"] == "IAM"
+    assert hits[0][1] == pytest.approx(0.0, abs=1e-6)
+
+
+def test_built_store_is_served_from_the_saved_files(tmp_path, monkeypatch):
+    monkeypatch.setattr(index_generator, "get_embeddings", CountingEmbeddings)
+    docs = [Document(page_content=text, metadata={"source": text}) for text in ("EC2", "S3", "IAM", "VPC")]
+    spec = IndexSpec(kind="flat", storage="int8", rerank=True, hybrid=False)
+
+    store = index_generator.cached_index_generator(docs, str(tmp_path), index_spec=spec, dedup_threshold=None)
+
+    assert store._rerank_vectors._added == {}
+    assert isinstance(store._rerank_vectors._matrix, np.memmap)
+    assert store.similarity_search("IAM", k=1)[0].metadata["source"] == "IAM"
+
+
+@pytest.mark.parametrize("kind", ["flat", "ivf_flat", "ivf_pq", "hnsw"])
+def test_compaction_keeps_positions_consistent(kind):
+    words = ["alpha", "bravo", "charlie", "delta", "echo", "foxtrot", "golf", "hotel"]
+    docs = [
+        Document(
+            page_content=f"{words[i % 8]} {words[(i * 3) % 8]} {'q' * (i % 50)} {'x' * (i // 50)}",
+            metadata={"source": f"src{i % 10}"},
+        )
+        for i in range(2000)
+    ]
+    spec = IndexSpec(kind=kind, nlist=8, nprobe=8, pq_m=2, pq_bits=8, hybrid=False)
+    store = AWSVectorStore.from_documents_with_spec(docs, CountingEmbeddings(), spec)
+    for source in ["src1", "src3", "src4", "src6", "src7", "src9"]:
+        store.delete_source(source)
+    store.compact()
+    store.upsert_source_chunks("new", [Document(page_content="zulu zulu zulu", metadata={"source": "new"})])
+
+    assert store.index.ntotal == len(store.index_to_docstore_id) == 801
+    hits = store.similarity_search("alpha bravo", k=20)
+    assert len(hits) == 20
+    assert {doc.metadata["source"] for doc in hits} <= {"src0", "src2", "src5", "src8", "new"}
+    assert store.similarity_search("zulu zulu zulu", k=1)[0].metadata["source"] == "new"
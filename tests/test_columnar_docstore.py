@@ -0,0 +1,103 @@
+"""
+Tests for the memory-mapped columnar docstore.
+"""
+import os
+
+import pytest
+from langchain_community.docstore.document import Document
+from langchain_community.vectorstores import FAISS
+
+from materializers.faiss_materializer import load_vector_store, save_vector_store
+from steps.ann_index import IndexSpec
+from steps.columnar_docstore import ColumnarDocstore, PositionIds
+from steps.vector_store import AWSVectorStore, chunk_hash
+from test_metadata_index import make_docs
+from test_vector_store import CountingEmbeddings
+
+SPEC = IndexSpec(kind="flat", hybrid=False)
+
+
+def test_saved_store_loads_lazily_with_identical_results(tmp_path):
+    embeddings = CountingEmbeddings()
+    store = AWSVectorStore.from_documents_with_spec(make_docs(), embeddings, SPEC)
+    path = str(tmp_path / "index")
+    save_vector_store(store, path)
+
+    loaded = load_vector_store(path, embeddings=embeddings, index_spec=SPEC)
+
+    assert not os.path.exists(os.path.join(path, "index.pkl"))
+    assert isinstance(loaded.docstore, ColumnarDocstore)
+    assert isinstance(loaded.index_to_docstore_id, PositionIds)
+    assert len(loaded.index_to_docstore_id) == store.index.ntotal
+    for query in ["alpha bravo buckets", "kilo instances"]:
+        expected = store.similarity_search_with_score(query, k=5)
+        found = loaded.similarity_search_with_score(query, k=5)
+        assert [(doc.page_content, doc.metadata, score) for doc, score in found] == [
+            (doc.page_content, doc.metadata, score) for doc, score in expected
+        ]
+
+
+def test_changes_after_loading_survive_a_save_in_place(tmp_path):
+    embeddings = CountingEmbeddings()
+    store = FAISS.from_documents(
+        [
+            Document(page_content="EC2 instances", metadata={"source": "ec2", "category": "compute"}),
+            Document(page_content="S3 buckets", metadata={"source": "s3"}),
+        ],
+        embeddings,
+    )
+    path = str(tmp_path / "index")
+    AWSVectorStore(embeddings, store.index, store.docstore, store.index_to_docstore_id).save_local(path)
+    loaded = load_vector_store(path, embeddings=embeddings)
+
+    loaded.upsert_source_chunks("lambda", [Document(page_content="Lambda functions", metadata={"source": "lambda"})])
+    loaded.delete_source("s3")
+    loaded.compact()
+    loaded.save_local(path)
+    reloaded = load_vector_store(path, embeddings=embeddings)
+
+    assert reloaded.sources() == ["ec2", "lambda"]
+    assert [doc.metadata for doc in reloaded.similarity_search("EC2 instances", k=2)] == [
+        {"source": "ec2", "category": "compute"},
+        {"source": "lambda"},
+    ]
+
+
+def test_source_map_and_bm25_postings_load_lazily(tmp_path):
+    embeddings = CountingEmbeddings()
+    store = AWSVectorStore.from_documents_with_spec(make_docs(), embeddings, IndexSpec(kind="flat"))
+    path = str(tmp_path / "index")
+    save_vector_store(store, path)
+
+    loaded = load_vector_store(path, embeddings=embeddings, index_spec=IndexSpec(kind="flat"))
+
+    assert loaded.sources() == store.sources()
+    assert loaded._source_index is None
+    assert loaded._sparse_index._saved_postings.filename is not None
+    assert [doc.page_content for doc in loaded.similarity_search("kilo instances", k=3)] == [
+        doc.page_content for doc in store.similarity_search("kilo instances", k=3)
+    ]
+
+    source, deleted = store.sources()[:2]
+    loaded.upsert_source_chunks(source, [Document(page_content="zulu yankee", metadata={"source": source})])
+    loaded.delete_source(deleted)
+    # Only the changed sources are decoded from the mapped columns
+    assert loaded._source_index.keys() == {source, deleted}
+    loaded.save_local(path)
+    reloaded = load_vector_store(path, embeddings=embeddings, index_spec=IndexSpec(kind="flat"))
+
+    assert reloaded.sources() == [name for name in store.sources() if name != deleted]
+    assert all(reloaded._source_chunks(name) == loaded._source_chunks(name) for name in store.sources())
+    assert list(reloaded._source_chunks(source)) == [
+        chunk_hash(Document(page_content="zulu yankee", metadata={"source": source}))
+    ]
+    assert [doc.page_content for doc in reloaded.similarity_search("zulu yankee", k=1)] == ["zulu yankee"]
+
+
+def test_pickled_stores_are_not_deserialized(tmp_path):
+    embeddings = CountingEmbeddings()
+    path = str(tmp_path / "legacy")
+    FAISS.from_texts(["EC2 instances"], embeddings).save_local(path)
+
+    with pytest.raises(ValueError, match="deserialization"):
+        load_vector_store(path, embeddings=embeddings)
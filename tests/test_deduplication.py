@@ -0,0 +1,72 @@
+"""
+Tests for near-duplicate chunk elimination.
+"""
+from langchain_community.docstore.document import Document
+from langchain_community.docstore.in_memory import InMemoryDocstore
+
+from materializers.faiss_materializer import load_vector_store, save_vector_store
+from steps.ann_index import IndexSpec
+from steps.deduplication import DUPLICATE_SOURCES_KEY, ChunkDeduplicator
+from steps.vector_store import AWSVectorStore
+from test_vector_store import CountingEmbeddings
+
+BLURB = " ".join(
+    f"Amazon EC2 feature {i} provides secure and resizable compute capacity for developers."
+    for i in range(12)
+)
+
+
+def chunk(text, source):
+    return Document(page_content=text, metadata={"source": source})
+
+
+def test_exact_and_near_duplicates_are_dropped():
+    deduplicator = ChunkDeduplicator(threshold=0.8)
+    chunks = [
+        chunk(BLURB, "ec2"),
+        chunk(BLURB.upper(), "overview"),
+        chunk(BLURB.replace("feature 5", "capability 5"), "pricing"),
+        chunk("Amazon S3 is object storage built to retrieve any amount of data.", "s3"),
+    ]
+
+    kept = list(deduplicator.deduplicate(chunks))
+
+    assert [doc.metadata["source"] for doc in kept] == ["ec2", "s3"]
+    assert deduplicator.exact_duplicates == 1
+    assert deduplicator.near_duplicates == 1
+    assert deduplicator.provenance == {kept[0].id: ["overview", "pricing"]}
+
+
+def test_provenance_is_written_to_kept_chunks():
+    deduplicator = ChunkDeduplicator()
+    kept = list(deduplicator.deduplicate([chunk(BLURB, "ec2"), chunk(BLURB, "overview")]))
+    docstore = InMemoryDocstore({doc.id: doc for doc in kept})
+
+    deduplicator.apply_provenance(docstore)
+
+    assert docstore.search(kept[0].id).metadata[DUPLICATE_SOURCES_KEY] == ["overview"]
+
+
+def test_duplicate_sources_survive_deleting_the_kept_source(tmp_path):
+    deduplicator = ChunkDeduplicator()
+    kept = list(deduplicator.deduplicate([
+        chunk(BLURB, "ec2"),
+        chunk(BLURB, "overview"),
+        chunk("Amazon S3 is object storage built to retrieve any amount of data.", "s3"),
+    ]))
+    embeddings = CountingEmbeddings()
+    store = AWSVectorStore.from_documents_with_spec(kept, embeddings, IndexSpec(kind="flat"))
+    store.record_duplicate_sources(deduplicator.provenance)
+    path = str(tmp_path / "index")
+    save_vector_store(store, path)
+    loaded = load_vector_store(path, embeddings=embeddings, index_spec=IndexSpec(kind="flat"))
+
+    assert [doc.page_content for doc in store.similarity_search(BLURB, k=2, filters={"source": ["overview"]})] == [BLURB]
+    for target in (store, loaded):
+        target.delete_source("ec2")
+        found = target.similarity_search(BLURB, k=2, filters={"source": ["overview"]})
+        assert [doc.metadata for doc in found] == [{"source": "overview"}]
+        assert target.sources() == ["overview", "s3"]
+
+    store.upsert_source_chunks("overview", [])
+    assert store.similarity_search(BLURB, k=2, filters={"source": ["overview"]}) == []
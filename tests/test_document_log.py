@@ -0,0 +1,60 @@
+"""
+Tests for replaying API knowledge base changes onto rebuilt snapshots.
+"""
+from langchain_community.docstore.document import Document
+
+from api.agent_service import AgentService
+from api.document_log import DocumentLog
+from api.snapshot import SnapshotManager
+from steps.ann_index import IndexSpec
+from steps.vector_store import AWSVectorStore
+from test_snapshot import make_snapshot
+from test_vector_store import CountingEmbeddings
+
+CONFIGURED = [
+    Document(page_content="EC2 instances", metadata={"source": "ec2"}),
+    Document(page_content="S3 buckets", metadata={"source": "s3"}),
+]
+
+
+def knowledge_base_snapshot(manager: SnapshotManager, name: str):
+    snapshot = make_snapshot(manager, name)
+    snapshot.vector_store = AWSVectorStore.from_documents_with_spec(
+        CONFIGURED, CountingEmbeddings(), IndexSpec(kind="flat")
+    )
+    return snapshot
+
+
+def test_log_keeps_the_last_change_of_each_source(tmp_path):
+    log = DocumentLog(str(tmp_path / "log.jsonl"))
+    log.record_upsert([Document(page_content="Lambda functions", metadata={"source": "lambda"})])
+    log.record_delete("s3")
+    log.record_upsert([Document(page_content="Lambda layers", metadata={"source": "lambda"})])
+    log.compact()
+
+    changes = log.changes()
+
+    assert list(changes) == ["s3", "lambda"]
+    assert changes["s3"] is None
+    assert [doc.page_content for doc in changes["lambda"]] == ["Lambda layers"]
+    assert len((tmp_path / "log.jsonl").read_text().splitlines()) == 2
+
+
+def test_api_changes_survive_rebuilds_and_rollbacks(monkeypatch, tmp_path):
+    service = AgentService()
+    manager = SnapshotManager(history=1)
+    monkeypatch.setattr(service, "_snapshots", manager)
+    monkeypatch.setattr(service, "document_log", DocumentLog(str(tmp_path / "log.jsonl")))
+    manager.publish(knowledge_base_snapshot(manager, "v1"))
+
+    service.upsert_documents([Document(page_content="Lambda functions", metadata={"source": "lambda"})])
+    service.delete_documents("s3")
+    monkeypatch.setattr(service, "_build_snapshot", lambda: knowledge_base_snapshot(manager, "v2"))
+    service.initialize_agent(force_reinit=True)
+
+    assert service.vector_store.sources() == ["ec2", "lambda"]
+
+    service.upsert_documents([Document(page_content="IAM roles", metadata={"source": "iam"})])
+    service.rollback_agent()
+
+    assert service.vector_store.sources() == ["ec2", "iam", "lambda"]
@@ -0,0 +1,74 @@
+"""
+Tests for the on-disk chunk embedding cache.
+"""
+import multiprocessing
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+from steps.embedding_cache import CachedEmbeddings, EmbeddingCache
+
+
+class CountingEmbeddings(Embeddings):
+    """Deterministic bag-of-letters embedding that counts embedded texts."""
+
+    def __init__(self):
+        self.embedded = 0
+
+    def embed_query(self, text):
+        text = text.lower()
+        return [text.count(letter) + 0.01 for letter in "abcdefghijklmnopqrstuvwxyz"]
+
+    def embed_documents(self, texts):
+        self.embedded += len(texts)
+        return [self.embed_query(text) for text in texts]
+
+
+def test_only_misses_are_embedded(tmp_path):
+    embeddings = CountingEmbeddings()
+    cached = CachedEmbeddings(embeddings, EmbeddingCache(str(tmp_path)))
+
+    first = cached.embed_documents(["EC2 instances", "S3 buckets"])
+    second = cached.embed_documents(["S3 buckets", "Lambda functions", "EC2 instances"])
+
+    assert embeddings.embedded == 3
+    assert np.allclose(second[0], first[1], atol=1e-2)
+    assert np.allclose(second[2], first[0], atol=1e-2)
+    assert cached.cache.stats()["hits"] == 2
+
+
+def test_cache_persists_across_instances(tmp_path):
+    CachedEmbeddings(CountingEmbeddings(), EmbeddingCache(str(tmp_path))).embed_documents(["S3 buckets"])
+
+    embeddings = CountingEmbeddings()
+    cache = EmbeddingCache(str(tmp_path))
+    CachedEmbeddings(embeddings, cache).embed_documents(["S3 buckets"])
+
+    stats = cache.stats()
+    assert embeddings.embedded == 0
+    assert stats["hit_rate"] == 1.0
+    assert stats["bytes"] > 0
+
+
+def write_batches(path, worker):
+    cache = EmbeddingCache(path)
+    for batch in range(20):
+        values = [worker * 200 + batch * 10 + i for i in range(10)]
+        cache.put_many("model", [f"{worker}-{value}" for value in values], [[value] * 4 for value in values])
+    cache.close()
+
+
+def test_concurrent_processes_keep_rows_consistent(tmp_path):
+    context = multiprocessing.get_context("fork")
+    workers = [context.Process(target=write_batches, args=(str(tmp_path), worker)) for worker in range(4)]
+    for process in workers:
+        process.start()
+    for process in workers:
+        process.join()
+
+    cache = EmbeddingCache(str(tmp_path))
+    keys = [f"{worker}-{worker * 200 + n}" for worker in range(4) for n in range(200)]
+    vectors = cache.get_many("model", keys)
+
+    assert all(process.exitcode == 0 for process in workers)
+    assert [vector[0] for vector in vectors] == [float(key.split("-")[1]) for key in keys]
@@ -0,0 +1,52 @@
+"""
+Tests for the batched embedding engine.
+"""
+import pytest
+from langchain_core.embeddings import Embeddings
+
+import steps.embedding_engine as embedding_engine
+from steps import embeddings as embeddings_module
+from steps.embedding_engine import BatchedEmbeddings, length_buckets
+from steps.embeddings import EmbeddingRegistry
+
+
+class RecordingEmbeddings(Embeddings):
+    """Embeds a text as its length and records the batches it was called with."""
+
+    def __init__(self):
+        self.batches = []
+
+    def embed_query(self, text):
+        return [float(len(text))]
+
+    def embed_documents(self, texts):
+        self.batches.append(list(texts))
+        return [self.embed_query(text) for text in texts]
+
+
+def test_length_buckets_group_similar_lengths():
+    texts = ["aaaa", "a", "aaa", "aa"]
+
+    assert length_buckets(texts, 2) == [[1, 3], [2, 0]]
+
+
+def test_vectors_keep_input_order():
+    embeddings = RecordingEmbeddings()
+    texts = ["x" * n for n in (5, 1, 4, 2, 3)]
+
+    vectors = BatchedEmbeddings(embeddings, batch_size=2, num_workers=0).embed_documents(texts)
+
+    assert vectors == [[5.0], [1.0], [4.0], [2.0], [3.0]]
+    assert [len(batch) for batch in embeddings.batches] == [2, 2, 1]
+
+
+def test_workers_load_the_wrapped_model(monkeypatch):
+    registry = EmbeddingRegistry()
+    monkeypatch.setattr(embeddings_module, "load_embeddings", lambda key: RecordingEmbeddings())
+    monkeypatch.setattr(embeddings_module, "embedding_registry", registry)
+    monkeypatch.setattr(embedding_engine, "embedding_registry", registry)
+    model = registry.get("huggingface:other-model")
+
+    assert BatchedEmbeddings(model, num_workers=2).factory() is model
+    with pytest.raises(ValueError, match="factory"):
+        BatchedEmbeddings(RecordingEmbeddings(), num_workers=2)
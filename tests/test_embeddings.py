@@ -0,0 +1,24 @@
+"""
+Tests for the process-wide embedding model registry.
+"""
+import threading
+
+from steps import embeddings as embeddings_module
+from steps.embeddings import EmbeddingRegistry
+
+
+def test_model_is_loaded_once(monkeypatch):
+    loads = []
+    monkeypatch.setattr(embeddings_module, "load_embeddings", lambda key: loads.append(key) or object())
+    registry = EmbeddingRegistry()
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(registry.get("fake"))) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert loads == ["fake"]
+    assert len({id(model) for model in results}) == 1
+    assert [m["model"] for m in registry.metrics()] == ["fake"]
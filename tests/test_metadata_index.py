@@ -0,0 +1,143 @@
+"""
+Tests for metadata-filtered retrieval.
+"""
+import asyncio
+
+import pytest
+from langchain_community.docstore.document import Document
+
+from materializers.faiss_materializer import load_vector_store, save_vector_store
+from steps.ann_index import IndexSpec
+from steps.metadata_index import MetadataIndex, normalize_filters, use_filters
+import steps.vector_store as vector_store
+from steps.vector_store import AWSVectorStore
+from test_vector_store import CountingEmbeddings
+
+
+WORDS = ["alpha", "bravo", "charlie", "delta", "echo", "foxtrot", "golf", "hotel", "india", "juliet", "kilo"]
+
+
+def make_docs(count=400):
+    return [
+        Document(
+            page_content=f"{WORDS[i % 7]} {WORDS[i % 11]} {WORDS[i % 3]} about {'buckets' if i % 5 == 0 else 'instances'}",
+            metadata={"source": f"doc{i % 4}", "category": "storage" if i % 5 == 0 else "compute"},
+        )
+        for i in range(count)
+    ]
+
+
+def test_normalize_filters():
+    assert normalize_filters({"source": "a", "category": ["x", "y", "x"]}) == {
+        "category": ["x", "y"],
+        "source": ["a"],
+    }
+    assert normalize_filters({}) is None
+    with pytest.raises(ValueError):
+        normalize_filters({"tenant": "a"})
+
+
+def test_mask_ands_fields_and_ors_values():
+    index = MetadataIndex()
+    index.add(
+        range(4),
+        ["a", "b", "c", "d"],
+        [
+            {"source": "s1", "category": "compute"},
+            {"source": "s2", "category": "compute"},
+            {"source": "s1", "category": "storage"},
+            {"source": "s3"},
+        ],
+    )
+    index.remove(["b"])
+
+    mask = index.mask({"category": ["compute", "storage"], "source": ["s1", "s2"]}, 4)
+
+    assert mask.tolist() == [True, False, True, False]
+    assert index.values("source") == ["s1", "s2", "s3"]
+
+
+@pytest.mark.parametrize("kind", ["flat", "hnsw", "ivf_flat"])
+def test_filtered_search_returns_k_matches(kind):
+    spec = IndexSpec(kind=kind, nlist=8, storage="int8" if kind == "flat" else "float32", hybrid=False)
+    store = AWSVectorStore.from_documents_with_spec(make_docs(), CountingEmbeddings(), spec)
+
+    # Only 1 in 10 chunks matches, so a post-filtered global top-k would come back short
+    hits = store.similarity_search("instances", k=10, filters={"category": "storage", "source": ["doc0", "doc2"]})
+
+    assert len(hits) == 10
+    assert all(doc.metadata["category"] == "storage" for doc in hits)
+    assert {doc.metadata["source"] for doc in hits} <= {"doc0", "doc2"}
+
+
+def test_selective_filter_on_hnsw_scores_matches_exactly(monkeypatch):
+    filters = {"category": "storage", "source": "doc0"}
+    exact = AWSVectorStore.from_documents_with_spec(make_docs(), CountingEmbeddings(), IndexSpec(kind="flat", hybrid=False))
+    store = AWSVectorStore.from_documents_with_spec(make_docs(), CountingEmbeddings(), IndexSpec(kind="hnsw", hybrid=False))
+    scored = []
+    score_positions = store._score_positions
+    monkeypatch.setattr(store, "_score_positions", lambda *args: scored.append(score_positions(*args)) or scored[-1])
+
+    hits = store.similarity_search_with_score("kilo buckets", k=5, filters=filters)
+
+    assert len(scored) == 1 and scored[0] is not None
+    assert [(doc.page_content, score) for doc, score in hits] == [
+        (doc.page_content, pytest.approx(score)) for doc, score in exact.similarity_search_with_score(
+            "kilo buckets", k=5, filters=filters
+        )
+    ]
+    monkeypatch.setattr(vector_store, "FILTER_EXACT_MAX_MATCHES", 0)
+    assert [doc.page_content for doc, _ in store.similarity_search_with_score("kilo buckets", k=5, filters=filters)] == [
+        doc.page_content for doc, _ in hits
+    ]
+    assert len(scored) == 1
+
+
+def test_filters_apply_through_context_and_skip_deleted_chunks():
+    store = AWSVectorStore.from_documents_with_spec(make_docs(), CountingEmbeddings(), IndexSpec(kind="flat"))
+    store.delete_source("doc0")
+
+    with use_filters({"category": ["storage"]}):
+        hits = asyncio.run(store.asimilarity_search("buckets", k=50))
+
+    assert len(hits) == 50
+    assert {doc.metadata["source"] for doc in hits} == {"doc1", "doc2", "doc3"}
+    assert store.similarity_search("buckets", k=5, filters={"source": "doc0"}) == []
+
+
+def test_loaded_store_indexes_metadata_from_columns(tmp_path):
+    embeddings = CountingEmbeddings()
+    store = AWSVectorStore.from_documents_with_spec(make_docs(), embeddings, IndexSpec(kind="flat"))
+    store.delete_source("doc3")
+    path = str(tmp_path / "index")
+    save_vector_store(store, path)
+    loaded = load_vector_store(path, embeddings=embeddings)
+
+    index = loaded._ensure_metadata_index()
+    # Saved chunks are looked up in the mapped id column, not a copy of it
+    assert index._saved_ids is loaded.index_to_docstore_id.saved_ids()
+    loaded.delete_source("doc1")
+    loaded.upsert_source_chunks("extra", [Document(page_content="kilo buckets", metadata={"source": "extra", "category": "storage"})])
+    loaded.compact()
+    # Saved chunks are still found at the positions compaction moved them to
+    loaded.delete_source("doc2")
+    loaded.compact()
+
+    expected = MetadataIndex.build(dict(loaded.index_to_docstore_id), loaded.docstore)
+    size = loaded.index.ntotal
+    for filters in [{"category": ["storage"]}, {"source": ["doc0", "extra"]}, {"source": ["doc1", "doc2", "doc3"]}]:
+        assert index.mask(filters, size).tolist() == expected.mask(filters, size).tolist()
+    assert index.mask({"source": ["extra"]}, size).sum() == 1
+    assert index.mask({"source": ["doc0"]}, size).sum() == 100
+
+
+def test_filtered_hybrid_search_survives_compaction():
+    store = AWSVectorStore.from_documents_with_spec(make_docs(), CountingEmbeddings(), IndexSpec(kind="flat"))
+    store.similarity_search("buckets", k=1, filters={"category": "storage"})
+    store.delete_source("doc0")
+    store.compact()
+
+    hits = store.similarity_search("kilo buckets", k=20, filters={"category": "storage", "source": "doc2"})
+
+    assert len(hits) == 20
+    assert all(doc.metadata["category"] == "storage" and doc.metadata["source"] == "doc2" for doc in hits)
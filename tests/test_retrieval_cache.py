@@ -0,0 +1,75 @@
+"""
+Tests for the retrieval result cache.
+"""
+from langchain_community.docstore.document import Document
+
+from steps.ann_index import IndexSpec
+import numpy as np
+
+from steps.retrieval_cache import RetrievalCache
+from steps.vector_store import AWSVectorStore
+from test_vector_store import CountingEmbeddings
+
+
+def make_store():
+    store = AWSVectorStore.from_documents_with_spec(
+        [
+            Document(page_content="EC2 instances", metadata={"source": "ec2", "category": "compute"}),
+            Document(page_content="S3 buckets", metadata={"source": "s3", "category": "storage"}),
+            Document(page_content="Lambda functions", metadata={"source": "lambda", "category": "compute"}),
+        ],
+        CountingEmbeddings(),
+        IndexSpec(kind="flat"),
+    )
+    store.retrieval_cache = RetrievalCache(max_entries=2)
+    return store
+
+
+def test_near_duplicate_query_vectors_share_cached_results():
+    cache = RetrievalCache()
+    rng = np.random.default_rng(0)
+    query = rng.normal(size=384)
+    # A per-component grid splits vectors this close; the cosine threshold does not
+    near_duplicate = query + rng.normal(scale=0.01, size=384)
+    cache.put(cache.key(query, k=4), [], 0.1, cache.generation)
+
+    assert cache.get(cache.key(near_duplicate, k=4)) == []
+    assert cache.get(cache.key(2 * near_duplicate, k=4)) == []
+    assert cache.get(cache.key(near_duplicate, k=5)) is None
+    assert cache.get(cache.key(rng.normal(size=384), k=4)) is None
+    assert (cache.hits, cache.misses) == (2, 2)
+
+
+def test_repeated_search_is_served_from_cache():
+    store = make_store()
+
+    first = store.similarity_search_with_score("lambda functions", k=2)
+    # Same letters, so the same embedding
+    second = store.similarity_search_with_score("Lambda Functions", k=2)
+    store.similarity_search_with_score("lambda functions", k=1)
+    store.similarity_search_with_score("lambda functions", k=2, filters={"category": "compute"})
+
+    stats = store.retrieval_cache.stats()
+    assert second == first
+    assert (stats["hits"], stats["misses"], stats["entries"]) == (1, 3, 2)
+
+
+def test_mutation_invalidates_cached_results():
+    store = make_store()
+    assert store.similarity_search("S3 buckets", k=1)[0].metadata["source"] == "s3"
+
+    store.delete_source("s3")
+
+    assert store.similarity_search("S3 buckets", k=1)[0].metadata["source"] != "s3"
+    assert store.retrieval_cache.stats()["hits"] == 0
+
+
+def test_stale_result_is_not_stored_after_clear():
+    cache = RetrievalCache()
+    key = cache.key([1.0, 0.0], k=4)
+    generation = cache.generation
+
+    cache.clear()
+    cache.put(key, [], 0.1, generation)
+
+    assert cache.get(key) is None
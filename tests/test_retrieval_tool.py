@@ -0,0 +1,74 @@
+"""
+Tests for the retrieval-only knowledge base tool.
+"""
+import json
+
+from langchain_community.docstore.document import Document
+from langchain_core.language_models.fake_chat_models import FakeListChatModel
+
+import steps.agent_creator as agent_creator
+from agent.retrieval_tool import KnowledgeBaseRetrievalTool
+from steps.agent_creator import AgentParameters, aws_agent_creator
+from steps.metadata_index import use_filters
+from steps.vector_store import AWSVectorStore
+from test_vector_store import CountingEmbeddings
+
+
+class CountingChatModel(FakeListChatModel):
+    """Scripted chat model that counts its generations."""
+
+    calls: int = 0
+
+    def _call(self, *args, **kwargs):
+        self.calls += 1
+        return super()._call(*args, **kwargs)
+
+
+def build_store():
+    return AWSVectorStore.from_documents(
+        [
+            Document(page_content="EC2 instances", metadata={"source": "ec2", "category": "compute"}),
+            Document(page_content="S3 buckets", metadata={"source": "s3", "category": "storage"}),
+            Document(page_content="Lambda functions", metadata={"source": "lambda", "category": "compute"}),
+        ],
+        CountingEmbeddings(),
+    )
+
+
+def blob(action: str, action_input: str) -> str:
+    return "```json\n" + json.dumps({"action": action, "action_input": action_input}) + "\n```"
+
+
+def test_tool_returns_passages_with_sources_and_honours_filters():
+    tool = KnowledgeBaseRetrievalTool(name="search", description="search", vectorstore=build_store(), k=2)
+
+    with use_filters({"category": ["compute"]}):
+        passages = tool.invoke("EC2 instances")
+
+    assert passages.startswith("[1] (source: ec2)\nEC2 instances")
+    assert "(source: lambda)" in passages
+    assert "s3" not in passages
+
+
+def test_retrieval_mode_saves_one_llm_call_per_lookup(monkeypatch):
+    def run(tool_mode: str, responses):
+        llm = CountingChatModel(responses=responses)
+        monkeypatch.setattr(agent_creator, "get_llm_instance", lambda config: llm)
+        _, _, executor = aws_agent_creator(
+            build_store(), AgentParameters(tool_mode=tool_mode), shared_memory=False
+        )
+        output = executor.invoke({"input": "What is EC2?", "chat_history": []})["output"]
+        return output, llm.calls
+
+    qa_output, qa_calls = run("qa", [
+        blob("aws-support-qa-tool", "What is EC2?"),
+        "EC2 provides virtual servers.",
+        blob("Final Answer", "EC2 provides virtual servers."),
+    ])
+    retrieval_output, retrieval_calls = run("retrieval", [
+        blob("aws-support-search-tool", "EC2"),
+        blob("Final Answer", "EC2 provides virtual servers."),
+    ])
+
+    assert qa_output == retrieval_output == "EC2 provides virtual servers."
+    assert (qa_calls, retrieval_calls) == (3, 2)
@@ -0,0 +1,72 @@
+"""
+Tests for the semantic answer cache.
+"""
+from langchain_core.embeddings import Embeddings
+
+from api.agent_service import AgentService
+from api.semantic_cache import SemanticCache
+from api.snapshot import SnapshotManager
+from test_snapshot import make_snapshot
+
+
+class KeywordEmbeddings(Embeddings):
+    """Tiny deterministic embedding: one dimension per known keyword."""
+
+    KEYWORDS = ["ec2", "s3", "lambda", "iam"]
+
+    def embed_query(self, text):
+        text = text.lower()
+        return [float(word in text) + 1e-3 for word in self.KEYWORDS]
+
+    def embed_documents(self, texts):
+        return [self.embed_query(text) for text in texts]
+
+
+def test_similar_query_hits():
+    cache = SemanticCache(KeywordEmbeddings(), threshold=0.95)
+    cache.store(cache.embed("What is EC2?"), {"response": "EC2 is compute."})
+
+    assert cache.lookup(cache.embed("what is ec2"))["response"] == "EC2 is compute."
+    assert cache.lookup(cache.embed("What is S3?")) is None
+    assert cache.stats()["hits"] == 1
+    assert cache.stats()["misses"] == 1
+
+
+def test_namespace_must_match():
+    cache = SemanticCache(KeywordEmbeddings())
+    cache.store(cache.embed("EC2"), {"response": "a"}, namespace="sources=True")
+
+    assert cache.lookup(cache.embed("EC2"), namespace="sources=False") is None
+
+
+def test_lru_eviction_and_clear():
+    cache = SemanticCache(KeywordEmbeddings(), max_entries=1)
+    cache.store(cache.embed("EC2"), {"response": "ec2"})
+    cache.store(cache.embed("S3"), {"response": "s3"})
+
+    assert cache.lookup(cache.embed("EC2")) is None
+    assert cache.lookup(cache.embed("S3"))["response"] == "s3"
+
+    cache.clear()
+    assert cache.stats()["entries"] == 0
+    assert cache.lookup(cache.embed("S3")) is None
+
+
+def test_follow_up_questions_bypass_the_cache(monkeypatch):
+    service = AgentService()
+    manager = SnapshotManager()
+    monkeypatch.setattr(service, "_snapshots", manager)
+    snapshot = make_snapshot(manager, "v1")
+    snapshot.executor.delay = 0
+    snapshot.semantic_cache = SemanticCache(KeywordEmbeddings())
+    manager.publish(snapshot)
+    service.sessions.clear()
+    service.sessions.save_turn("alice", "I use Lambda", "Noted.")
+
+    first = service.query_agent("How much does it cost?", session_id="carol")
+    follow_up = service.query_agent("How much does it cost?", session_id="alice")
+    repeat = service.query_agent("How much does it cost?", session_id="dave")
+    service.sessions.clear()
+
+    assert (first["cached"], follow_up["cached"], repeat["cached"]) == (False, False, True)
+    assert snapshot.semantic_cache.stats()["entries"] == 1
@@ -0,0 +1,55 @@
+"""
+Tests for the per-session conversation memory store.
+"""
+from api.auth import scoped_session_id
+from api.session_memory import SessionMemoryStore
+
+
+def test_sessions_are_isolated():
+    store = SessionMemoryStore()
+    store.save_turn("alice", "What is EC2?", "EC2 is compute.")
+    store.save_turn("bob", "What is S3?", "S3 is storage.")
+
+    alice = [m.content for m in store.load_history("alice")]
+    bob = [m.content for m in store.load_history("bob")]
+
+    assert alice == ["What is EC2?", "EC2 is compute."]
+    assert bob == ["What is S3?", "S3 is storage."]
+
+
+def test_session_ids_are_scoped_to_the_api_key():
+    alice = scoped_session_id("alice-key-123", "shared")
+    bob = scoped_session_id("bob-key-456", "shared")
+
+    assert alice != bob
+    assert alice == scoped_session_id("alice-key-123", " shared ")
+    assert "alice-key-123" not in scoped_session_id("alice-key-123")
+    assert scoped_session_id("bob-key-456", "alice-key-123") != scoped_session_id("alice-key-123")
+
+
+def test_turn_cap_bounds_history():
+    store = SessionMemoryStore(max_turns=2)
+    for i in range(5):
+        store.save_turn("s", f"question {i}", f"answer {i}")
+
+    history = [m.content for m in store.load_history("s")]
+    assert history == ["question 3", "answer 3", "question 4", "answer 4"]
+    assert len(store.get("s").chat_memory.messages) == 4
+
+
+def test_lru_eviction():
+    store = SessionMemoryStore(max_sessions=2)
+    store.get("a")
+    store.get("b")
+    store.get("a")  # "b" is now least recently used
+    store.get("c")
+
+    assert len(store) == 2
+    assert store.evictions == 1
+    assert store.load_history("a") == []
+
+
+def test_idle_sessions_expire():
+    store = SessionMemoryStore(ttl_seconds=0)
+    store.save_turn("s", "q", "a")
+    assert len(store) == 0
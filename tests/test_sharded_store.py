@@ -0,0 +1,85 @@
+"""
+Tests for the sharded vector store.
+"""
+import json
+import os
+
+from langchain_community.docstore.document import Document
+
+from materializers.faiss_materializer import load_vector_store, save_vector_store
+from steps.ann_index import IndexSpec
+from steps.sharded_store import MANIFEST_FILENAME, ShardedVectorStore
+from steps.vector_store import AWSVectorStore
+from test_metadata_index import make_docs
+from test_vector_store import CountingEmbeddings
+
+SPEC = IndexSpec(kind="flat", hybrid=False)
+
+
+def test_scatter_gather_matches_a_single_index():
+    embeddings = CountingEmbeddings()
+    single = AWSVectorStore.from_documents_with_spec(make_docs(), embeddings, SPEC)
+    sharded = ShardedVectorStore.from_chunk_stream(make_docs(), embeddings, SPEC, num_shards=3)
+
+    assert len(sharded.shards) > 1
+    assert sharded.ntotal == single.index.ntotal
+    for query in ["alpha bravo buckets", "kilo instances"]:
+        expected = [score for _, score in single.similarity_search_with_score(query, k=8)]
+        found = [score for _, score in sharded.similarity_search_with_score(query, k=8)]
+        assert found == expected
+
+
+def test_category_shards_only_search_matching_shards():
+    sharded = ShardedVectorStore.from_chunk_stream(
+        make_docs(), CountingEmbeddings(), SPEC, num_shards=4, shard_by="category"
+    )
+
+    routed = sharded._route({"category": ["storage"]})
+    hits = sharded.similarity_search("buckets", k=5, filters={"category": "storage"})
+
+    assert len(routed) == 1
+    assert len(hits) == 5 and all(doc.metadata["category"] == "storage" for doc in hits)
+
+
+def test_manifest_round_trip_and_shard_rebuild(tmp_path):
+    embeddings = CountingEmbeddings()
+    sharded = ShardedVectorStore.from_chunk_stream(make_docs(), embeddings, SPEC, num_shards=2)
+    path = str(tmp_path / "index")
+    save_vector_store(sharded, path)
+
+    with open(os.path.join(path, MANIFEST_FILENAME), encoding="utf-8") as f:
+        manifest = json.load(f)
+    assert [shard["chunks"] for shard in manifest["shards"]] == [s.index.ntotal for s in sharded.shards.values()]
+
+    loaded = load_vector_store(path, embeddings=embeddings)
+    assert isinstance(loaded, ShardedVectorStore)
+
+    removed = loaded.delete_source("doc1")
+    shard_id = loaded.shard_for(Document(page_content="", metadata={"source": "doc1"}))
+    rebuilt = loaded.rebuild_shard(shard_id, folder_path=path)
+
+    assert removed == 100
+    assert rebuilt.index.ntotal == sharded.shards[shard_id].index.ntotal - removed
+    assert "doc1" not in loaded.sources()
+    after = loaded.similarity_search("golf instances", k=5)
+    assert len(after) == 5 and all(doc.metadata["source"] != "doc1" for doc in after)
+
+
+def test_hybrid_results_are_fused_across_shards():
+    docs = [
+        Document(page_content=f"EC2 instance compute capacity {i}", metadata={"source": f"ec2-{i}", "category": "compute"})
+        for i in range(4)
+    ] + [
+        Document(page_content=f"S3 bucket storage for EC2 backups {i}", metadata={"source": f"s3-{i}", "category": "storage"})
+        for i in range(4)
+    ]
+    spec = IndexSpec(kind="flat", hybrid=True)
+    single = AWSVectorStore.from_documents_with_spec(docs, CountingEmbeddings(), spec)
+    sharded = ShardedVectorStore.from_chunk_stream(docs, CountingEmbeddings(), spec, num_shards=2, shard_by="category")
+
+    expected = single.similarity_search("ec2 instance compute", k=4)
+    found = sharded.similarity_search("ec2 instance compute", k=4)
+
+    assert len(sharded.shards) == 2
+    assert [doc.metadata["category"] for doc in expected] == ["compute"] * 4
+    assert [doc.metadata["category"] for doc in found] == ["compute"] * 4
@@ -0,0 +1,70 @@
+"""
+Tests for single-flight coalescing of concurrent queries.
+"""
+import asyncio
+
+from api.agent_service import AgentService
+from api.single_flight import SingleFlight
+from api.snapshot import SnapshotManager
+from test_snapshot import make_snapshot
+
+
+def test_concurrent_calls_share_one_run():
+    flight = SingleFlight()
+    runs = []
+
+    async def compute():
+        runs.append(1)
+        await asyncio.sleep(0.01)
+        return "answer"
+
+    async def main():
+        return await asyncio.gather(*[flight.do("ec2", compute) for _ in range(5)])
+
+    assert asyncio.run(main()) == ["answer"] * 5
+    assert len(runs) == 1
+    assert flight.coalesced == 4
+    assert flight.in_flight() == 0
+
+
+def test_errors_reach_every_waiter():
+    flight = SingleFlight()
+
+    async def fail():
+        await asyncio.sleep(0.01)
+        raise ValueError("rate limited")
+
+    async def main():
+        return await asyncio.gather(
+            *[flight.do("ec2", fail) for _ in range(3)],
+            return_exceptions=True
+        )
+
+    results = asyncio.run(main())
+    assert all(isinstance(result, ValueError) for result in results)
+
+
+def test_sessions_with_history_do_not_share_runs(monkeypatch):
+    service = AgentService()
+    manager = SnapshotManager()
+    monkeypatch.setattr(service, "_snapshots", manager)
+    monkeypatch.setattr(service, "_single_flight", SingleFlight())
+    snapshot = make_snapshot(manager, "v1")
+    manager.publish(snapshot)
+    prompts = []
+    invoke = snapshot.executor.invoke
+    snapshot.executor.invoke = lambda inputs, config=None: prompts.append(inputs) or invoke(inputs, config)
+    service.sessions.clear()
+    service.sessions.save_turn("alice", "I run m5.large instances", "Noted.")
+
+    async def main():
+        return await asyncio.gather(*[
+            service.aquery_agent("How much does it cost?", session_id=session_id)
+            for session_id in ["alice", "bob", "carol"]
+        ])
+
+    asyncio.run(main())
+    service.sessions.clear()
+
+    histories = sorted(len(inputs["chat_history"]) for inputs in prompts)
+    assert histories == [0, 2]
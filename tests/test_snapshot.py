@@ -0,0 +1,100 @@
+"""
+Tests for atomic agent snapshot swaps and rollback.
+"""
+import asyncio
+import threading
+import time
+from types import SimpleNamespace
+
+import pytest
+
+from api.agent_service import AgentService
+from api.snapshot import AgentSnapshot, SnapshotManager
+
+
+class SlowExecutor:
+    """Answers with its own name after a delay, like an agent run."""
+
+    def __init__(self, name: str, delay: float = 0.05):
+        self.name = name
+        self.delay = delay
+
+    def invoke(self, inputs, config=None):
+        time.sleep(self.delay)
+        return {"output": f"{self.name}: {inputs['input']}"}
+
+
+def make_snapshot(manager: SnapshotManager, name: str) -> AgentSnapshot:
+    config = SimpleNamespace(llm_type="groq", groq_model_name="test", temperature=0.0, max_tokens=10)
+    return AgentSnapshot(
+        version=manager.next_version(),
+        vector_store=None,
+        agent=None,
+        tools=[],
+        executor=SlowExecutor(name),
+        config=config
+    )
+
+
+def test_in_flight_queries_keep_their_snapshot():
+    manager = SnapshotManager(history=0)
+    old = make_snapshot(manager, "old")
+    manager.publish(old)
+
+    with manager.acquire() as pinned:
+        manager.publish(make_snapshot(manager, "new"))
+        assert pinned is old
+        assert manager.current is not old
+        assert manager.stats()["draining_versions"] == [old.version]
+        assert not manager.wait_drained(old.version, timeout=0.1)
+
+    assert manager.stats()["draining_versions"] == []
+    assert manager.wait_drained(old.version, timeout=0)
+
+
+def test_rollback_restores_previous_snapshot():
+    manager = SnapshotManager(history=2)
+    first, second, third = (make_snapshot(manager, name) for name in ("a", "b", "c"))
+    for snapshot in (first, second, third):
+        manager.publish(snapshot)
+
+    assert manager.stats()["previous_versions"] == [second.version, first.version]
+    assert manager.rollback() is second
+    assert manager.rollback() is first
+    with pytest.raises(RuntimeError):
+        manager.rollback()
+
+
+def test_acquire_before_publish_fails():
+    with pytest.raises(RuntimeError, match="not initialized"):
+        with SnapshotManager().acquire():
+            pass
+
+
+def test_hot_swap_under_load_fails_no_queries(monkeypatch):
+    service = AgentService()
+    manager = SnapshotManager(history=1)
+    monkeypatch.setattr(service, "_snapshots", manager)
+    manager.publish(make_snapshot(manager, "v1"))
+
+    def swap_later():
+        time.sleep(0.1)
+        manager.publish(make_snapshot(manager, "v2"))
+
+    async def main():
+        swapper = threading.Thread(target=swap_later)
+        swapper.start()
+        results = []
+        for wave in range(6):
+            results += await asyncio.gather(*[
+                service.aquery_agent(f"question {wave}-{i}", session_id=None) for i in range(8)
+            ])
+        swapper.join()
+        return results
+
+    results = asyncio.run(main())
+
+    answers = {result["response"].split(":")[0] for result in results}
+    assert len(results) == 48
+    assert answers == {"v1", "v2"}
+    assert manager.stats()["in_flight"] == {}
@@ -0,0 +1,84 @@
+"""
+Tests for BM25 keyword search and hybrid retrieval.
+"""
+from langchain_community.docstore.document import Document
+
+from steps.ann_index import IndexSpec
+from steps.sparse_index import BM25Index, reciprocal_rank_fusion, tokenize
+from steps.vector_store import AWSVectorStore
+from test_vector_store import CountingEmbeddings
+
+
+def test_tokenize_keeps_identifiers_and_parts():
+    assert tokenize("Use t3.medium, not AccessDenied") == [
+        "use", "t3.medium", "t3", "medium", "not", "accessdenied"
+    ]
+
+
+def test_bm25_ranks_rare_terms_first(tmp_path):
+    index = BM25Index()
+    index.add(
+        ["a", "b", "c"],
+        ["EC2 instance types", "EC2 t3.medium instance", "S3 AccessDenied error"],
+    )
+
+    assert [doc for doc, _ in index.search("t3.medium instance", k=2)] == ["b", "a"]
+
+    index.remove(["b"])
+    index.save(str(tmp_path))
+    loaded = BM25Index.load(str(tmp_path))
+    assert len(loaded) == 2
+    assert [doc for doc, _ in loaded.search("AccessDenied", k=3)] == ["c"]
+
+
+def test_deleted_and_replaced_documents_are_skipped():
+    index = BM25Index()
+    index.add(["a", "b", "c"], ["lambda timeout", "lambda memory", "lambda layers"])
+    index.remove(["a", "a", "missing"])
+    index.add(["b"], ["s3 buckets"])
+
+    assert len(index) == 2
+    assert [doc for doc, _ in index.search("lambda", k=3)] == ["c"]
+    assert [doc for doc, _ in index.search("buckets", k=3)] == ["b"]
+
+
+def test_reciprocal_rank_fusion_rewards_agreement():
+    fused = reciprocal_rank_fusion([["a", "b", "c"], ["b", "d"]], k=60)
+
+    assert [item for item, _ in fused] == ["b", "a", "d", "c"]
+
+
+def test_hybrid_search_finds_exact_identifier():
+    docs = [
+        Document(page_content="InvalidParameterValue is returned for bad input", metadata={"source": "errors"}),
+        Document(page_content="Amazon EC2 provides resizable compute capacity", metadata={"source": "ec2"}),
+        Document(page_content="Amazon S3 stores objects in buckets", metadata={"source": "s3"}),
+    ]
+    store = AWSVectorStore.from_documents_with_spec(docs, CountingEmbeddings(), IndexSpec())
+
+    hits = store.similarity_search("InvalidParameterValue", k=1)
+
+    assert hits[0].metadata["source"] == "errors"
+
+    store.delete_source("errors")
+    assert all(doc.metadata["source"] != "errors" for doc in store.similarity_search("InvalidParameterValue", k=3))
+
+
+def test_hybrid_relevance_scores_rank_best_first_and_threshold_after_fusion():
+    docs = [
+        Document(page_content="InvalidParameterValue is returned for bad input", metadata={"source": "errors"}),
+        Document(page_content="Amazon EC2 provides resizable compute capacity", metadata={"source": "ec2"}),
+        Document(page_content="Amazon S3 stores objects in buckets", metadata={"source": "s3"}),
+    ]
+    store = AWSVectorStore.from_documents_with_spec(docs, CountingEmbeddings(), IndexSpec())
+
+    scored = store.similarity_search_with_relevance_scores("InvalidParameterValue", k=3)
+    relevance = [score for _, score in scored]
+    best = store.as_retriever(
+        search_type="similarity_score_threshold", search_kwargs={"k": 3, "score_threshold": relevance[0]}
+    ).invoke("InvalidParameterValue")
+
+    assert scored[0][0].metadata["source"] == "errors"
+    assert relevance == sorted(relevance, reverse=True) and 0 < relevance[-1] and relevance[0] <= 1
+    assert [doc.metadata["source"] for doc in best] == ["errors"]
+    assert store.similarity_search_with_score("InvalidParameterValue", k=3, score_threshold=1.0) == []
@@ -0,0 +1,30 @@
+"""
+Tests for incremental extraction of the agent's final answer from LLM tokens.
+"""
+from agent.streaming import FinalAnswerExtractor
+
+FINAL_BLOB = (
+    '```json\n{\n    "action": "Final Answer",\n'
+    '    "action_input": "EC2 is \\"elastic\\".\\nCaf\\u00e9 \\ud83d\\ude80"\n}\n```'
+)
+
+
+def stream(blob, step):
+    extractor = FinalAnswerExtractor()
+    return "".join(extractor.feed(blob[i:i + step]) for i in range(0, len(blob), step))
+
+
+def test_decodes_answer_for_any_token_size():
+    for step in (1, 2, 3, 5, 8, len(FINAL_BLOB)):
+        assert stream(FINAL_BLOB, step) == 'EC2 is "elastic".\nCafé 🚀'
+
+
+def test_tool_actions_are_not_streamed():
+    blob = '{"action": "aws-support-qa-tool", "action_input": "what is ec2"}'
+    assert stream(blob, 1) == ""
+
+
+def test_answer_before_action_key_is_held_back():
+    extractor = FinalAnswerExtractor()
+    assert extractor.feed('{"action_input": "S3 stores objects"') == ""
+    assert extractor.feed(', "action": "Final Answer"}') == "S3 stores objects"
@@ -0,0 +1,82 @@
+"""
+Tests for the streaming ingestion pipeline.
+"""
+import threading
+import time
+from functools import partial
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from steps.ann_index import IndexSpec
+from steps.streaming_ingestion import streaming_index_generator
+from steps.streaming_pipeline import Stage, StreamingPipeline
+from test_vector_store import CountingEmbeddings
+
+
+def test_stages_pass_every_item_through():
+    pipeline = StreamingPipeline(
+        [
+            Stage("double", lambda x: [x, x], workers=3),
+            Stage("sum", lambda batch: [sum(batch)], batch_size=4),
+        ],
+        queue_size=2,
+    )
+
+    assert sum(pipeline.run(range(100))) == 2 * sum(range(100))
+
+
+def test_slow_consumer_applies_backpressure():
+    pulled = []
+
+    def source():
+        for i in range(10_000):
+            pulled.append(i)
+            yield i
+
+    pipeline = StreamingPipeline([Stage("identity", lambda x: [x])], queue_size=4)
+    outputs = pipeline.run(source())
+    next(outputs)
+    time.sleep(0.5)
+
+    # Two full queues, one item in the worker's hands and one in the feeder's
+    assert len(pulled) <= 2 * 4 + 3
+    outputs.close()
+
+
+def test_stage_error_stops_the_pipeline():
+    def fail_on_seven(x):
+        if x == 7:
+            raise ValueError("bad item")
+        return [x]
+
+    pipeline = StreamingPipeline([Stage("check", fail_on_seven, workers=2)], queue_size=2)
+
+    with pytest.raises(ValueError, match="bad item"):
+        list(pipeline.run(range(1000)))
+
+
+def test_streaming_index_generator_indexes_served_pages(tmp_path):
+    for i in range(6):
+        body = " ".join(f"Page {i} explains service {i} feature {j}." for j in range(40))
+        (tmp_path / f"page{i}.html").write_text(f"<html><body><script>x()</script><p>{body}</p></body></html>")
+    server = ThreadingHTTPServer(("127.0.0.1", 0), partial(SimpleHTTPRequestHandler, directory=str(tmp_path)))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base = f"http://127.0.0.1:{server.server_address[1]}"
+
+    embeddings = CountingEmbeddings()
+    try:
+        store = streaming_index_generator(
+            [f"{base}/page{i}.html" for i in range(6)] + [f"{base}/missing.html"],
+            chunk_size=64,
+            embeddings=embeddings,
+            batch_size=8,
+            index_spec=IndexSpec(kind="flat"),
+            queue_size=2,
+        )
+    finally:
+        server.shutdown()
+
+    assert store.sources() == sorted(f"{base}/page{i}.html" for i in range(6))
+    assert all("x()" not in doc.page_content for doc in store.docstore._dict.values())
+    assert store.embedding_function is embeddings
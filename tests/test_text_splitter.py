@@ -0,0 +1,58 @@
+"""
+Tests for the token-aware streaming text splitter.
+"""
+import pytest
+from langchain_community.docstore.document import Document
+
+from steps.text_splitter import TokenTextSplitter, Tokenizer
+
+
+def word_tokenizer(max_tokens=None):
+    """One token per whitespace-separated word."""
+    def cut(text, size):
+        words = text.split(" ")
+        return [" ".join(words[i:i + size]) for i in range(0, len(words), size)]
+
+    return Tokenizer(lambda text: len(text.split()), cut, max_tokens, "words")
+
+
+def test_chunks_respect_size_and_prefer_paragraphs():
+    splitter = TokenTextSplitter(word_tokenizer(), chunk_size=5)
+    text = "one two three\n\nfour five\n\nsix seven eight nine ten eleven twelve"
+
+    chunks = list(splitter.split_text(text))
+
+    assert chunks[0] == "one two three\n\nfour five"
+    assert all(len(chunk.split()) <= 5 for chunk in chunks)
+    assert " ".join(chunks).split() == text.split()
+
+
+def test_overlap_repeats_tail_of_previous_chunk():
+    splitter = TokenTextSplitter(word_tokenizer(), chunk_size=4, chunk_overlap=2)
+
+    chunks = list(splitter.split_text("a b c d e f"))
+
+    assert chunks == ["a b c d", "c d e f"]
+
+
+def test_chunk_size_is_capped_at_model_limit():
+    splitter = TokenTextSplitter(word_tokenizer(max_tokens=3), chunk_size=100)
+
+    assert splitter.chunk_size == 3
+    with pytest.raises(ValueError):
+        TokenTextSplitter(word_tokenizer(), chunk_size=4, chunk_overlap=4)
+
+
+def test_documents_are_split_lazily():
+    consumed = []
+
+    def documents():
+        for i in range(3):
+            consumed.append(i)
+            yield Document(page_content=f"doc {i} text", metadata={"source": str(i)})
+
+    chunks = TokenTextSplitter(word_tokenizer(), chunk_size=10).split_documents(documents())
+    first = next(chunks)
+
+    assert consumed == [0]
+    assert first.metadata == {"source": "0"}
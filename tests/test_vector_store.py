@@ -0,0 +1,70 @@
+"""
+Tests for per-source updates of the knowledge base vector store.
+"""
+from langchain_community.docstore.document import Document
+from langchain_core.embeddings import Embeddings
+
+from steps.vector_store import AWSVectorStore
+
+
+class CountingEmbeddings(Embeddings):
+    """Deterministic bag-of-letters embedding that counts embedded texts."""
+
+    def __init__(self):
+        self.embedded = 0
+
+    def embed_query(self, text):
+        text = text.lower()
+        return [text.count(letter) + 0.01 for letter in "abcdefghijklmnopqrstuvwxyz"]
+
+    def embed_documents(self, texts):
+        self.embedded += len(texts)
+        return [self.embed_query(text) for text in texts]
+
+
+def build_store():
+    embeddings = CountingEmbeddings()
+    store = AWSVectorStore.from_documents(
+        [
+            Document(page_content="EC2 instances", metadata={"source": "ec2"}),
+            Document(page_content="S3 buckets", metadata={"source": "s3"}),
+            Document(page_content="Lambda functions", metadata={"source": "lambda"}),
+        ],
+        embeddings,
+    )
+    embeddings.embedded = 0
+    return store, embeddings
+
+
+def test_upsert_embeds_only_changed_chunks():
+    store, embeddings = build_store()
+    chunks = [
+        Document(page_content="S3 buckets", metadata={"source": "s3"}),
+        Document(page_content="S3 storage classes", metadata={"source": "s3"}),
+    ]
+
+    counts = store.upsert_source_chunks("s3", chunks)
+
+    assert counts == {"added": 1, "unchanged": 1, "removed": 0}
+    assert embeddings.embedded == 1
+
+
+def test_deleted_source_is_not_returned():
+    store, _ = build_store()
+
+    assert store.delete_source("s3") == 1
+    assert store.delete_source("missing") == 0
+
+    sources = [doc.metadata["source"] for doc in store.similarity_search("S3 buckets", k=3)]
+    assert "s3" not in sources
+    assert sorted(sources) == ["ec2", "lambda"]
+
+
+def test_compaction_removes_tombstones():
+    store, _ = build_store()
+    store.delete_source("s3")
+    store.compact()
+
+    assert store.index.ntotal == 2
+    assert len(store.docstore._dict) == 2
+    assert store.sources() == ["ec2", "lambda"]